@@ -0,0 +1,22 @@
+from synchronisation import Synchronizer
+
+
+def test_every_message_evicts_older_groups():
+    synchronizer = Synchronizer(number_of_messages_per_sequence_number=2, capacity=4)
+    sent = []
+    synchronizer.add_callback(sent.append)
+    synchronizer.add_message("a0", sequence_number=0, identifier="a")
+    synchronizer.add_message("a1", sequence_number=1, identifier="a")
+    assert synchronizer.statistics["evicted_incomplete"] == {"a": 1}
+
+    synchronizer.add_message("b0", sequence_number=0, identifier="b")
+    assert synchronizer.statistics["late"] == {"b": 1}
+    synchronizer.add_message("b1", sequence_number=1, identifier="b")
+    assert sent == [{"a": "a1", "b": "b1"}]
+
+    synchronizer.add_message("a2", sequence_number=2, identifier="a")
+    synchronizer.add_message("a2'", sequence_number=2, identifier="a")
+    assert synchronizer.statistics["duplicate"] == {"a": 1}
+    # sequence number 9 doesn't fit next to 2, the ring makes room
+    synchronizer.add_message("b9", sequence_number=9, identifier="b")
+    assert synchronizer.statistics["evicted_incomplete"] == {"a": 2}
@@ -1,10 +1,17 @@
 import logging as log
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
 
 import depthai as dai
 import robothub as rh
 
-from app_pipeline import host_node, messages, oak_pipeline
+from app_pipeline import host_node, oak_pipeline
 from app_pipeline import script_node
+from app_pipeline.host_graph import create_host_graph
+from node_helpers import CodeLedger, DecodeLadder, DecodePool, LatencyTracer, LocalDisplay, write_config
 
 
 ### cv2 and av bug workaround on some linux systems - uncomment in local dev
@@ -25,22 +32,56 @@ RESOLUTION_MAPPING = {
 }
 
 
+def derived_configuration(resolution: str) -> dict:
+    """Crop and image sizes of the host and device pipeline for the given resolution."""
+    configuration = {}
+    configuration["high_res_frame_width"] = RESOLUTION_MAPPING[resolution][0]
+    configuration["high_res_frame_height"] = RESOLUTION_MAPPING[resolution][1]
+    configuration["crop_count"] = script_node.NUMBER_OF_CROPPED_IMAGES
+    configuration["crop_grid_rows"] = 3
+    configuration["crop_grid_columns"] = 3
+    configuration["high_res_crop_width"] = 600 if resolution == "5312x6000" else 768
+    configuration["high_res_crop_height"] = 600 if resolution == "5312x6000" else 432
+    configuration["merged_image_overlap"] = 0.25 if resolution == "5312x6000" else 0.25
+    configuration["merged_image_width"] = 1500 if resolution == "5312x6000" else 1920
+    configuration["merged_image_height"] = 1500 if resolution == "5312x6000" else 1080
+    configuration["merged_image_pool_size"] = 3
+    configuration["encoder_frame_width"] = 512 if resolution == "5312x6000" else 1920
+    configuration["encoder_frame_height"] = 512 if resolution == "5312x6000" else 1080
+    # the tiling Script node writes the tile index of a detection message into its data and the detection labels
+    configuration["tile_index_in_label"] = True
+    return configuration
+
+
+@dataclass(slots=True, kw_only=True)
+class DeviceGraph:
+    """The host nodes and queues of one device."""
+    mxid: str
+    rgb_control: dai.DataInputQueue
+    qr_code_decoder: host_node.QrCodeDecoder
+    results_reporter: host_node.ResultsReporter
+    recorders: list = field(default_factory=list)
+
+    def close(self) -> None:
+        self.qr_code_decoder.close()
+        self.results_reporter.close()
+        for recorder in self.recorders:
+            recorder.close()
+
+
 class Application(rh.BaseDepthAIApplication):
 
-    rgb_control = None
+    rgb_controls: list[dai.DataInputQueue] = []  # one per device
 
     def __init__(self):
         super().__init__()
-        rh.CONFIGURATION["high_res_frame_width"] = RESOLUTION_MAPPING[rh.CONFIGURATION["resolution"]][0]
-        rh.CONFIGURATION["high_res_frame_height"] = RESOLUTION_MAPPING[rh.CONFIGURATION["resolution"]][1]
-        rh.CONFIGURATION["crop_count"] = script_node.NUMBER_OF_CROPPED_IMAGES
-        rh.CONFIGURATION["high_res_crop_width"] = 600 if rh.CONFIGURATION["resolution"] == "5312x6000" else 768
-        rh.CONFIGURATION["high_res_crop_height"] = 600 if rh.CONFIGURATION["resolution"] == "5312x6000" else 432
-        rh.CONFIGURATION["merged_image_overlap"] = 0.25 if rh.CONFIGURATION["resolution"] == "5312x6000" else 0.25
-        rh.CONFIGURATION["merged_image_width"] = 1500 if rh.CONFIGURATION["resolution"] == "5312x6000" else 1920
-        rh.CONFIGURATION["merged_image_height"] = 1500 if rh.CONFIGURATION["resolution"] == "5312x6000" else 1080
-        rh.CONFIGURATION["encoder_frame_width"] = 512 if rh.CONFIGURATION["resolution"] == "5312x6000" else 1920
-        rh.CONFIGURATION["encoder_frame_height"] = 512 if rh.CONFIGURATION["resolution"] == "5312x6000" else 1080
+        rh.CONFIGURATION.update(derived_configuration(resolution=rh.CONFIGURATION["resolution"]))
+        rh.CONFIGURATION["decode_cache_size"] = 512
+        rh.CONFIGURATION["decode_cache_max_age_seconds"] = 300
+        rh.CONFIGURATION["code_ledger_path"] = "qr_codes.sqlite" if rh.LOCAL_DEV else os.path.join(rh.STORAGE_DIR, "qr_codes.sqlite")
+        rh.CONFIGURATION["code_ledger_flush_ms"] = 200
+        rh.CONFIGURATION["recordings_dir"] = "recordings" if rh.LOCAL_DEV else os.path.join(rh.STORAGE_DIR, "recordings")
+        rh.CONFIGURATION["latency_trace_path"] = "latency_trace.json" if rh.LOCAL_DEV else os.path.join(rh.STORAGE_DIR, "latency_trace.json")
 
     def setup_pipeline(self) -> dai.Pipeline:
         log.info(f"Configuration: {rh.CONFIGURATION}")
@@ -50,39 +91,117 @@ class Application(rh.BaseDepthAIApplication):
 
     def manage_device(self, device: dai.Device):
         log.info(f"DepthAi version: {dai.__version__}")
-
-        self.rgb_control = device.getInputQueue(name="rgb_input")
+        devices = [device] + self._connect_additional_devices(primary_mxid=device.getMxId())
+        # one pool of decoding processes for all devices, it schedules the devices round robin
+        decode_pool = None
+        if rh.CONFIGURATION["decode_workers"] > 0:
+            ladder = DecodeLadder.from_configuration(rh.CONFIGURATION)
+            decode_pool = DecodePool(workers=rh.CONFIGURATION["decode_workers"], ladder=ladder)
+        # one ledger for all devices too, a single writer thread and connection per database file
+        code_ledger = None
+        if rh.CONFIGURATION["code_ledger_path"]:
+            code_ledger = CodeLedger(path=rh.CONFIGURATION["code_ledger_path"], flush_interval_ms=rh.CONFIGURATION["code_ledger_flush_ms"])
+        # the OpenCV windows of all devices, drawn by this thread
+        display = LocalDisplay() if rh.LOCAL_DEV else None
+        graphs = [self._create_device_graph(device=graph_device, decode_pool=decode_pool, code_ledger=code_ledger, display=display)
+                  for graph_device in devices]
+        self.rgb_controls = [graph.rgb_control for graph in graphs]
+        host_node.BaseNode.tracer = LatencyTracer(trace_path=rh.CONFIGURATION["latency_trace_path"]) if rh.CONFIGURATION["latency_tracing"] else None
+
+        log.info(f"Application started with {len(graphs)} device(s)")
+        # the host nodes of every device run in their own dispatcher thread, a failing device restarts all of them. Running
+        # locally this thread only draws the windows, HighGUI can't be used from the dispatcher threads of several devices
+        dispatched_graphs = graphs if display is not None else graphs[1:]
+        dispatchers = [threading.Thread(target=host_node.Bridge.run, name=f"dispatcher_{graph.mxid}",
+                                        kwargs={"device_stop_event": self._device_stop_event, "event_driven": True, "group": graph.mxid})
+                       for graph in dispatched_graphs]
+        for dispatcher in dispatchers:
+            dispatcher.start()
+        if display is not None:
+            display.run(stop=lambda: not any(dispatcher.is_alive() for dispatcher in dispatchers))
+        else:
+            host_node.Bridge.run(device_stop_event=self._device_stop_event, event_driven=True, group=graphs[0].mxid)
+        for dispatcher in dispatchers:
+            dispatcher.join()
+        for graph in graphs:
+            graph.close()
+        if decode_pool is not None:
+            decode_pool.close()
+        if code_ledger is not None:
+            # writes the codes recorded since the last flush, so they aren't reported again after the restart
+            code_ledger.close()
+        for additional_device in devices[1:]:
+            additional_device.close()
+        if host_node.BaseNode.tracer is not None:
+            host_node.BaseNode.tracer.report()
+
+    def _connect_additional_devices(self, primary_mxid: str) -> list[dai.Device]:
+        """Devices listed in `additional_device_mxids` run the same pipeline as the device robothub connected."""
+        mxids = [mxid.strip() for mxid in rh.CONFIGURATION.get("additional_device_mxids", "").split(",") if mxid.strip()]
+        devices = []
+        for mxid in dict.fromkeys(mxids):
+            if mxid == primary_mxid:
+                continue
+            log.info(f"Connecting additional device {mxid}")
+            try:
+                devices.append(dai.Device(self.setup_pipeline(), dai.DeviceInfo(mxid)))
+            except RuntimeError as e:
+                log.error(f"Could not connect device {mxid}, running without it: {e}")
+        return devices
+
+    def _create_device_graph(self, device: dai.Device, decode_pool: Optional[DecodePool], code_ledger: Optional[CodeLedger],
+                             display: Optional[LocalDisplay]) -> "DeviceGraph":
+        mxid = device.getMxId()
+        rgb_control = device.getInputQueue(name="rgb_input")
         script_node_input = device.getInputQueue(name="script_node_input")
         script_node_qr_crops_input = device.getInputQueue(name="script_node_qr_crops_input")
         self._send_resolution_config_to_script_node(script_node_input)
         self._send_resolution_config_to_script_node(script_node_qr_crops_input)
 
-        high_res_frames = host_node.Bridge(device=device, out_name="high_res_frames", blocking=False, queue_size=20)
+        high_res_frames = host_node.Bridge(device=device, out_name="high_res_frames", blocking=False, queue_size=20, group=mxid)
         qr_crops_queue = device.getOutputQueue(name="qr_crops", maxSize=10, blocking=True)
-        qr_detection_out = host_node.Bridge(device=device, out_name="qr_detection_out", blocking=False, queue_size=40)
-        h264_frames = host_node.Bridge(device=device, out_name="h264_stream", blocking=False, queue_size=2)
-
-        qr_bboxes = host_node.ReconstructQrDetections(input_node=qr_detection_out)
-        high_res_frames = host_node.HighResFramesGatherer(input_node=high_res_frames)
-        qr_boxes_and_frame_sync = host_node.Sync(inputs=[high_res_frames, qr_bboxes, h264_frames],
-                                                 input_names=["high_res_rgb", "qr_bboxes", "h264_frame"],
-                                                 output_message_obj=messages.FramesWithDetections)
-        qr_code_decoder = host_node.QrCodeDecoder(input_node=qr_boxes_and_frame_sync, qr_crop_queue=qr_crops_queue)
-        host_node.ResultsReporter(input_node=qr_code_decoder)
-        host_node.Monitor(input_node=qr_code_decoder, name="qr_boxes_and_frame_sync")
-
-        log.info(f"Application started")
-        host_node.Bridge.run(device_stop_event=self._device_stop_event)
+        qr_detection_out = host_node.Bridge(device=device, out_name="qr_detection_out", blocking=False, queue_size=40, group=mxid)
+        crop_skips_queue = crop_skip_list_queue = None
+        if rh.CONFIGURATION["qr_skip_frames"] > 0:
+            crop_skips_queue = device.getOutputQueue(name="qr_crop_skips", maxSize=10, blocking=True)
+            crop_skip_list_queue = device.getInputQueue(name="crop_skip_list", maxSize=1, blocking=False)
+        h264_frames = host_node.Bridge(device=device, out_name="h264_stream", blocking=False, queue_size=2, group=mxid)
+
+        recorders = []
+        if rh.CONFIGURATION["record_streams"]:
+            recording_dir = os.path.join(rh.CONFIGURATION["recordings_dir"], f"{time.strftime('%Y%m%d_%H%M%S')}_{mxid}")
+            log.info(f"Recording device streams to {recording_dir}")
+            write_config(directory=recording_dir, configuration=rh.CONFIGURATION)
+            recorders = [host_node.StreamRecorder(input_node=bridge, directory=recording_dir, name=bridge.name)
+                         for bridge in (high_res_frames, qr_detection_out, h264_frames)]
+            qr_crops_queue = host_node.RecordingQueue(queue=qr_crops_queue, directory=recording_dir, name="qr_crops")
+            recorders.append(qr_crops_queue)
+            if crop_skips_queue is not None:
+                crop_skips_queue = host_node.RecordingQueue(queue=crop_skips_queue, directory=recording_dir, name="qr_crop_skips")
+                recorders.append(crop_skips_queue)
+
+        host_graph = create_host_graph(high_res_frames=high_res_frames, qr_detection_out=qr_detection_out, h264_frames=h264_frames,
+                                       qr_crops_queue=qr_crops_queue, crop_skips_queue=crop_skips_queue,
+                                       crop_skip_list_queue=crop_skip_list_queue, decode_pool=decode_pool, device_mxid=mxid,
+                                       code_ledger=code_ledger, display=display)
+        if rh.CONFIGURATION["empty_tile_scan_interval"] > 1:
+            tile_history_queue = device.getInputQueue(name="tile_history", maxSize=1, blocking=False)
+            host_node.TileHistoryFeedback(input_node=qr_detection_out, control_queue=tile_history_queue)
+        return DeviceGraph(mxid=mxid, rgb_control=rgb_control, qr_code_decoder=host_graph.qr_code_decoder,
+                           results_reporter=host_graph.results_reporter, recorders=recorders)
 
     def _send_resolution_config_to_script_node(self, input_queue: dai.DataInputQueue):
         message = dai.Buffer()
-        data = [0] if rh.CONFIGURATION["resolution"] == "5312x6000" else [1]
+        data = [0 if rh.CONFIGURATION["resolution"] == "5312x6000" else 1, rh.CONFIGURATION["empty_tile_scan_interval"],
+                int(rh.CONFIGURATION["gray_qr_crops"]), min(int(rh.CONFIGURATION["qr_skip_frames"]), 255)]
         message.setData(data)
         input_queue.send(message)
 
     def on_configuration_changed(self, configuration_changes: dict) -> None:
         log.info(f"CONFIGURATION CHANGES: {configuration_changes}")
-        require_restart = ["fps", "auto_exposure_limit"]
+        require_restart = ["fps", "auto_exposure_limit", "decode_workers", "decode_frame_budget_ms", "decode_ladder",
+                           "decode_crop_budget_ms", "latency_tracing", "record_streams", "empty_tile_scan_interval", "gray_qr_crops",
+                           "qr_skip_frames", "additional_device_mxids"]
         for key in require_restart:
             if key in configuration_changes:
                 log.info(f"{key} change needs a new pipeline. Restarting OAK device...")
@@ -92,16 +211,19 @@ class Application(rh.BaseDepthAIApplication):
             log.info(f"Setting manual exposure to {rh.CONFIGURATION['manual_exposure']} and iso to {rh.CONFIGURATION['manual_iso']}")
             ctrl = dai.CameraControl()
             ctrl.setManualExposure(rh.CONFIGURATION["manual_exposure"], rh.CONFIGURATION["manual_iso"])
-            self.rgb_control.send(ctrl)
+            for rgb_control in self.rgb_controls:
+                rgb_control.send(ctrl)
         if "enable_manual_exposure" in configuration_changes and not rh.CONFIGURATION["enable_manual_exposure"]:
             ctrl = dai.CameraControl()
             ctrl.setAutoExposureEnable()
-            self.rgb_control.send(ctrl)
+            for rgb_control in self.rgb_controls:
+                rgb_control.send(ctrl)
         if "manual_focus" in configuration_changes and rh.CONFIGURATION["manual_focus"] > 0:
             log.info(f"Setting manual focus to {rh.CONFIGURATION['manual_focus']}")
             ctrl = dai.CameraControl()
             ctrl.setManualFocus(rh.CONFIGURATION["manual_focus"])
-            self.rgb_control.send(ctrl)
+            for rgb_control in self.rgb_controls:
+                rgb_control.send(ctrl)
 
 
 if __name__ == "__main__":
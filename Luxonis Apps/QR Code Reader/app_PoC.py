@@ -1,321 +1,316 @@
+"""Headless benchmark of the proof of concept pipeline: ImageManip crops of the camera preview -> YOLO -> NMS and decoding on the host.
+
+Run from the app directory, e.g.:
+
+    python app_PoC.py --duration 60 --grid 3 3 --resolution 1080p --csv frames.csv --json summary.json
+    python app_PoC.py --duration 60 --record recordings/poc
+    python app_PoC.py --replay recordings/poc --csv frames.csv --json summary.json
+
+Every frame is timed per stage - get (waiting for the frame and its detections), convert (planar frame to interleaved BGR),
+merge (detections to frame coordinates), NMS and decode. The CSV gets one row per frame, the JSON the summary: FPS,
+decode rate and mean/p95/max of every stage.
+`--record` keeps the device streams, `--replay` runs the same measurements on them without a device.
+"""
+import argparse
 import csv
+import json
+import logging as log
 import time
-from datetime import datetime
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Iterator, Optional
 
 import cv2
 import depthai
 import numpy as np
-import zxingcpp
 
-OUTPUT_TO_FILE = False
-OUTPUT_FILENAME = "results.txt"
+from node_helpers import StreamReader, StreamWriter, decode_crop, read_config, write_config
 
 NN_INPUT_SIZE_W = 512
 NN_INPUT_SIZE_H = 288
 
-CONFIDENCE_THRESHOLD = 0.2
+RESOLUTIONS = {
+    "1080p": (depthai.ColorCameraProperties.SensorResolution.THE_1080_P, (1920, 1080)),
+    "4k": (depthai.ColorCameraProperties.SensorResolution.THE_4_K, (3840, 2160)),
+}
+STAGES = ("get", "convert", "merge", "nms", "decode")
+
+# a border to keep around each detected code - decoding is hard(er) to impossible without a border.
+# 10 px seems to work well
+BORDER_SIZE = 10
+OVERLAP_THRESHOLD = 0.01
+
+
+@dataclass(slots=True, kw_only=True)
+class FrameResult:
+    frame: int
+    sequence_number: int
+    detections: int  # boxes left after NMS
+    decoded: int
+    get_ms: float
+    convert_ms: float
+    merge_ms: float
+    nms_ms: float
+    decode_ms: float
+
 
-NUMBER_OF_CROPPED_IMAGES = 9
-crop_vals = [(0.0, 0.0), (0.0, 0.3), (0.0, 0.6), (0.3, 0.0), (0.3, 0.3), (0.3, 0.6), (0.6, 0.0), (0.6, 0.3), (0.6, 0.6)]
+def crop_rects(rows: int, columns: int) -> list[tuple[float, float, float, float]]:
+    """Relative crop rectangles (xmin, ymin, xmax, ymax), column by column. A 3x3 grid gives 0.4 wide crops at 0.0, 0.3 and 0.6."""
+    def axis(count: int) -> list[tuple[float, float]]:
+        size = min(1.0, 1.2 / count)
+        stride = (1.0 - size) / (count - 1) if count > 1 else 0.0
+        return [(i * stride, i * stride + size) for i in range(count)]
+
+    return [(xmin, ymin, xmax, ymax) for xmin, xmax in axis(columns) for ymin, ymax in axis(rows)]
 
 
 # ---------------------
 #  PIPELINE DEFINITION
 # ---------------------
-# pipeline object
-pipeline = depthai.Pipeline()
-
-
-# NODES
-# ColorCamera
-# https://docs.luxonis.com/projects/api/en/latest/components/nodes/color_camera/
-cam = pipeline.create(depthai.node.ColorCamera)
-cam.setResolution(depthai.ColorCameraProperties.SensorResolution.THE_1080_P)
-cam.setColorOrder(depthai.ColorCameraProperties.ColorOrder.BGR)
-cam.setInterleaved(False)
-cam.setPreviewSize(1920,1080)
-
-# Script
-# https://docs.luxonis.com/projects/api/en/latest/components/nodes/script/
-script = pipeline.create(depthai.node.Script)
-# wait for the output of the corresponding image manip and send it to the NN,
-# making sure the frames are passed in the right order
-script.setScript("""
-    import time
-    
-    NUMBER_OF_CROPPED_IMAGES = 9
-
+def create_pipeline(resolution: str, rects: list[tuple[float, float, float, float]], confidence_threshold: float) -> depthai.Pipeline:
+    pipeline = depthai.Pipeline()
+    sensor_resolution, preview_size = RESOLUTIONS[resolution]
+
+    # ColorCamera
+    # https://docs.luxonis.com/projects/api/en/latest/components/nodes/color_camera/
+    cam = pipeline.create(depthai.node.ColorCamera)
+    cam.setResolution(sensor_resolution)
+    cam.setColorOrder(depthai.ColorCameraProperties.ColorOrder.BGR)
+    cam.setInterleaved(False)
+    cam.setPreviewSize(*preview_size)
+
+    # Script
+    # https://docs.luxonis.com/projects/api/en/latest/components/nodes/script/
+    # wait for the output of the corresponding image manip and send it to the NN,
+    # making sure the frames are passed in the right order
+    script = pipeline.create(depthai.node.Script)
+    script.setScript(f"""
     while True:
-        for i in range(NUMBER_OF_CROPPED_IMAGES):
-            input_name = f"in_manip{i}"
-            frame = node.io[input_name].get()
+        for i in range({len(rects)}):
+            frame = node.io[f"in_manip{{i}}"].get()
             node.io['out_frame'].send(frame)
 """)
 
-
-# ImageManip nodes with corresponding configs
-# https://docs.luxonis.com/projects/api/en/latest/components/nodes/image_manip/
-def create_image_manip(crop):
-    # create the node
-    manip = pipeline.create(depthai.node.ImageManip)
-    
-    # default config values
-    manip.initialConfig.setFrameType(depthai.ImgFrame.Type.BGR888p)
-    manip.initialConfig.setResize(NN_INPUT_SIZE_W, NN_INPUT_SIZE_H)
-    step = 0.4
-    xmin = crop[0]
-    ymin = crop[1]
-    xmax = xmin + step
-    ymax = ymin + step
-    manip.initialConfig.setCropRect(xmin, ymin, xmax, ymax)
-    
-    # input image settings
-    manip.inputImage.setWaitForMessage(True)
-    manip.inputImage.setBlocking(True)
-    manip.inputImage.setQueueSize(1)
-    manip.setMaxOutputFrameSize(NN_INPUT_SIZE_W * NN_INPUT_SIZE_H * 3)
-
-    return manip
-
-# connect the camera preview to each image manip's input,
-# connect each image manip's output to the Script node's input
-for i in range(NUMBER_OF_CROPPED_IMAGES):
-    im = create_image_manip(crop_vals[i])
-    
-    # camera (preview) > image manip
-    cam.preview.link(im.inputImage)
-
-    # image manip > script
-    input_name = f"in_manip{i}"
-    im.out.link(script.inputs[input_name])
-
-    # script input settings
-    script.inputs[input_name].setBlocking(True)
-    script.inputs[input_name].setQueueSize(1)
-
-
-# YoloDetectionNetwork
-# https://docs.luxonis.com/projects/api/en/latest/components/nodes/yolo_detection_network/
-nn_yolo = pipeline.create(depthai.node.YoloDetectionNetwork)
-nn_yolo.setBlobPath(str((Path(__file__).parent / Path('qr_model_512x288_rvc2_openvino_2022.1_6shave.blob')).resolve().absolute()))
-nn_yolo.setConfidenceThreshold(CONFIDENCE_THRESHOLD)
-nn_yolo.setNumClasses(1)
-nn_yolo.setCoordinateSize(4)
-nn_yolo.setIouThreshold(0.5)
-nn_yolo.setNumInferenceThreads(2)
-nn_yolo.input.setBlocking(True)  # set blocking, otherwise configs in queue might be overwritten
-nn_yolo.input.setQueueSize(50)  # it can keep all the crops in a queue and unblock the image manip, that would be stuck on image.send()
-
-# XLinkOut (camera video)
-# https://docs.luxonis.com/projects/api/en/latest/components/nodes/xlink_out/
-xout_video = pipeline.create(depthai.node.XLinkOut)
-xout_video.setStreamName("video")
-
-# XLinkOut (NN output)
-# https://docs.luxonis.com/projects/api/en/latest/components/nodes/xlink_out/
-xout_nn = pipeline.create(depthai.node.XLinkOut)
-xout_nn.setStreamName("nn")
-
-
-# LINKS
-# camera (preview) -> host
-cam.preview.link(xout_video.input)
-
-# script -> NN
-script.outputs['out_frame'].link(nn_yolo.input)
-
-# NN -> out (host)
-nn_yolo.out.link(xout_nn.input)  # detections
-
-
-# ------------------
-#  RUN THE PIPELINE
-# ------------------
-with depthai.Device(pipeline) as device:
-    # host-side output queues to access the produced results
-    # maxSize = 15, or choose any high number
-    # blocking = False, to ensure the pipeline won't get stuck even if host does
-    #   - pipeline will keep sending messages, and they will get overwritten in this queue
-    videoQueue = device.getOutputQueue("video", maxSize=15, blocking=False)
-    nnQueue = device.getOutputQueue("nn", maxSize=15, blocking=False)
-
-    
-    # TODO: bound "scale" and "mean" to the number of cropped images
-  
-    CROP_FACTOR = 0.4   # corresponds to "step" in the Script node
-
-    
-    # scale_factor can be scalar (= same for both x,y) or vector [scale_x, scale_y]
-    def wh_from_frame(frame, scale_factor = 1):
-        # CONSIDER: is this flipping a good idea? it seems confusing when indexing frames (CV images)
-        # which use "matrix" indexing - i,j (height, width)
-        wh = np.flip(frame.shape[0:-1])     # order of coordinates: x, y (width, height)
-        return wh * np.array(scale_factor)
-
-
-    # coordinates order - x, y
-    def transform_coords(coords_from, coords_to, bbox, mean = 0):
-        # calculate scale values for the given coordinates combination and extend the resulting vector
-        # to match the dimensions of the bounding box (xmin, ymin, xmax, ymax),
-        # i.e., [x_s, y_s] -> [x_s, y_s, x_s, y_s]
-        S = coords_to / coords_from
-        S = np.tile(S, 2)
-        
-        M = np.array(mean)
-        # if M is a vector, extend it to match the dimensions of the bounding box (xmin, ymin, xmax, ymax),
-        # i.e., [x_m, y_m] -> [x_m, y_m, x_m, y_m].
-        # There is no need to do this if M is a scalar.
-        if np.ndim(M) > 0:
-            M = np.tile(M, 2)  
-
-        res = bbox * S + M
-
-        # clip the result to get rid of negative numbers that might occur
-        np.clip(res, a_min=0, a_max=None, out=res)  # in-place clipping
-
-        return res.astype(int)
-
-
-    color_red = (0, 0, 255)
-    color_white = (255, 255, 255)
-    # color_green = (0, 255, 0)
-    # color_blue = (255, 0, 0)
-
-    # a border to keep around each detected code - decoding is hard(er) to impossible without a border.
-    # 10 px seems to work well
-    BORDER_SIZE = 10
-
-    frame = None
-    detections = []
-    startTime = time.monotonic()
-    counter = 0
-
-    if OUTPUT_TO_FILE:
-        # write the results to a csv file
-        f = open(OUTPUT_FILENAME, "w", encoding="utf-8")
-        header = ["timestamp", "bbox_xmin", "bbox_ymin", "bbox_xmax", "bbox_ymax", "confidence", "decoded", "type"]
-        writer = csv.DictWriter(f, fieldnames=header, restval="null")
-        try:
-            writer.writeheader()
-        except Exception as e:
-            f.close()
-            raise Exception(e)
-
-
-    while True:
-        # process input from camera (if any)
-        frame = videoQueue.get().getCvFrame()
-
-        bboxes = []
-        confidences = []
-
-        # If any codes were detected, display the image, highlight the codes with rectangles,
-        # display the decoded text (if available) above the highlighting rectangle,
-        # and print the relevant info to the output.
-        # Note: the highlighted rectangles include an (additional) border necessary for code decoding.
-        # If no codes were detected, just display the image.
-
-        # process results from all cropped images
-        for i in range(NUMBER_OF_CROPPED_IMAGES):
-
-            # get the corresponding detections
-            detections = nnQueue.get().detections
-            counter += 1    # FPS will be counted per cropped frame
-        
-            # calculate coordinates of each detection wrt the original frame
-            for detection in detections:
-                # transform the bounding box from the detections space <0..1> to the yolo frame space
-                bbox_detection = (detection.xmin, detection.ymin, detection.xmax, detection.ymax)
-                bbox_yolo_frame = transform_coords(np.array([1,1]), np.array([NN_INPUT_SIZE_W,NN_INPUT_SIZE_H]), bbox_detection)
-
-                # transform the bounding box from the yolo frame space to the coordinates in the original image
-                bbox = transform_coords(np.array([NN_INPUT_SIZE_W,NN_INPUT_SIZE_H]), wh_from_frame(frame, CROP_FACTOR), bbox_yolo_frame, wh_from_frame(frame, crop_vals[i]))
-                
-                # save the final bounding box and confidence of the detection
-                bboxes.append(bbox.tolist())
-                confidences.append(detection.confidence)
-
-                
-        # calculate NMS over all detected bounding boxes
-        confidence_threshold = CONFIDENCE_THRESHOLD     # generally should match yolo's confidence_threshold
-        overlap_threshold = 0.01
-        nmsboxes = [(bbox[0], bbox[1], bbox[2] - bbox[0], bbox[3] - bbox[1]) for bbox in bboxes]
-        indices = cv2.dnn.NMSBoxes(nmsboxes, confidences, confidence_threshold, overlap_threshold)
-        
-        # display and print info about each resulting code and try to decode it. 
-        # If successful, display and print the decoded text as well.
-        for index in indices:
-            bbox = bboxes[index]
-            # cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), color_red, 2)
-            # cv2.putText(frame, f"{int(confidences[index] * 100)}%", (bbox[0] + 10, bbox[1] + 40), cv2.FONT_HERSHEY_TRIPLEX, 0.5, color_red)
-
-            t_detected = datetime.now()
-
-            print(f"{t_detected} Code detected: coordinates: {bbox}, confidence: {confidences[index] * 100:.2f}%")
-
-            if OUTPUT_TO_FILE:
-                # gather data to write to a csv file
-                result = {
-                    "timestamp": t_detected, 
-                    "bbox_xmin": bbox[0], 
-                    "bbox_ymin": bbox[1], 
-                    "bbox_xmax": bbox[2], 
-                    "bbox_ymax": bbox[3], 
-                    "confidence": confidences[index]
-                    }
-
-            # QR decoding
-            
-            # make sure the selection dims won't exceed the frame dims
-            x_from = max((bbox[0] - BORDER_SIZE), 0)
-            x_to = min((bbox[2] + BORDER_SIZE), np.shape(frame)[1])
-            y_from = max((bbox[1] - BORDER_SIZE), 0)
-            y_to = min((bbox[3] + BORDER_SIZE), np.shape(frame)[0])
-            channel = 0     # blue channel is enough
-
-            # highlight the detected code in the video frame
-            cv2.rectangle(frame, (x_from, y_from), (x_to, y_to), color_red, 2)
-
-            # selection - detected code with a border
-            detected_code = frame[y_from:y_to, x_from:x_to, channel]
-            
-            # try to decode it
-            decoded_codes = zxingcpp.read_barcodes(detected_code)
-            for code in decoded_codes:
-                t_decoded = datetime.now()
-                print(f'{t_decoded} Code decoded: "{code.text}"')
-
-                cv2.putText(frame, f"{code.text}", (bbox[0] + 10, bbox[1] - 20), cv2.FONT_HERSHEY_TRIPLEX, 0.5, color_red)
-
-                if OUTPUT_TO_FILE:
-                    # gather data to write to a csv file
-                    # FIXME: since we are sending detected codes one by one, the 'decoded_codes' list should contain 0 or 1 elements.
-                    # We only get here if it contains anything at all, i.e. 1 element, thus it's OK to append the results like this,
-                    # but it should be done in a more robust way in the future
-                    result["decoded"] = code.text
-                    result["type"] = code.format
-
-
-            if OUTPUT_TO_FILE:
-                # write results to a csv file
-                try:
-                    writer.writerow(result)
-                except Exception as e:
-                    f.close()
-                    raise Exception(e)
-
-
-        # display the video frame
-        cv2.putText(frame, "NN fps: {:.2f}".format(counter / (time.monotonic() - startTime)), (2, frame.shape[0] - 4), cv2.FONT_HERSHEY_TRIPLEX, 0.4, color_white)
-        cv2.imshow("Video", frame)
-
-
-        # keyboard controls
-        key = cv2.waitKey(1)
-        # terminate the program when "q" is pressed
-        if key == ord("q"):
-            if OUTPUT_TO_FILE:
-                # close the csv file
-                f.close()
-            break
+    # ImageManip nodes with corresponding configs, camera (preview) > image manip > script
+    # https://docs.luxonis.com/projects/api/en/latest/components/nodes/image_manip/
+    for i, (xmin, ymin, xmax, ymax) in enumerate(rects):
+        manip = pipeline.create(depthai.node.ImageManip)
+        manip.initialConfig.setFrameType(depthai.ImgFrame.Type.BGR888p)
+        manip.initialConfig.setResize(NN_INPUT_SIZE_W, NN_INPUT_SIZE_H)
+        manip.initialConfig.setCropRect(xmin, ymin, xmax, ymax)
+        manip.inputImage.setWaitForMessage(True)
+        manip.inputImage.setBlocking(True)
+        manip.inputImage.setQueueSize(1)
+        manip.setMaxOutputFrameSize(NN_INPUT_SIZE_W * NN_INPUT_SIZE_H * 3)
+        cam.preview.link(manip.inputImage)
+
+        input_name = f"in_manip{i}"
+        manip.out.link(script.inputs[input_name])
+        script.inputs[input_name].setBlocking(True)
+        script.inputs[input_name].setQueueSize(1)
+
+    # YoloDetectionNetwork
+    # https://docs.luxonis.com/projects/api/en/latest/components/nodes/yolo_detection_network/
+    nn_yolo = pipeline.create(depthai.node.YoloDetectionNetwork)
+    nn_yolo.setBlobPath(str((Path(__file__).parent / Path('qr_model_512x288_rvc2_openvino_2022.1_6shave.blob')).resolve().absolute()))
+    nn_yolo.setConfidenceThreshold(confidence_threshold)
+    nn_yolo.setNumClasses(1)
+    nn_yolo.setCoordinateSize(4)
+    nn_yolo.setIouThreshold(0.5)
+    nn_yolo.setNumInferenceThreads(2)
+    nn_yolo.input.setBlocking(True)  # set blocking, otherwise configs in queue might be overwritten
+    nn_yolo.input.setQueueSize(50)  # it can keep all the crops in a queue and unblock the image manip, that would be stuck on image.send()
+    script.outputs['out_frame'].link(nn_yolo.input)
+
+    # XLinkOut (camera video, NN output)
+    # https://docs.luxonis.com/projects/api/en/latest/components/nodes/xlink_out/
+    xout_video = pipeline.create(depthai.node.XLinkOut)
+    xout_video.setStreamName("video")
+    cam.preview.link(xout_video.input)
+    xout_nn = pipeline.create(depthai.node.XLinkOut)
+    xout_nn.setStreamName("nn")
+    nn_yolo.out.link(xout_nn.input)
+    return pipeline
+
+
+# --------
+#  INPUTS
+# --------
+def device_frames(pipeline: depthai.Pipeline, crop_count: int, duration: float,
+                  record_dir: Optional[str]) -> Iterator[tuple[depthai.ImgFrame, list[depthai.ImgDetections], float]]:
+    """Yield (frame, detections of every crop, seconds spent waiting for them) until `duration` seconds passed."""
+    writers = {name: StreamWriter(directory=record_dir, name=name) for name in ("video", "nn")} if record_dir else {}
+    try:
+        with depthai.Device(pipeline) as device:
+            # blocking, a benchmark must not lose frames behind the host's back
+            video_queue = device.getOutputQueue("video", maxSize=15, blocking=True)
+            nn_queue = device.getOutputQueue("nn", maxSize=15, blocking=True)
+            end = time.monotonic() + duration
+            while time.monotonic() < end:
+                start = time.perf_counter()
+                frame = video_queue.get()
+                detections = [nn_queue.get() for _ in range(crop_count)]
+                waited = time.perf_counter() - start
+                if writers:
+                    writers["video"].write(frame)
+                    for message in detections:
+                        writers["nn"].write(message)
+                yield frame, detections, waited
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def replay_frames(directory: str, crop_count: int,
+                  duration: float) -> Iterator[tuple[depthai.ImgFrame, list[depthai.ImgDetections], float]]:
+    """Same as device_frames, from a directory written with --record. Read as fast as possible, the whole recording when `duration` is 0."""
+    frames = StreamReader(directory=directory, name="video")
+    detections = StreamReader(directory=directory, name="nn")
+    try:
+        end = time.monotonic() + duration if duration > 0 else float("inf")
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            try:
+                _, frame = frames.read()
+                crop_detections = [detections.read()[1] for _ in range(crop_count)]
+            except EOFError:
+                return
+            yield frame, crop_detections, time.perf_counter() - start
+    finally:
+        frames.close()
+        detections.close()
+
+
+# ------------
+#  PROCESSING
+# ------------
+def merge_detections(detections: list[depthai.ImgDetections], rects: np.ndarray, frame_width: int,
+                     frame_height: int) -> tuple[np.ndarray, np.ndarray]:
+    """Boxes of all crops in frame pixels (rows of xmin, ymin, xmax, ymax) and their confidences."""
+    rows = [(crop_index, detection.xmin, detection.ymin, detection.xmax, detection.ymax, detection.confidence)
+            for crop_index, message in enumerate(detections) for detection in message.detections]
+    if not rows:
+        return np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32)
+    rows = np.array(rows, dtype=np.float64)
+    crops = rects[rows[:, 0].astype(np.int64)]
+    # detection space <0..1> of the crop -> relative to the frame -> frame pixels
+    sizes = np.tile(crops[:, 2:] - crops[:, :2], 2)
+    relative = rows[:, 1:5] * sizes + np.tile(crops[:, :2], 2)
+    boxes = np.clip(relative * (frame_width, frame_height, frame_width, frame_height), 0, None).astype(np.int32)
+    return boxes, rows[:, 5].astype(np.float32)
+
+
+def nms(boxes: np.ndarray, confidences: np.ndarray, confidence_threshold: float) -> np.ndarray:
+    if len(boxes) == 0:
+        return boxes
+    nms_boxes = boxes.copy()
+    nms_boxes[:, 2:] -= nms_boxes[:, :2]  # xmin, ymin, width, height
+    indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confidences.tolist(), confidence_threshold, OVERLAP_THRESHOLD)
+    return boxes[np.asarray(indices, dtype=np.int64).reshape(-1)]
+
+
+def decode(frame: np.ndarray, boxes: np.ndarray) -> list[str]:
+    """Decoded text of every box which decodes, the boxes are cropped with a border from the blue channel.
+
+    Empty crops of boxes outside the frame and crops zxing fails on count as not decoded, as in the app.
+    """
+    height, width = frame.shape[:2]
+    texts = []
+    for xmin, ymin, xmax, ymax in boxes.tolist():
+        code = frame[max(ymin - BORDER_SIZE, 0): min(ymax + BORDER_SIZE, height), max(xmin - BORDER_SIZE, 0): min(xmax + BORDER_SIZE, width), 0]
+        text = decode_crop(code)
+        if text is not None:
+            texts.append(text)
+    return texts
+
+
+def summarize(results: list[FrameResult], seconds: float, configuration: dict) -> dict:
+    detections = sum(result.detections for result in results)
+    decoded = sum(result.decoded for result in results)
+    stages = {}
+    for stage in STAGES:
+        values = np.array([getattr(result, f"{stage}_ms") for result in results], dtype=np.float64)
+        stages[stage] = {"mean_ms": float(values.mean()), "p95_ms": float(np.percentile(values, 95)), "max_ms": float(values.max())} if len(values) else {}
+    return {"configuration": configuration, "frames": len(results), "seconds": seconds, "fps": len(results) / max(seconds, 1e-9),
+            "detections": detections, "decoded": decoded, "decode_rate": decoded / detections if detections else 0.0,
+            "decoded_per_second": decoded / max(seconds, 1e-9), "stages": stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run, 0 replays the whole recording")
+    parser.add_argument("--grid", type=int, nargs=2, default=(3, 3), metavar=("ROWS", "COLUMNS"), help="crops the preview is split into")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default="1080p")
+    parser.add_argument("--confidence", type=float, default=0.2, help="confidence threshold of the detection network and of NMS")
+    parser.add_argument("--csv", metavar="PATH", help="write the timing of every frame to a CSV file")
+    parser.add_argument("--json", metavar="PATH", help="write the summary to a JSON file")
+    parser.add_argument("--record", metavar="DIR", help="record the device streams for --replay")
+    parser.add_argument("--replay", metavar="DIR", help="run on a recording instead of a device, grid and resolution are taken from it")
+    parser.add_argument("--show", action="store_true", help="show the frames with the decoded codes, slows the measurement down")
+    args = parser.parse_args()
+    log.basicConfig(level=log.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    configuration = {"grid": list(args.grid), "resolution": args.resolution, "confidence": args.confidence}
+    if args.replay:
+        configuration.update(read_config(args.replay))
+        configuration["replay"] = args.replay
+    rows, columns = configuration["grid"]
+    if rows < 1 or columns < 1:
+        parser.error(f"Invalid grid {rows}x{columns}")
+    rects = crop_rects(rows=rows, columns=columns)
+    if args.replay:
+        frames = replay_frames(directory=args.replay, crop_count=len(rects), duration=args.duration)
+    else:
+        if args.record:
+            write_config(args.record, configuration)
+        pipeline = create_pipeline(resolution=configuration["resolution"], rects=rects, confidence_threshold=configuration["confidence"])
+        frames = device_frames(pipeline=pipeline, crop_count=len(rects), duration=args.duration, record_dir=args.record)
+
+    rects = np.array(rects, dtype=np.float64)
+    results: list[FrameResult] = []
+    csv_file = open(args.csv, "w", newline="", encoding="utf-8") if args.csv else None
+    writer = csv.DictWriter(csv_file, fieldnames=list(FrameResult.__dataclass_fields__)) if csv_file else None
+    if writer:
+        writer.writeheader()
+    start = time.monotonic()
+    try:
+        for frame_message, detections, get_seconds in frames:
+            stage_start = time.perf_counter()
+            frame = frame_message.getCvFrame()
+            converted = time.perf_counter()
+            boxes, confidences = merge_detections(detections=detections, rects=rects, frame_width=frame.shape[1], frame_height=frame.shape[0])
+            merged = time.perf_counter()
+            boxes = nms(boxes=boxes, confidences=confidences, confidence_threshold=configuration["confidence"])
+            nms_done = time.perf_counter()
+            texts = decode(frame=frame, boxes=boxes)
+            decoded = time.perf_counter()
+            result = FrameResult(frame=len(results), sequence_number=frame_message.getSequenceNum(), detections=len(boxes),
+                                 decoded=len(texts), get_ms=get_seconds * 1000, convert_ms=(converted - stage_start) * 1000,
+                                 merge_ms=(merged - converted) * 1000, nms_ms=(nms_done - merged) * 1000,
+                                 decode_ms=(decoded - nms_done) * 1000)
+            results.append(result)
+            if writer:
+                writer.writerow(asdict(result))
+            if args.show:
+                for (xmin, ymin, xmax, ymax) in boxes.tolist():
+                    cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 0, 255), 2)
+                cv2.imshow("Video", frame)
+                if cv2.waitKey(1) == ord("q"):
+                    break
+    except KeyboardInterrupt:
+        log.info("Interrupted, writing the results so far")
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    summary = summarize(results=results, seconds=time.monotonic() - start, configuration=configuration)
+    stages = ", ".join(f"{stage} {values['mean_ms']:.1f} ms" for stage, values in summary["stages"].items() if values)
+    log.info(f"{summary['frames']} frames, {summary['fps']:.2f} FPS, decoded {summary['decoded']}/{summary['detections']} "
+             f"({summary['decode_rate']:.1%}), mean per frame: {stages}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Shared between the host and the QR crop Script node, keep it to plain Python without imports.
+
+oak_pipeline.load_script prepends this file to the Script node source, on the host it can be imported and run like any
+other module.
+"""
+
+# boxes are relative to the merged image and sent as little endian 16-bit integers
+SKIP_BOX_SCALE = 10000
+MAX_SKIP_BOXES = 64
+SKIP_IOU_THRESHOLD = 0.7
+
+
+def encode_skip_boxes(boxes):
+    """Bytes of the boxes, rows of xmin, ymin, xmax, ymax relative to the merged image. 8 bytes per box."""
+    data = []
+    for box in boxes[:MAX_SKIP_BOXES]:
+        for value in box:
+            value = int(round(min(max(value, 0.0), 1.0) * SKIP_BOX_SCALE))
+            data.append(value & 0xFF)
+            data.append(value >> 8)
+    return data
+
+
+def decode_skip_boxes(data):
+    values = [data[i] | (data[i + 1] << 8) for i in range(0, len(data) - 1, 2)]
+    return [tuple(value / SKIP_BOX_SCALE for value in values[i:i + 4]) for i in range(0, len(values) - 3, 4)]
+
+
+def merged_box(detection_box, tile_origin, grid_origin, grid_size, tile_size):
+    """Detection box relative to its tile -> box relative to the merged image, the same space the host boxes are in.
+
+    :param tile_origin: top left corner of the tile, relative to the sensor frame
+    :param grid_origin: top left corner of the first tile, relative to the sensor frame
+    :param grid_size: width and height of the area covered by the tiles, relative to the sensor frame
+    :param tile_size: width and height of a tile, relative to the sensor frame
+    """
+    xmin, ymin, xmax, ymax = detection_box
+    return ((tile_origin[0] + xmin * tile_size[0] - grid_origin[0]) / grid_size[0],
+            (tile_origin[1] + ymin * tile_size[1] - grid_origin[1]) / grid_size[1],
+            (tile_origin[0] + xmax * tile_size[0] - grid_origin[0]) / grid_size[0],
+            (tile_origin[1] + ymax * tile_size[1] - grid_origin[1]) / grid_size[1])
+
+
+def box_iou(a, b):
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class SkipList:
+    """
+    The boxes of the last skip list the host sent, kept until a newer one replaces it or it is `expire_frames` frames old.
+
+    The host sends a skip list after every frame it decoded. It doesn't arrive in step with the frames the Script node
+    crops, so a frame without a new one uses the previous one - unless the host stopped sending, then it expires.
+    """
+
+    def __init__(self, expire_frames):
+        self.expire_frames = expire_frames
+        self.boxes = []
+        self._age = 0  # frames since the skip list arrived
+
+    def update(self, data):
+        """Call once per frame with the data of a newly received skip list, None when none arrived. Returns the boxes to skip."""
+        if data is not None:
+            self.boxes = decode_skip_boxes(data)
+            self._age = 0
+            return self.boxes
+        self._age += 1
+        if self._age > self.expire_frames:
+            self.boxes = []
+        return self.boxes
+
+
+def skip_mask(boxes, skip_boxes, iou_threshold=SKIP_IOU_THRESHOLD):
+    """One entry per box, 1 when the box overlaps a skip box enough to not be cropped."""
+    return [1 if any(box_iou(box, skip_box) >= iou_threshold for skip_box in skip_boxes) else 0 for box in boxes]
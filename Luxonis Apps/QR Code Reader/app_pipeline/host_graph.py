@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import robothub as rh
+
+from app_pipeline import host_node, messages
+from node_helpers import CodeLedger, DecodePool, LocalDisplay
+
+__all__ = ["HostGraph", "create_host_graph"]
+
+
+@dataclass(slots=True, kw_only=True)
+class HostGraph:
+    """The host nodes of one device which hold threads or processes, they have to be closed when the app stops."""
+    qr_code_decoder: host_node.QrCodeDecoder
+    results_reporter: host_node.ResultsReporter
+
+    def close(self) -> None:
+        # the decoder sends its last results to the reporter, which sends the codes still pending
+        self.qr_code_decoder.close()
+        self.results_reporter.close()
+
+
+def create_host_graph(high_res_frames: host_node.BaseNode, qr_detection_out: host_node.BaseNode, h264_frames: host_node.BaseNode,
+                      qr_crops_queue, with_monitor: bool = True, crop_skips_queue=None, crop_skip_list_queue=None,
+                      decode_pool: Optional[DecodePool] = None, device_mxid: Optional[str] = None,
+                      code_ledger: Optional[CodeLedger] = None, display: Optional[LocalDisplay] = None) -> HostGraph:
+    """Connect the QR host nodes to the device streams - Bridges when running on an OAK, replay sources otherwise.
+
+    :param qr_crops_queue: queue with a blocking get() the QR code crops are taken from
+    :param crop_skips_queue: queue with a blocking get() of the masks of QR code boxes not cropped, when `qr_skip_frames` is on
+    :param crop_skip_list_queue: input queue of the crop Script node for the boxes not to crop, None in a replay
+    :param decode_pool: shared by the graphs of all devices, the caller closes it
+    :param device_mxid: of the device the streams come from, the device robothub assigned when not set
+    :param code_ledger: shared by the graphs of all devices, the caller closes it
+    :param display: the monitor windows when running locally, shared by the graphs of all devices, the caller runs it
+    :returns: the nodes to close when the app stops, the QR code decoder sends the decoded codes of every frame
+    """
+    device_mxid = device_mxid or rh.DEVICE_MXID or ""
+    qr_bboxes = host_node.ReconstructQrDetections(input_node=qr_detection_out)
+    high_res_frames = host_node.HighResFramesGatherer(input_node=high_res_frames)
+    qr_boxes_and_frame_sync = host_node.Sync(inputs=[high_res_frames, qr_bboxes, h264_frames],
+                                             input_names=["high_res_rgb", "qr_bboxes", "h264_frame"],
+                                             output_message_obj=messages.FramesWithDetections)
+    qr_code_decoder = host_node.QrCodeDecoder(input_node=qr_boxes_and_frame_sync, qr_crop_queue=qr_crops_queue,
+                                              display=display if with_monitor else None, crop_skips_queue=crop_skips_queue,
+                                              crop_skip_list_queue=crop_skip_list_queue, decode_pool=decode_pool, name=device_mxid)
+    results_reporter = host_node.ResultsReporter(input_node=qr_code_decoder, device_mxid=device_mxid, code_ledger=code_ledger)
+    host_node.ThroughputReporter(input_node=qr_code_decoder, name=device_mxid or "QR host nodes")
+    if with_monitor:
+        host_node.Monitor(input_node=qr_code_decoder, name=f"qr_boxes_and_frame_sync {device_mxid}".strip(), device_mxid=device_mxid,
+                         display=display)
+    return HostGraph(qr_code_decoder=qr_code_decoder, results_reporter=results_reporter)
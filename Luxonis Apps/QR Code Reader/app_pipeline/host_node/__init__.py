@@ -3,7 +3,10 @@ from .bridge import *
 from .high_res_frames_gatherer import *
 from .monitor import *
 from .qr_code_decoder import *
+from .recorder import *
 from .reconstruct_qr_detections import *
 from .results_reporter import *
 from .sync import *
+from .throughput_reporter import *
+from .tile_history_feedback import *
 from .video_reporter import *
@@ -1,6 +1,11 @@
+from typing import Optional
+
+from node_helpers import LatencyTracer
 
 
 class BaseNode:
+    tracer: Optional[LatencyTracer] = None  # set to trace the callbacks of all host nodes
+
     def __init__(self):
         self.callbacks = []
 
@@ -8,5 +13,10 @@ class BaseNode:
         self.callbacks.append(callback)
 
     def send_message(self, message):
+        tracer = BaseNode.tracer
+        if tracer is None:
+            for callback in self.callbacks:
+                callback(message)
+            return
         for callback in self.callbacks:
-            callback(message)
+            tracer.call(callback, message)
@@ -1,94 +1,65 @@
 import logging as log
 
-import cv2
 import depthai as dai
-import numpy as np
 import robothub as rh
 
-from app_pipeline import host_node, messages, script_node
-from node_helpers import FindStart
+from app_pipeline import host_node, messages
+from node_helpers import MosaicAssembler, Timer
 
 __all__ = ["HighResFramesGatherer"]
 
 
 class HighResFramesGatherer(host_node.BaseNode):
-    """Add cr code text to qr bounding boxes."""
+    """
+    Gather the high resolution crops of one frame.
+
+    The crops are only stitched into a single image when a consumer reads HighResFrame.frame, most frames are never looked at.
+    """
     # the overlap percentage is for some reason different to the one in the script node
+    REPORT_EVERY_SECONDS = 60
 
     def __init__(self, input_node: host_node.BaseNode):
         super().__init__()
         input_node.set_callback(callback=self.__callback)
         self._target_image_count = rh.CONFIGURATION["crop_count"]
-        self._find_start = FindStart(sequence_length=self._target_image_count)
-        self._frames = []
         self._current_sequence_number = -1
-        self._current_image_count = 0
-        self._OVERLAP = rh.CONFIGURATION["merged_image_overlap"]
+        self._current_timestamp = None
+        self._tiles: list[dai.ImgFrame] = []
+        self._sent_frames = 0
+        self._mosaic = MosaicAssembler(rows=rh.CONFIGURATION["crop_grid_rows"], columns=rh.CONFIGURATION["crop_grid_columns"],
+                                       overlap=rh.CONFIGURATION["merged_image_overlap"], pool_size=rh.CONFIGURATION["merged_image_pool_size"])
+        if self._mosaic.tile_count != self._target_image_count:
+            raise ValueError(f"Crop grid {self._mosaic.rows}x{self._mosaic.columns} doesn't match crop count {self._target_image_count}")
+        self._last_report = Timer()
+        self._last_report.reset()
 
     @rh.decorators.measure_average_performance(report_every_minutes=1)
     def __callback(self, frame: dai.ImgFrame):
-        # if not self._find_start(frame):
-        #     return
         new_sequence_number = frame.getSequenceNum()
 
         if new_sequence_number != self._current_sequence_number:
+            if 0 < len(self._tiles) < self._target_image_count:
+                log.debug(f"Dropping incomplete mosaic {self._current_sequence_number}: {len(self._tiles)}/{self._target_image_count} tiles")
             self._current_sequence_number = new_sequence_number
-            self._current_image_count = 0
-            self._frames.clear()
-
-        self._frames.append(frame)
-        self._current_image_count += 1
-
-        if self._current_image_count == self._target_image_count:
-            merged_frame: np.ndarray = self._reconstruct_whole_frame()
-            message = messages.HighResFrame(frame=merged_frame, sequence_number=self._current_sequence_number)
+            self._current_timestamp = frame.getTimestamp()
+            self._tiles = []
+
+        if len(self._tiles) >= self._target_image_count:
+            log.warning(f"Too many high res crops for sequence number {new_sequence_number}, ignoring the extra crop")
+            return
+        self._tiles.append(frame)
+
+        if len(self._tiles) == self._target_image_count:
+            message = messages.HighResFrame(tiles=self._tiles, mosaic=self._mosaic, sequence_number=self._current_sequence_number,
+                                            timestamp=self._current_timestamp)
+            self._sent_frames += 1
             self.send_message(message=message)
-
-    def _reconstruct_whole_frame(self) -> np.ndarray:
-        image1 = self._frames[0].getCvFrame()
-        image2 = self._frames[1].getCvFrame()
-        image3 = self._frames[2].getCvFrame()
-        image4 = self._frames[3].getCvFrame()
-        image5 = self._frames[4].getCvFrame()
-        image6 = self._frames[5].getCvFrame()
-        image7 = self._frames[6].getCvFrame()
-        image8 = self._frames[7].getCvFrame()
-        image9 = self._frames[8].getCvFrame()
-        # cv2.imshow("image1", image1)
-        # cv2.imshow("image2", image2)
-        # cv2.imshow("image3", image3)
-        # cv2.imshow("image4", image4)
-        # cv2.imshow("image5", image5)
-        # cv2.imshow("image6", image6)
-        # cv2.imshow("image7", image7)
-        # cv2.imshow("image8", image8)
-        # cv2.imshow("image9", image9)
-
-        image_width = image1.shape[1]
-        image_height = image1.shape[0]
-        overlap_width = int(image_width * self._OVERLAP)
-        overlap_height = int(image_height * self._OVERLAP)
-
-        merged_image_width = 3 * image_width - 2 * overlap_width
-        merged_image_height = 3 * image_height - 2 * overlap_height
-
-        merged_image = np.zeros((merged_image_height, merged_image_width, 3), dtype=np.uint8)
-
-        # draw the situation to understand this
-        merged_image[: image_height, : image_width] = image1
-        merged_image[image_height - overlap_height: image_height * 2 - overlap_height, : image_width] = image2
-        merged_image[image_height * 2 - 2 * overlap_height: image_height * 3 - 2 * overlap_height, : image_width] = image3
-        merged_image[: image_height, image_width - overlap_width: image_width * 2 - overlap_width] = image4
-        merged_image[image_height - overlap_height: image_height * 2 - overlap_height,
-        image_width - overlap_width: image_width * 2 - overlap_width] = image5
-        merged_image[image_height * 2 - 2 * overlap_height: image_height * 3 - 2 * overlap_height,
-        image_width - overlap_width: image_width * 2 - overlap_width] = image6
-        merged_image[: image_height, image_width * 2 - 2 * overlap_width: image_width * 3 - 2 * overlap_width] = image7
-        merged_image[image_height - overlap_height: image_height * 2 - overlap_height, image_width * 2 - 2 * overlap_width: image_width * 3 - 2 * overlap_width] = image8
-        merged_image[image_height * 2 - 2 * overlap_height: image_height * 3 - 2 * overlap_height, image_width * 2 - 2 * overlap_width: image_width * 3 - 2 * overlap_width] = image9
-        return merged_image
-
-
-
-
-
+            self._report_allocations()
+
+    def _report_allocations(self) -> None:
+        if not self._last_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            return
+        self._last_report.reset()
+        average_bytes = self._mosaic.total_allocated_bytes / max(self._mosaic.merged_frames, 1)
+        log.info(f"Mosaic: {self._mosaic.merged_frames} of {self._sent_frames} frames merged, {self._mosaic.allocated_bytes_last_frame} bytes"
+                 f" allocated for the last merged frame, {average_bytes / 1024:.1f} kB allocated per merged frame on average")
@@ -1,44 +1,61 @@
-import cv2
+import logging as log
+from typing import Optional
+
 import robothub as rh
 
 from app_pipeline import host_node
 from app_pipeline.messages import FramesWithDetections
+from node_helpers import LocalDisplay, MonitorRenderer, Timer
 
 __all__ = ["Monitor"]
 
 
 class Monitor(host_node.BaseNode):
-    def __init__(self, input_node: host_node.BaseNode, name: str):
+    """
+    Show the QR code boxes - in an OpenCV window of `display` when running locally, in the Live View otherwise.
+
+    The window is drawn by the thread running the display, not by the dispatcher thread of the device. It shows the mosaic downscaled to DISPLAY_WIDTH, built from the tiles without stitching the full
+    resolution image, at no more than MAX_DISPLAY_FPS.
+    """
+    DISPLAY_WIDTH = 1280
+    MAX_DISPLAY_FPS = 10
+    REPORT_EVERY_SECONDS = 60
+
+    def __init__(self, input_node: host_node.BaseNode, name: str, device_mxid: str = None, display: Optional[LocalDisplay] = None):
         super().__init__()
         input_node.set_callback(callback=self.__callback)
         self.name = name
-        self._live_view = rh.DepthaiLiveView(name="Preview Live View", unique_key=rh.DEVICE_MXID, width=rh.CONFIGURATION["encoder_frame_width"],
+        self._display = display
+        device_mxid = device_mxid or rh.DEVICE_MXID
+        self._live_view = rh.DepthaiLiveView(name="Preview Live View", unique_key=device_mxid, width=rh.CONFIGURATION["encoder_frame_width"],
                                              height=rh.CONFIGURATION["encoder_frame_height"],
-                                             device_mxid=rh.DEVICE_MXID)
+                                             device_mxid=device_mxid)
+        self._renderer = MonitorRenderer(display_width=self.DISPLAY_WIDTH, max_fps=self.MAX_DISPLAY_FPS)
+        self._last_report = Timer()
+        self._last_report.reset()
 
     @rh.decorators.measure_call_frequency
     def __callback(self, message: FramesWithDetections):
-        if rh.LOCAL_DEV:
+        if self._display is not None:
             self._local_monitor(message)
         else:
             self._remote_monitor(message)
 
     def _local_monitor(self, message: FramesWithDetections):
-        img = message.high_res_rgb.frame
-        bboxes = message.qr_bboxes.bounding_boxes
-        for bbox in bboxes:
-            label = f"{bbox.label}, {bbox.confidence:.2f}"
-            # draw bounding box
-            cv2.rectangle(img, (bbox.xmin, bbox.ymin), (bbox.xmax, bbox.ymax), color=(0, 0, 255), thickness=2)
-            # draw label
-            cv2.putText(img, label, (bbox.xmin, bbox.ymin - 1), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (255, 255, 255), 2)
-        cv2.imshow(self.name, img)
-        cv2.waitKey(1)
+        if self._renderer.should_render():
+            bboxes = message.qr_bboxes.bounding_boxes
+            img = message.high_res_rgb.scaled(scale=self._renderer.scale(image_width=bboxes.width))
+            self._display.show(window=self.name, image=self._renderer.draw(image=img, bboxes=bboxes))
+        if self._last_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            statistics = self._renderer.statistics
+            log.info(f"{self.name}: shown {statistics['rendered']} frames, skipped {statistics['skipped']}, "
+                     f"{statistics['draw_seconds'] / max(statistics['rendered'], 1) * 1000:.1f} ms per drawn frame")
+            self._last_report.reset()
 
     def _remote_monitor(self, message: FramesWithDetections):
         h264_frame = message.h264_frame.getCvFrame()
         bboxes = message.qr_bboxes.bounding_boxes
-        for bbox in bboxes:
-            self._live_view.add_rectangle(bbox.transform(width=rh.CONFIGURATION["encoder_frame_width"],
-                                                         height=rh.CONFIGURATION["encoder_frame_height"]), label=bbox.label)
+        transformed = bboxes.transform(width=rh.CONFIGURATION["encoder_frame_width"], height=rh.CONFIGURATION["encoder_frame_height"])
+        for box, label in zip(transformed.tolist(), bboxes.labels):
+            self._live_view.add_rectangle(tuple(box), label=label)
         self._live_view.publish(h264_frame=h264_frame)
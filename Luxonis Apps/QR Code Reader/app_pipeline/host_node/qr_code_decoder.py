@@ -1,80 +1,195 @@
 import logging as log
+import time
 from collections import deque
+from typing import Optional
 
 import depthai as dai
+import numpy as np
 import robothub as rh
-import zxingcpp
-import cv2
 
-from app_pipeline import host_node, messages
+from app_pipeline import crop_skip, host_node, messages
+from node_helpers import BoundingBoxBatch, BoxTracker, DecodeCache, DecodeLadder, DecodePool, LadderResult, LocalDisplay, Timer, frame_plane
 
 __all__ = ["QrCodeDecoder"]
 
 
 class QrCodeDecoder(host_node.BaseNode):
     """Add cr code text to qr bounding boxes."""
-    DECODE_CHANNEL = 0  # blue channel should be enough for QR decoding
+    DECODE_CHANNEL = 0  # blue channel should be enough for QR decoding, GRAY8 crops are decoded as they are
     PADDING = 20
+    REPORT_EVERY_SECONDS = 60
 
-    def __init__(self, input_node: host_node.BaseNode, qr_crop_queue: dai.DataOutputQueue):
+    def __init__(self, input_node: host_node.BaseNode, qr_crop_queue: dai.DataOutputQueue, display: Optional[LocalDisplay] = None,
+                 crop_skips_queue: Optional[dai.DataOutputQueue] = None, crop_skip_list_queue: Optional[dai.DataInputQueue] = None,
+                 decode_pool: Optional[DecodePool] = None, name: str = ""):
+        """
+        :param decode_pool: pool shared with the decoders of other devices, the caller closes it. Without it the decoder
+            starts its own pool when `decode_workers` is set.
+        :param name: of the device, the shared decode pool schedules the devices fairly by it
+        :param crop_skips_queue: which QR code boxes the crop Script node didn't crop, None when it crops all of them
+        :param crop_skip_list_queue: the boxes not to crop in the next frames are sent to the crop Script node through it
+        :param display: shows the QR code crops when running locally
+        """
         super().__init__()
         input_node.set_callback(callback=self.__callback)
         self._qr_crop_queue = qr_crop_queue
         self._qr_crop_memory = deque(maxlen=20)
+        self._crop_skips_queue = crop_skips_queue
+        self._crop_skips_memory: Optional[dai.Buffer] = None
+        self._crop_skip_list_queue = crop_skip_list_queue
+        self._box_tracker = BoxTracker(skip_frames=rh.CONFIGURATION["qr_skip_frames"]) if crop_skips_queue is not None else None
+        self._crop_skip_statistics = {"boxes": 0, "skipped": 0}  # QR detections before NMS, as the device crops them
+        self._display = display
+        self._frame_budget_seconds = rh.CONFIGURATION["decode_frame_budget_ms"] / 1000
+        self._decode_ladder = DecodeLadder.from_configuration(rh.CONFIGURATION)
+        self._name = name
+        self._owns_decode_pool = decode_pool is None
+        if decode_pool is None and rh.CONFIGURATION["decode_workers"] > 0:
+            decode_pool = DecodePool(workers=rh.CONFIGURATION["decode_workers"], ladder=self._decode_ladder)
+        self._decode_pool = decode_pool
+        if self._decode_pool is not None:
+            self._decode_pool.register(self._name)
+        self._decode_cache = DecodeCache(max_entries=rh.CONFIGURATION["decode_cache_size"],
+                                         max_age_seconds=rh.CONFIGURATION["decode_cache_max_age_seconds"])
+        self._last_report = Timer()
+        self._last_report.reset()
 
     @rh.decorators.measure_average_performance(report_every_minutes=0.3)
     def __callback(self, frames_and_detections: messages.FramesWithDetections):
         qr_bboxes = frames_and_detections.qr_bboxes
-        expected_crops = len(qr_bboxes.bounding_boxes)
-        i = 0
-        for bbox in qr_bboxes.bounding_boxes:
+        bboxes = qr_bboxes.bounding_boxes
+        expected_crops = len(bboxes)
+        skipped = [False] * expected_crops
+        if self._crop_skips_queue is not None:
+            skipped = self._get_crop_skips(sequence_number=qr_bboxes.sequence_number, box_count=expected_crops)
+            if skipped is None:
+                return
+        for i, bbox_sequence_number in enumerate(bboxes.sequence_numbers):
+            if skipped[i]:
+                continue
             log.debug(f"Getting crop {i} of {expected_crops}")
             if len(self._qr_crop_memory) > 0:
                 crop = self._qr_crop_memory.popleft()
             else:
                 crop = self._qr_crop_queue.get()
-            if crop.getSequenceNum() < bbox.frame_sequence_number:
+            if crop.getSequenceNum() < bbox_sequence_number:
                 # fetch all crops which have lower sequence number then the current qr code detection
                 while True:
                     if len(self._qr_crop_memory) > 0:
                         crop = self._qr_crop_memory.popleft()
                     else:
                         crop = self._qr_crop_queue.get()
-                    if crop.getSequenceNum() >= bbox.frame_sequence_number:
+                    if crop.getSequenceNum() >= bbox_sequence_number:
                         break
-            elif crop.getSequenceNum() > bbox.frame_sequence_number:
+            elif crop.getSequenceNum() > bbox_sequence_number:
                 log.warning(f"Did not receive QR code crops for all QR code detections. Some QR code crops are probably too large."
                             f"Increase the QR code distance from the camera to avoid this.")
                 self._qr_crop_memory.append(crop)
                 return
 
-            log.debug(f"App: {i}, {bbox.frame_sequence_number=} {crop.getSequenceNum()=}")
-            i += 1
-            bbox.set_crop(crop=crop)
+            log.debug(f"App: {i}, {bbox_sequence_number=} {crop.getSequenceNum()=}")
+            bboxes.set_crop(index=i, crop=crop)
 
-        qr_bboxes.bounding_boxes = host_node.ReconstructQrDetections.perform_nms_on_bboxes(bounding_boxes=qr_bboxes.bounding_boxes)
-        for bbox in qr_bboxes.bounding_boxes:
-            crop_frame = bbox.crop.getCvFrame()
-            crop_frame = crop_frame[:, :, self.DECODE_CHANNEL]
-            width, height = crop_frame.shape
-            if rh.LOCAL_DEV:
-                cv2.imshow(f"crop{bbox.counter}", crop_frame)
-            if width > 0 and height > 0:
-                try:
-                    decoded_codes = zxingcpp.read_barcodes(crop_frame)
-                except IndexError:
-                    continue
-                if len(decoded_codes) > 0:
-                    if len(decoded_codes) > 1:
-                        log.warning(f"More than one QR code detected in crop {i}")
-                    decoded_code = decoded_codes[0]
-                    bbox.set_label(label=decoded_code.text)
+        bboxes = host_node.ReconstructQrDetections.perform_nms_on_bboxes(bounding_boxes=bboxes)
+        qr_bboxes.bounding_boxes = bboxes
+        cropped = [i for i, crop in enumerate(bboxes.crops) if crop is not None]
+        crop_frames = [frame_plane(bboxes.crops[i], channel=self.DECODE_CHANNEL) for i in cropped]
+        if self._display is not None:
+            for i, crop_frame in zip(cropped, crop_frames):
+                if crop_frame.size > 0:
+                    self._display.show(window=f"crop{bboxes.counters[i]}", image=crop_frame)
+        labels: list[Optional[str]] = [None] * len(bboxes)
+        for i, label in zip(cropped, self._decode(bboxes=bboxes.select(cropped), crop_frames=crop_frames)):
+            labels[i] = label
+        if self._box_tracker is not None:
+            self._track_boxes(bboxes=bboxes, labels=labels)
+        for i, label in enumerate(labels):
+            if label is not None:
+                bboxes.set_label(index=i, label=label)
         # cv2.imshow("4k", high_res_frame)
-        if len(qr_bboxes.bounding_boxes) > 0:
-            if qr_bboxes.bounding_boxes[0].crop.getSequenceNum() != qr_bboxes.bounding_boxes[-1].crop.getSequenceNum():
+        crops = [bboxes.crops[i] for i in cropped]
+        if len(crops) > 0:
+            if crops[0].getSequenceNum() != crops[-1].getSequenceNum():
                 # this should never happen, would mean error in pipeline setup, probably some queue is not blocking and messages get lost
                 log.critical(
-                    f"Crop gatherer Sequence numbers are not the same: {qr_bboxes.bounding_boxes[0].crop.getSequenceNum()} != {qr_bboxes.bounding_boxes[-1].crop.getSequenceNum()}")
-                # FindStart.reset()
-                # self._crop_count = 0
+                    f"Crop gatherer Sequence numbers are not the same: {crops[0].getSequenceNum()} != {crops[-1].getSequenceNum()}")
         self.send_message(frames_and_detections)
+
+    def _get_crop_skips(self, sequence_number: int, box_count: int) -> Optional[list[bool]]:
+        """Which boxes of the frame the crop Script node didn't crop, None when the frame has to be dropped."""
+        while True:
+            if self._crop_skips_memory is not None:
+                message, self._crop_skips_memory = self._crop_skips_memory, None
+            else:
+                message = self._crop_skips_queue.get()
+            if message.getSequenceNum() >= sequence_number:
+                break
+        if message.getSequenceNum() > sequence_number:
+            log.warning(f"Did not receive the QR crop skip mask for sequence number {sequence_number}")
+            self._crop_skips_memory = message
+            return None
+        data = message.getData()
+        # the first byte is the mask length, as a check the mask belongs to the same detections
+        if len(data) != box_count + 1 or data[0] != box_count % 256:
+            log.warning(f"QR crop skip mask of {len(data) - 1} boxes doesn't match the {box_count} QR detections")
+            return None
+        skipped = [bool(value) for value in data[1:]]
+        self._crop_skip_statistics["boxes"] += box_count
+        self._crop_skip_statistics["skipped"] += sum(skipped)
+        return skipped
+
+    def _track_boxes(self, bboxes: BoundingBoxBatch, labels: list[Optional[str]]) -> None:
+        """Fill in the text of the boxes which weren't cropped and send the boxes not to crop in the next frame to the device."""
+        skipped = [crop is None for crop in bboxes.crops]
+        tracks = self._box_tracker.update(boxes=bboxes.relative, labels=labels, skipped=skipped)
+        for i, track in enumerate(tracks):
+            if skipped[i]:
+                labels[i] = track.text
+        if self._crop_skip_list_queue is not None:
+            message = dai.Buffer()
+            message.setData(crop_skip.encode_skip_boxes(self._box_tracker.skip_list().tolist()))
+            self._crop_skip_list_queue.send(message)
+
+    def _decode(self, bboxes: BoundingBoxBatch, crop_frames: list[np.ndarray]) -> list[Optional[str]]:
+        """Look the crops up in the decode cache and decode only the cache misses."""
+        keys = [self._decode_cache.key(crop=crop_frame, box=tuple(box)) for box, crop_frame in zip(bboxes.absolute.tolist(), crop_frames)]
+        labels = [self._decode_cache.get(key) for key in keys]
+        misses = [i for i, label in enumerate(labels) if label is None]
+        for i, result in zip(misses, self._decode_crops(crop_frames=[crop_frames[i] for i in misses])):
+            if result is None:
+                continue
+            self._decode_ladder.record(result)
+            if result.codes > 1:
+                log.warning(f"More than one QR code detected in crop {bboxes.counters[i]}, using the first one")
+            if result.text is not None:
+                labels[i] = result.text
+                self._decode_cache.put(key=keys[i], text=result.text)
+        self._report_statistics()
+        return labels
+
+    def _decode_crops(self, crop_frames: list[np.ndarray]) -> list[Optional[LadderResult]]:
+        """Results of the crops decoded within the frame budget, None for the rest."""
+        if self._decode_pool is not None:
+            return self._decode_pool.decode(crops=crop_frames, budget_seconds=self._frame_budget_seconds, client=self._name)
+        deadline = time.monotonic() + self._frame_budget_seconds
+        return [self._decode_ladder.decode(crop_frame, deadline=deadline) if time.monotonic() < deadline else None
+                for crop_frame in crop_frames]
+
+    def _report_statistics(self) -> None:
+        if not self._last_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            return
+        self._last_report.reset()
+        prefix = f"{self._name}: " if self._name else ""
+        log.info(f"{prefix}Decode cache: {len(self._decode_cache)} entries, {self._decode_cache.statistics}")
+        log.info(f"{prefix}Decode ladder: crops decoded per rung {self._decode_ladder.statistics}")
+        if self._decode_pool is not None:
+            log.info(f"{prefix}Decode pool: {self._decode_pool.client_statistics[self._name]}, whole pool {self._decode_pool.statistics}")
+        if self._box_tracker is not None:
+            statistics = self._crop_skip_statistics
+            log.info(f"{prefix}Crop skipping: {statistics['skipped']} of {statistics['boxes']} QR code boxes not cropped "
+                     f"({statistics['skipped'] / max(statistics['boxes'], 1):.0%}), tracker {self._box_tracker.statistics}")
+
+    def close(self) -> None:
+        if self._decode_pool is not None and self._owns_decode_pool:
+            self._decode_pool.close()
+        self._decode_pool = None
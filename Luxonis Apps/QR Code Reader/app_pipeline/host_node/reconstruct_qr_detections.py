@@ -1,11 +1,11 @@
 import logging as log
 
-import cv2
 import depthai as dai
+import numpy as np
 import robothub as rh
 
 from app_pipeline import host_node, messages, script_node
-from node_helpers import BoundingBox, FindStart
+from node_helpers import BoundingBoxBatch, Timer
 
 __all__ = ["ReconstructQrDetections"]
 
@@ -14,19 +14,30 @@ class ReconstructQrDetections(host_node.BaseNode):
     """
     From 9 detection messages, reconstruct 1 message with all 9 detections.
     Apply NMS and recalculate bboxes from the crop space to frame space.
+
+    The messages of a frame are grouped by sequence number and the boxes are moved to the frame space by the tile index the
+    tiling Script node writes into the data of every message, see app_pipeline/tile_index.py. Recordings made before the
+    data carried it fall back to the detection labels (`tile_index_in_label`), older ones to the position of the message in
+    its group. A frame with a missing message is dropped, the next sequence number starts a new group, so a lost message
+    never shifts the boxes of later frames. Dropped and misaligned groups are counted in `statistics`.
     """
+    REPORT_EVERY_SECONDS = 60
 
     def __init__(self, input_node: host_node.BaseNode):
         super().__init__()
         input_node.set_callback(callback=self.__callback)
         self._TOTAL_CROP_COUNT = script_node.NUMBER_OF_CROPPED_IMAGES
-        self._find_start = FindStart(sequence_length=self._TOTAL_CROP_COUNT)
-        self._find_start.disable()
-        self._sequence_number = 0
-        self._crop_count = 0
-        self._x_offset = 0
-        self._y_offset = 0
-        self._bounding_boxes: list[BoundingBox] = []
+        self._tile_index_in_label = rh.CONFIGURATION["tile_index_in_label"]
+        self._sequence_number = None
+        self._timestamp = None
+        self._crop_count = 0  # messages received for the current sequence number
+        self._misaligned = False  # a tile index of the group didn't match its position, a message went missing
+        self._bounding_boxes: list[np.ndarray] = []  # per crop rows of xmin, ymin, xmax, ymax, confidence, sequence number
+        # incomplete - dropped because a message was missing, misaligned - tile indices out of order, late - older than the
+        # current group, extra - more messages than tiles
+        self.statistics = {"groups": 0, "incomplete": 0, "misaligned": 0, "late": 0, "extra": 0}
+        self._last_report = Timer()
+        self._last_report.reset()
 
         self._CROP_WIDTH = rh.CONFIGURATION["high_res_crop_width"]
         self._CROP_HEIGHT = rh.CONFIGURATION["high_res_crop_height"]
@@ -38,82 +49,84 @@ class ReconstructQrDetections(host_node.BaseNode):
 
     def __callback(self, yolo_output: dai.ImgDetections):
         log.debug(f"Got detections for sequence number {yolo_output.getSequenceNum()}")
-        # if not self._find_start(yolo_output):
-        #     return
-        self._sequence_number = yolo_output.getSequenceNum()
-        self._transform_to_frame_space(detections=yolo_output)
-        self._send_results()
-        self._increase_crop_count()
-        self._update_coord_offset()
-
-    def _transform_to_frame_space(self, detections: dai.ImgDetections) -> None:
-        log.debug(f"{self._crop_count=} xoff: {self._x_offset} yoff: {self._y_offset}")
-        new_bboxes = []
-        for detection in detections.detections:
-            detection: dai.ImgDetection
-            xmin_abs_crop = int(detection.xmin * self._CROP_WIDTH)
-            ymin_abs_crop = int(detection.ymin * self._CROP_HEIGHT)
-            xmax_abs_crop = int(detection.xmax * self._CROP_WIDTH)
-            ymax_abs_crop = int(detection.ymax * self._CROP_HEIGHT)
-
-            xmin_abs_frame = xmin_abs_crop + self._x_offset
-            ymin_abs_frame = ymin_abs_crop + self._y_offset
-            xmax_abs_frame = xmax_abs_crop + self._x_offset
-            ymax_abs_frame = ymax_abs_crop + self._y_offset
-            log.debug(f"CropNR: seq_num {detections.getSequenceNum()} nr: {self._crop_count}")
-
-            log.debug(f"CropNR: {self._crop_count}\n"
-                      f"Det: xmin: {detection.xmin} ymin: {detection.ymin} xmax: {detection.xmax} ymax: {detection.ymax},\n"
-                      f"Old: xmin: {xmin_abs_crop} ymin: {ymin_abs_crop} xmax: {xmax_abs_crop} ymax: {ymax_abs_crop},\n"
-                      f"New: xmin: {xmin_abs_frame} ymin: {ymin_abs_frame} xmax: {xmax_abs_frame} ymax: {ymax_abs_frame}\n"
-                      f"OFFSETS: xoff: {self._x_offset} yoff: {self._y_offset}")
-            bbox = BoundingBox.from_absolute(xmin=xmin_abs_frame, ymin=ymin_abs_frame, xmax=xmax_abs_frame, ymax=ymax_abs_frame,
-                                             confidence=detection.confidence,
-                                             image_height=self._FRAME_HEIGHT, image_width=self._FRAME_WIDTH,
-                                             sequence_number=detections.getSequenceNum())
-            self._bounding_boxes.append(bbox)
-
-    def _increase_crop_count(self):
-        self._crop_count += 1
+        sequence_number = yolo_output.getSequenceNum()
+        if self._sequence_number is not None and sequence_number < self._sequence_number:
+            self.statistics["late"] += 1
+            log.debug(f"Dropping late detections of sequence number {sequence_number}, already at {self._sequence_number}")
+            return
+        if sequence_number != self._sequence_number:
+            self._start_group(sequence_number=sequence_number, timestamp=yolo_output.getTimestamp())
         if self._crop_count >= self._TOTAL_CROP_COUNT:
-            self._crop_count = 0
+            self.statistics["extra"] += 1
+            log.warning(f"More than {self._TOTAL_CROP_COUNT} detection messages for sequence number {sequence_number}, ignoring the extra one")
+            return
+        tile_index = self._tile_index(yolo_output)
+        if tile_index != self._crop_count and not self._misaligned:
+            # the boxes still land in the right tile, but the frame misses a message and will be dropped
+            self._misaligned = True
+            self.statistics["misaligned"] += 1
+            log.debug(f"Detections of tile {tile_index} arrived as message {self._crop_count} of sequence number {sequence_number}")
+        self._transform_to_frame_space(detections=yolo_output, tile_index=tile_index)
+        self._crop_count += 1
+        if self._crop_count == self._TOTAL_CROP_COUNT:
+            self._send_results()
+        self._report_statistics()
+
+    def _start_group(self, sequence_number: int, timestamp) -> None:
+        if 0 < self._crop_count < self._TOTAL_CROP_COUNT:
+            self.statistics["incomplete"] += 1
+            log.debug(f"Dropping detections of sequence number {self._sequence_number}: "
+                      f"{self._crop_count}/{self._TOTAL_CROP_COUNT} messages received")
+        self._sequence_number = sequence_number
+        self._timestamp = timestamp
+        self._crop_count = 0
+        self._misaligned = False
+        self._bounding_boxes.clear()
 
-    def _send_results(self):
-        if self._crop_count != self._TOTAL_CROP_COUNT - 1:  # counting crops from zero
+    def _tile_index(self, detections: dai.ImgDetections) -> int:
+        data = detections.getData()
+        if len(data):
+            return int(data[0])
+        if self._tile_index_in_label and len(detections.detections):
+            return detections.detections[0].label
+        # without the tile index, empty messages of recordings with labels too, the position in the group is all there is
+        return self._crop_count
+
+    def _transform_to_frame_space(self, detections: dai.ImgDetections, tile_index: int) -> None:
+        if len(detections.detections) == 0:
             return
+        rows = np.array([(detection.xmin, detection.ymin, detection.xmax, detection.ymax, detection.confidence, detections.getSequenceNum())
+                         for detection in detections.detections], dtype=np.float64)
+        # truncate to the crop pixel grid first, then move to the frame space
+        rows[:, :4] = (rows[:, :4] * (self._CROP_WIDTH, self._CROP_HEIGHT, self._CROP_WIDTH, self._CROP_HEIGHT)).astype(np.int64)
+        rows[:, 0:4:2] += self._OVERLAP_WIDTH * (tile_index // 3)
+        rows[:, 1:4:2] += self._OVERLAP_HEIGHT * (tile_index % 3)
+        log.debug(f"CropNR: seq_num {detections.getSequenceNum()} tile: {tile_index}\n"
+                  f"New: {rows[:, :4].tolist()}")
+        self._bounding_boxes.append(rows)
+
+    def _send_results(self):
         log.debug(f"Sending results for sequence number: {self._sequence_number}")
-        bboxes = self._bounding_boxes
-        if len(bboxes) > 1:
-            log.debug(f"BBoxes: {bboxes}")
-            # make sure all detections are from the same frame
-            if bboxes[0].getSequenceNum() != bboxes[-1].getSequenceNum():
-                log.warning(
-                    f"QR detections Sequence numbers are not the same: {bboxes[0].getSequenceNum()} != {bboxes[-1].getSequenceNum()}")
-                # FindStart.enable()
-                self._crop_count = len([bbox for bbox in bboxes if bbox.getSequenceNum() != bboxes[0].getSequenceNum])
-                self._update_coord_offset()
-                self._bounding_boxes.clear()
-                return
-        for i in range(len(bboxes)):
-            bbox = bboxes[i]
-            bbox.counter = i
-        message = messages.QrBoundingBoxes(bounding_boxes=bboxes, sequence_number=self._sequence_number)
+        if self._bounding_boxes:
+            rows = np.concatenate(self._bounding_boxes)
+            bboxes = BoundingBoxBatch.from_absolute(absolute=rows[:, :4], confidences=rows[:, 4],
+                                                    image_width=self._FRAME_WIDTH, image_height=self._FRAME_HEIGHT,
+                                                    sequence_numbers=rows[:, 5])
+        else:
+            bboxes = BoundingBoxBatch.empty(image_width=self._FRAME_WIDTH, image_height=self._FRAME_HEIGHT)
+        self.statistics["groups"] += 1
+        message = messages.QrBoundingBoxes(bounding_boxes=bboxes, sequence_number=self._sequence_number, timestamp=self._timestamp)
         self.send_message(message=message)
-
         self._bounding_boxes.clear()
 
+    def _report_statistics(self) -> None:
+        if not self._last_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            return
+        self._last_report.reset()
+        log.info(f"QR detection groups: {self.statistics}")
+
     @staticmethod
-    def perform_nms_on_bboxes(bounding_boxes: list[BoundingBox]) -> list[BoundingBox]:
+    def perform_nms_on_bboxes(bounding_boxes: BoundingBoxBatch) -> BoundingBoxBatch:
         confidence_threshold = 0.5
         overlap_threshold = 0.01
-        confidences = [bbox.confidence for bbox in bounding_boxes]
-        nms_boxes = [bbox.as_nms_box() for bbox in bounding_boxes]
-        indices = cv2.dnn.NMSBoxes(nms_boxes, confidences, confidence_threshold, overlap_threshold)
-        bboxes_after_nms = []
-        for index in indices:
-            bboxes_after_nms.append(bounding_boxes[index])
-        return bboxes_after_nms
-
-    def _update_coord_offset(self):
-        self._x_offset = int(self._OVERLAP_WIDTH * (self._crop_count // 3))
-        self._y_offset = int(self._OVERLAP_HEIGHT * (self._crop_count % 3))
+        return bounding_boxes.nms(confidence_threshold=confidence_threshold, overlap_threshold=overlap_threshold)
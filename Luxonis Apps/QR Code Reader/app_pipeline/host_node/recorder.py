@@ -0,0 +1,43 @@
+import depthai as dai
+
+from app_pipeline import host_node
+from node_helpers import StreamWriter
+
+__all__ = ["StreamRecorder", "RecordingQueue"]
+
+
+class StreamRecorder(host_node.BaseNode):
+    """Write every message of the input node to disk, see node_helpers.StreamWriter."""
+
+    def __init__(self, input_node: host_node.BaseNode, directory: str, name: str):
+        super().__init__()
+        input_node.set_callback(callback=self.__callback)
+        self._writer = StreamWriter(directory=directory, name=name)
+
+    def __callback(self, message):
+        self._writer.write(message)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class RecordingQueue:
+    """Wraps an output queue which is read directly (not through a Bridge) and records every message taken from it."""
+
+    def __init__(self, queue: dai.DataOutputQueue, directory: str, name: str):
+        self._queue = queue
+        self._writer = StreamWriter(directory=directory, name=name)
+
+    def get(self):
+        message = self._queue.get()
+        self._writer.write(message)
+        return message
+
+    def tryGet(self):
+        message = self._queue.tryGet()
+        if message is not None:
+            self._writer.write(message)
+        return message
+
+    def close(self) -> None:
+        self._writer.close()
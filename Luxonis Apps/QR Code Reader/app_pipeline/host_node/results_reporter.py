@@ -1,68 +1,83 @@
 import logging as log
-from collections import deque
-from typing import Callable
+import time
+from typing import Optional
 
 import cv2
-import numpy as np
 import robothub as rh
 
 from app_pipeline import host_node, messages
-from node_helpers import Timer
+from node_helpers import BackgroundSender, CodeLedger, CoalescedReport, ReportAggregator, Timer
 
 __all__ = ["ResultsReporter"]
 
 
 class ResultsReporter(host_node.BaseNode):
+    """
+    Send an image event when new QR codes show up.
+
+    At most one event is sent per REPORT_COOLDOWN_SECONDS, new codes seen in the meantime are coalesced into the next event
+    together with the frame showing the most codes. Drawing, JPEG encoding and the upload run on a background thread.
+    With a `code_ledger`, every decoded code is kept in it and codes seen within the last `code_ledger_dedup_hours`, also
+    before a restart, are not reported again. The ledger is shared by the reporters of all devices, the caller closes it.
+    `close` sends the codes still coalesced and waits up to CLOSE_TIMEOUT_SECONDS for the queued reports.
+    """
     NOT_SEED_THRESHOLD = 10
+    REPORT_COOLDOWN_SECONDS = 35
+    REPORT_EVERY_SECONDS = 60
+    CLOSE_TIMEOUT_SECONDS = 10
 
-    def __init__(self, input_node: host_node.BaseNode):
+    def __init__(self, input_node: host_node.BaseNode, device_mxid: str = None, code_ledger: Optional[CodeLedger] = None):
         super().__init__()
         input_node.set_callback(callback=self.__callback)
+        self._device_mxid = device_mxid or rh.DEVICE_MXID
 
-        self._rh_report_buffer = deque(maxlen=4)
+        self._aggregator = ReportAggregator()
+        self._sender = BackgroundSender(send=self._send_report, max_queued=2, name="QrReportSender")
         self._last_rh_report_sent = Timer()
         self._last_rh_report_sent.reset()
+        self._last_statistics_report = Timer()
+        self._last_statistics_report.reset()
         self._qr_code_memory = {}  # label -> not seen for x frames
+        self._ledger = code_ledger
+        self._dedup_seconds = rh.CONFIGURATION["code_ledger_dedup_hours"] * 3600 if code_ledger is not None else 0
 
     def __callback(self, frames_and_detections: messages.FramesWithDetections):
         qr_detections = frames_and_detections.qr_bboxes.bounding_boxes
-        new_qr_codes = {}
+        new_qr_codes = {}  # label -> index in qr_detections
         existing_qr_codes = {}
-        for qr_code in qr_detections:
-            if qr_code.label and qr_code.label not in self._qr_code_memory:
-                self._qr_code_memory[qr_code.label] = 0
-                new_qr_codes[qr_code.label] = qr_code
+        now = time.time()
+        for i, label in enumerate(qr_detections.labels):
+            if label and label not in self._qr_code_memory:
+                self._qr_code_memory[label] = 0
+                if self._ledger is not None and self._ledger.seen_since(label, since=now - self._dedup_seconds):
+                    log.info(f"QR code {label} is back, it was last seen less than {self._dedup_seconds / 3600:.0f} hours ago")
+                    existing_qr_codes[label] = i
+                else:
+                    new_qr_codes[label] = i
             else:
-                existing_qr_codes[qr_code.label] = qr_code
+                existing_qr_codes[label] = i
+
+        boxes = []
+        if new_qr_codes or self._ledger is not None:
+            decoded = qr_detections.select([i for i, label in enumerate(qr_detections.labels) if label])
+            transformed = decoded.transform(width=rh.CONFIGURATION["merged_image_width"], height=rh.CONFIGURATION["merged_image_height"])
+            boxes = [(tuple(box), label, confidence) for box, label, confidence in
+                     zip(transformed.tolist(), decoded.labels, decoded.confidences.tolist())]
+        if self._ledger is not None:
+            for box, label, _ in boxes:
+                self._ledger.record(label, box=box, seen=now)
 
         if new_qr_codes:
             log.info(f"New QR codes found: {new_qr_codes.keys()}")
-            context_image = frames_and_detections.high_res_rgb.frame
-            qr_boxes = messages.QrBoundingBoxes(bounding_boxes=list(new_qr_codes.values()), sequence_number=frames_and_detections.getSequenceNum())
-            for bbox in qr_boxes.bounding_boxes:
-                xmin, ymin, xmax, ymax = bbox.transform(width=rh.CONFIGURATION["merged_image_width"], height=rh.CONFIGURATION["merged_image_height"])
-                context_image = cv2.rectangle(context_image, (int(xmin), int(ymin)), (int(xmax), int(ymax)), (0, 0, 255), 2)
-                # write label on the frame
-                label = f"{bbox.label}, {bbox.confidence:.3f}"
-                cv2.putText(context_image, label, (int(xmin), int(ymin - 5)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 1, cv2.LINE_AA)
-
-            rh_report = messages.RhReport(context_image=context_image, qr_bboxes=qr_boxes,
-                                          sequence_number=frames_and_detections.getSequenceNum())
-            if len(self._rh_report_buffer) < self._rh_report_buffer.maxlen:
-                self._rh_report_buffer.append(rh_report)
-            else:
-                log.warning(f"Too many reports in buffer, dropping {rh_report.getSequenceNum()=}")
+            # the merged frame is only stitched, and copied, when it becomes the context image of the report
+            self._aggregator.add(new_labels=list(new_qr_codes), boxes=boxes, image=lambda: frames_and_detections.high_res_rgb.frame,
+                                 sequence_number=frames_and_detections.getSequenceNum())
 
-        if self._last_rh_report_sent.has_elapsed(time_in_seconds=35) and len(self._rh_report_buffer) > 0:
+        if self._last_rh_report_sent.has_elapsed(time_in_seconds=self.REPORT_COOLDOWN_SECONDS) and self._aggregator.has_pending:
             self._last_rh_report_sent.reset()
-            rh_report: messages.RhReport = self._rh_report_buffer.popleft()
-            log.info(f"Sending QR code report with {len(rh_report.qr_bboxes.bounding_boxes)} QR codes")
-            rh.send_image_event(image=rh_report.context_image,
-                                title="QR CODE REPORT",
-                                device_id=rh.DEVICE_MXID,
-                                tags=["qr_code_report"],
-                                encode=True,
-                                mjpeg_quality=60)
+            report = self._aggregator.flush()
+            if not self._sender.submit(report):
+                log.warning(f"QR code report sender is busy, dropping report with {len(report.labels)} QR codes")
 
         for qr_code_label in list(self._qr_code_memory.keys()):
             # when seen, reset counter to zero, because it means for how long ar label was not spotted
@@ -74,3 +89,36 @@ class ResultsReporter(host_node.BaseNode):
                 if self._qr_code_memory[qr_code_label] >= self.NOT_SEED_THRESHOLD:
                     log.info(f"QR code {qr_code_label} not seen for {self._qr_code_memory[qr_code_label]} frames, removing from memory.")
                     self._qr_code_memory.pop(qr_code_label)
+        self._report_statistics()
+
+    def close(self) -> None:
+        """Send the pending report and stop the sender thread, no callbacks may come any more."""
+        if self._aggregator.has_pending:
+            report = self._aggregator.flush()
+            if not self._sender.submit(report, timeout=self.CLOSE_TIMEOUT_SECONDS):
+                log.warning(f"QR code report sender is busy, dropping the last report with {len(report.labels)} QR codes")
+        self._sender.close(timeout=self.CLOSE_TIMEOUT_SECONDS)
+
+    def _send_report(self, report: CoalescedReport) -> None:
+        context_image = report.image
+        for (xmin, ymin, xmax, ymax), label, confidence in report.boxes:
+            context_image = cv2.rectangle(context_image, (xmin, ymin), (xmax, ymax), (0, 0, 255), 2)
+            # write label on the frame
+            cv2.putText(context_image, f"{label}, {confidence:.3f}", (xmin, ymin - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 1,
+                        cv2.LINE_AA)
+        log.info(f"Sending QR code report with {len(report.labels)} new QR codes")
+        rh.send_image_event(image=context_image,
+                            title="QR CODE REPORT",
+                            device_id=self._device_mxid,
+                            metadata={"qr_codes": report.labels},
+                            tags=["qr_code_report"],
+                            encode=True,
+                            mjpeg_quality=60)
+
+    def _report_statistics(self) -> None:
+        if not self._last_statistics_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            return
+        self._last_statistics_report.reset()
+        log.info(f"QR code reports: {self._aggregator.statistics}, events {self._sender.statistics}")
+        if self._ledger is not None:
+            log.info(f"QR code ledger: {self._ledger.statistics}")
@@ -1,24 +1,49 @@
+import logging as log
 from functools import partial
+from typing import Optional
 
 from app_pipeline import host_node, synchronization
+from node_helpers import Timer
 
 __all__ = ["Sync"]
 
 
 class Sync(host_node.BaseNode):
-    """General Sync Node."""
+    """General Sync Node.
 
-    def __init__(self, inputs: list[host_node.BaseNode], input_names: list[str], output_message_obj):
+    Messages are matched by sequence number, or by device timestamp when `timestamp_tolerance_seconds` is set.
+    """
+    REPORT_EVERY_SECONDS = 60
+
+    def __init__(self, inputs: list[host_node.BaseNode], input_names: list[str], output_message_obj,
+                 timestamp_tolerance_seconds: Optional[float] = None):
         super().__init__()
         self._output_message_obj = output_message_obj
         self._wait_for_messages_nr = len(inputs)
-        self._synchronizer = synchronization.Synchronizer(number_of_messages_per_sequence_number=self._wait_for_messages_nr)
+        self._by_timestamp = timestamp_tolerance_seconds is not None
+        self._synchronizer = synchronization.Synchronizer(number_of_messages_per_sequence_number=self._wait_for_messages_nr,
+                                                          timestamp_tolerance=timestamp_tolerance_seconds)
         self._synchronizer.add_callback(self._process_synced_messages)
         for _input, input_name in zip(inputs, input_names):
             _input.set_callback(callback=partial(self.__callback, input_name))
+        self._last_report = Timer()
+        self._last_report.reset()
 
     def __callback(self, input_name, message):
-        self._synchronizer.add_message(message=message, sequence_number=message.getSequenceNum(), identifier=input_name)
+        timestamp = message.getTimestamp().total_seconds() if self._by_timestamp else None
+        self._synchronizer.add_message(message=message, sequence_number=message.getSequenceNum(), identifier=input_name, timestamp=timestamp)
+        self._report_drops()
 
     def _process_synced_messages(self, messages: dict):
-        self.send_message(message=self._output_message_obj(**messages))
+        # the synced message is as old as its oldest part
+        timestamps = [message.getTimestamp() for message in messages.values() if hasattr(message, "getTimestamp")]
+        timestamp = min((timestamp for timestamp in timestamps if timestamp is not None), default=None)
+        self.send_message(message=self._output_message_obj(**messages, timestamp=timestamp))
+
+    def _report_drops(self) -> None:
+        if not self._last_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            return
+        self._last_report.reset()
+        drops = {reason: dict(counters) for reason, counters in self._synchronizer.statistics.items() if counters}
+        if drops:
+            log.info(f"Sync {self._output_message_obj.__name__} dropped messages: {drops}")
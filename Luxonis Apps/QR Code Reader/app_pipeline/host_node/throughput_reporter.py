@@ -0,0 +1,46 @@
+import logging as log
+
+import depthai as dai
+
+from app_pipeline import host_node, messages
+from node_helpers import Timer
+
+__all__ = ["ThroughputReporter"]
+
+
+class ThroughputReporter(host_node.BaseNode):
+    """Log the frame rate and the latency of the decoded frames of one device every REPORT_EVERY_SECONDS.
+
+    The latency is measured from the frame timestamp, the device time synced to the host clock, to the moment the frame
+    got through the decoder.
+    """
+    REPORT_EVERY_SECONDS = 60
+
+    def __init__(self, input_node: host_node.BaseNode, name: str):
+        super().__init__()
+        input_node.set_callback(callback=self.__callback)
+        self.name = name
+        self._frames = 0
+        self._latencies: list[float] = []
+        self._last_report = Timer()
+        self._last_report.reset()
+
+    def __callback(self, frames_and_detections: messages.FramesWithDetections):
+        self._frames += 1
+        if frames_and_detections.getTimestamp() is not None:
+            self._latencies.append((dai.Clock.now() - frames_and_detections.getTimestamp()).total_seconds())
+        if self._last_report.has_elapsed(time_in_seconds=self.REPORT_EVERY_SECONDS):
+            self.report()
+
+    def report(self) -> None:
+        elapsed = self._last_report.elapsed_seconds()
+        latencies = sorted(self._latencies)
+        if latencies:
+            latency = (f"latency mean {sum(latencies) / len(latencies) * 1000:.0f} ms, "
+                       f"p95 {latencies[int(0.95 * (len(latencies) - 1))] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+        else:
+            latency = "no latency measured"
+        log.info(f"{self.name}: {self._frames / max(elapsed, 1e-9):.2f} FPS, {latency}")
+        self._frames = 0
+        self._latencies = []
+        self._last_report.reset()
@@ -0,0 +1,37 @@
+import logging as log
+
+import depthai as dai
+import robothub as rh
+
+from app_pipeline import host_node
+
+__all__ = ["TileHistoryFeedback"]
+
+
+class TileHistoryFeedback(host_node.BaseNode):
+    """
+    Send the number of QR detections per tile of every frame back to the tiling Script node.
+
+    The Script node scans tiles without recent detections only every `empty_tile_scan_interval`-th frame, see
+    app_pipeline/tile_scheduler.py.
+    """
+
+    def __init__(self, input_node: host_node.BaseNode, control_queue: dai.DataInputQueue):
+        super().__init__()
+        input_node.set_callback(callback=self.__callback)
+        self._control_queue = control_queue
+        self._tile_count = rh.CONFIGURATION["crop_count"]
+        self._sequence_number = -1
+        self._detection_counts: list[int] = []
+
+    def __callback(self, detections: dai.ImgDetections):
+        if detections.getSequenceNum() != self._sequence_number:
+            if 0 < len(self._detection_counts) < self._tile_count:
+                log.debug(f"Incomplete tile history for sequence number {self._sequence_number}: {len(self._detection_counts)} tiles")
+            self._sequence_number = detections.getSequenceNum()
+            self._detection_counts = []
+        self._detection_counts.append(min(len(detections.detections), 255))
+        if len(self._detection_counts) == self._tile_count:
+            message = dai.Buffer()
+            message.setData(self._detection_counts)
+            self._control_queue.send(message)
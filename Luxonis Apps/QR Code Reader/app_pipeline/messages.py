@@ -1,29 +1,58 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Optional
 
+import cv2
 import depthai as dai
 import numpy as np
 
-from node_helpers import BoundingBox
+from node_helpers import BoundingBoxBatch, MosaicAssembler
 
-__all__ = ["Message", "FramesWithDetections", "QrBoundingBoxes", "RhReport", "HighResFrame"]
+__all__ = ["Message", "FramesWithDetections", "QrBoundingBoxes", "HighResFrame"]
 
 
 @dataclass(slots=True, kw_only=True)
 class Message:
     sequence_number: int
+    timestamp: Optional[timedelta] = None  # device timestamp of the source frame
 
     def getSequenceNum(self) -> int:
         return self.sequence_number
 
+    def getTimestamp(self) -> Optional[timedelta]:
+        return self.timestamp
+
 
 @dataclass(slots=True, kw_only=True)
 class QrBoundingBoxes(Message):
-    bounding_boxes: list[BoundingBox]
+    bounding_boxes: BoundingBoxBatch
 
 
 @dataclass(slots=True, kw_only=True)
 class HighResFrame(Message):
-    frame: np.ndarray
+    """High resolution crops of one frame, stitched into a single image on the first access of `frame`."""
+    tiles: list[dai.ImgFrame]
+    mosaic: MosaicAssembler
+    _frame: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @property
+    def frame(self) -> np.ndarray:
+        if self._frame is None:
+            self._frame = self.mosaic.assemble(self.tiles)
+            self.tiles = []
+        return self._frame
+
+    def scaled(self, scale: float) -> np.ndarray:
+        """The merged image resized by `scale`, made from the tiles unless the image was stitched already. Doesn't stitch it."""
+        if self._frame is None:
+            return self.mosaic.assemble_scaled(tiles=self.tiles, scale=scale)
+        width = max(1, round(self._frame.shape[1] * scale))
+        height = max(1, round(self._frame.shape[0] * scale))
+        return cv2.resize(self._frame, (width, height), interpolation=cv2.INTER_AREA)
+
+    @property
+    def is_merged(self) -> bool:
+        return self._frame is not None
 
 
 @dataclass(slots=True, kw_only=True)
@@ -31,9 +60,3 @@ class FramesWithDetections(Message):
     high_res_rgb: HighResFrame
     h264_frame: dai.ImgFrame
     qr_bboxes: QrBoundingBoxes
-
-
-@dataclass(slots=True, kw_only=True)
-class RhReport(Message):
-    context_image: np.ndarray
-    qr_bboxes: QrBoundingBoxes
@@ -2,6 +2,8 @@ import depthai as dai
 import robothub as rh
 from depthai_sdk.components.nn_helper import Path
 
+from app_pipeline import crop_skip
+
 
 def create_pipeline(pipeline: dai.Pipeline) -> None:
     fps = 2 if rh.CONFIGURATION["resolution"] == "5312x6000" else 4
@@ -16,8 +18,12 @@ def create_pipeline(pipeline: dai.Pipeline) -> None:
     if rh.CONFIGURATION["manual_focus"] != 0:
         rgb_sensor.initialControl.setManualFocus(rh.CONFIGURATION["manual_focus"])
 
-    script_node = create_script_node(pipeline=pipeline, script_name="app_pipeline/script_node.py")
-    script_node_qr_crops = create_script_node(pipeline=pipeline, script_name="app_pipeline/script_node_qr_crops.py")
+    adaptive_tiles = rh.CONFIGURATION["empty_tile_scan_interval"] > 1
+    script_node = create_script_node(pipeline=pipeline, script_name="app_pipeline/script_node.py",
+                                     includes=["app_pipeline/tile_scheduler.py", "app_pipeline/tile_index.py"])
+    skip_decoded_crops = rh.CONFIGURATION["qr_skip_frames"] > 0
+    script_node_qr_crops = create_script_node(pipeline=pipeline, script_name="app_pipeline/script_node_qr_crops.py",
+                                              includes=["app_pipeline/crop_skip.py"])
     rgb_sensor.isp.link(script_node.inputs["rgb_frame"])
     rgb_sensor.isp.link(script_node_qr_crops.inputs["rgb_frame"])
     script_node.inputs["rgb_frame"].setBlocking(True)
@@ -50,16 +56,22 @@ def create_pipeline(pipeline: dai.Pipeline) -> None:
     else:
         raise ValueError(f"Unknown resolution: {rh.CONFIGURATION['resolution']}")
 
+    # the script node sits between the detection network and its input, it sends the tiles with their tile index and forwards
+    # only the scheduled ones, see app_pipeline/tile_index.py and app_pipeline/tile_scheduler.py
     image_manip_nn_input_crop = create_image_manip(pipeline=pipeline, source=image_manip_1to1_crop.out,
                                                    resize=(nn_input_width, nn_input_height), frames_pool=9, blocking_input_queue=True,
                                                    input_queue_size=9)
+    image_manip_nn_input_crop.out.link(script_node.inputs["tile_frame"])
+    script_node.inputs["tile_frame"].setBlocking(True)
+    script_node.inputs["tile_frame"].setQueueSize(9)
 
+    qr_crop_frame_type = dai.RawImgFrame.Type.GRAY8 if rh.CONFIGURATION["gray_qr_crops"] else dai.RawImgFrame.Type.BGR888p
     to_qr_crop_manip = create_image_manip(pipeline=pipeline, source=script_node_qr_crops.outputs["to_qr_crop_manip"],
-                                          keep_aspect_ration=False, frame_type=dai.RawImgFrame.Type.BGR888p, blocking_input_queue=True,
+                                          keep_aspect_ration=False, frame_type=qr_crop_frame_type, blocking_input_queue=True,
                                           input_queue_size=5, wait_for_config=True, max_output_frame_size=5_000_000)
     script_node_qr_crops.outputs["to_qr_crop_manip_cfg"].link(to_qr_crop_manip.inputConfig)
 
-    qr_detection_nn = create_yolo_nn(pipeline=pipeline, source=image_manip_nn_input_crop.out,
+    qr_detection_nn = create_yolo_nn(pipeline=pipeline, source=script_node.outputs["nn_input"],
                                      model_path=nn_model_path,
                                      confidence_threshold=0.5)
     qr_detection_nn.setNumPoolFrames(10)
@@ -77,7 +89,30 @@ def create_pipeline(pipeline: dai.Pipeline) -> None:
     script_node_qr_crops_input.setMaxDataSize(8)
 
     # linking
-    qr_detection_nn.out.link(script_node_qr_crops.inputs["qr_detection_nn"])
+    qr_detection_nn.out.link(script_node.inputs["nn_detections"])
+    script_node.inputs["nn_detections"].setBlocking(True)
+    script_node.inputs["nn_detections"].setQueueSize(9)
+    qr_detections = script_node.outputs["qr_detections"]
+    if adaptive_tiles:
+        tile_history_input = pipeline.createXLinkIn()
+        tile_history_input.setStreamName("tile_history")
+        tile_history_input.setNumFrames(2)
+        tile_history_input.setMaxDataSize(16)
+        tile_history_input.out.link(script_node.inputs["tile_history"])
+        # only the latest history matters
+        script_node.inputs["tile_history"].setBlocking(False)
+        script_node.inputs["tile_history"].setQueueSize(1)
+    if skip_decoded_crops:
+        # boxes the host decoded in the last frames, see app_pipeline/crop_skip.py
+        crop_skip_list_input = pipeline.createXLinkIn()
+        crop_skip_list_input.setStreamName("crop_skip_list")
+        crop_skip_list_input.setNumFrames(2)
+        crop_skip_list_input.setMaxDataSize(8 * crop_skip.MAX_SKIP_BOXES)
+        crop_skip_list_input.out.link(script_node_qr_crops.inputs["crop_skip_list"])
+        # only the latest list matters
+        script_node_qr_crops.inputs["crop_skip_list"].setBlocking(False)
+        script_node_qr_crops.inputs["crop_skip_list"].setQueueSize(1)
+    qr_detections.link(script_node_qr_crops.inputs["qr_detection_nn"])
     rgb_input.out.link(rgb_sensor.inputControl)
     script_node_input.out.link(script_node.inputs["script_node_input"])
     script_node_qr_crops_input.out.link(script_node_qr_crops.inputs["script_node_qr_crops_input"])
@@ -86,8 +121,10 @@ def create_pipeline(pipeline: dai.Pipeline) -> None:
     script_node.inputs["script_node_qr_crops_input"].setQueueSize(1)
 
     # outputs
-    create_output(pipeline=pipeline, node=qr_detection_nn.out, stream_name="qr_detection_out")
+    create_output(pipeline=pipeline, node=qr_detections, stream_name="qr_detection_out")
     create_output(pipeline=pipeline, node=to_qr_crop_manip.out, stream_name="qr_crops")
+    if skip_decoded_crops:
+        create_output(pipeline=pipeline, node=script_node_qr_crops.outputs["qr_crop_skips"], stream_name="qr_crop_skips")
     create_output(pipeline=pipeline, node=image_manip_1to1_crop.out, stream_name="high_res_frames")
     create_output(pipeline=pipeline, node=h264_encoder.bitstream, stream_name="h264_stream")
 
@@ -110,20 +147,25 @@ def create_rgb_sensor(pipeline: dai.Pipeline, fps: float) -> dai.node.ColorCamer
     return node
 
 
-def create_script_node(pipeline, script_name: str):
+def create_script_node(pipeline, script_name: str, includes: list[str] = ()):
     script_node = pipeline.createScript()
-    script_node.setScript(load_script(script_name=script_name))
+    script_node.setScript(load_script(script_name=script_name, includes=includes))
 
     return script_node
 
 
-def load_script(script_name: str):
+def load_script(script_name: str, includes: list[str] = ()):
+    """Script source with the plain Python modules in `includes` prepended, so the device and the host share their code."""
     from string import Template
     with open(script_name, 'r') as file:
         code = Template(file.read()).substitute(
             DEBUG=''
         )
-    return code
+    included = []
+    for include in includes:
+        with open(include, 'r') as file:
+            included.append(file.read())
+    return "\n\n".join(included + [code])
 
 
 def create_h264_encoder(pipeline: dai.Pipeline, fps: float) -> dai.node.VideoEncoder:
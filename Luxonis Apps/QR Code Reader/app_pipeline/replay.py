@@ -0,0 +1,97 @@
+import logging as log
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+import depthai as dai
+
+from app_pipeline import host_node
+from node_helpers import StreamReader
+
+__all__ = ["ReplaySource", "ReplayQueue", "Replayer"]
+
+
+class ReplaySource(host_node.BaseNode):
+    """Stands in for a Bridge, the Replayer sends the recorded messages through it."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+
+
+class ReplayQueue:
+    """Stands in for an output queue which the host nodes read directly."""
+
+    def __init__(self, reader: StreamReader):
+        self._reader = reader
+
+    def get(self):
+        try:
+            return self._reader.read()[1]
+        except EOFError as e:
+            # a closed device queue raises RuntimeError as well
+            raise RuntimeError(str(e)) from e
+
+    def tryGet(self):
+        if self._reader.peek_received_ns() is None:
+            return None
+        return self._reader.read()[1]
+
+
+class Replayer:
+    """
+    Feed a recording made with `record_streams` through the host nodes without a device.
+
+    Messages of the bridged streams are sent in the order the host received them, either paced like the recording
+    (`real_time=True`) or as fast as the host nodes can process them.
+    Timestamps are moved to the replay time, keeping the recorded device to host delay, so latencies measured during the
+    replay compare to the live ones.
+    """
+    BRIDGED_STREAMS = ("high_res_frames", "qr_detection_out", "h264_stream")
+    QUEUE_STREAMS = ("qr_crops",)
+    OPTIONAL_QUEUE_STREAMS = ("qr_crop_skips",)  # only recorded with some options, see `queues`
+
+    def __init__(self, directory: str, real_time: bool = False):
+        self._real_time = real_time
+        queue_streams = self.QUEUE_STREAMS + tuple(name for name in self.OPTIONAL_QUEUE_STREAMS
+                                                   if os.path.exists(os.path.join(directory, f"{name}.rec")))
+        self._readers = {name: StreamReader(directory=directory, name=name) for name in self.BRIDGED_STREAMS + queue_streams}
+        self.sources = {name: ReplaySource(name=name) for name in self.BRIDGED_STREAMS}
+        self.queues = {name: ReplayQueue(reader=self._readers[name]) for name in queue_streams}
+        self.replayed_messages = {name: 0 for name in self.BRIDGED_STREAMS}
+
+    def seek(self, sequence_number: int) -> None:
+        for reader in self._readers.values():
+            reader.seek(sequence_number)
+
+    def run(self, stop_event: Optional[threading.Event] = None) -> float:
+        """Replay until the end of the recording, returns the replay duration in seconds."""
+        readers = [self._readers[name] for name in self.BRIDGED_STREAMS]
+        first_received_ns = None
+        start = time.monotonic()
+        while stop_event is None or not stop_event.is_set():
+            pending = [(reader.peek_received_ns(), reader) for reader in readers if reader.peek_received_ns() is not None]
+            if not pending:
+                break
+            received_ns, reader = min(pending, key=lambda item: item[0])
+            if first_received_ns is None:
+                first_received_ns = received_ns
+            if self._real_time:
+                delay = (received_ns - first_received_ns) / 1e9 - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            _, message = reader.read()
+            message.setTimestamp(dai.Clock.now() - (timedelta(microseconds=received_ns / 1000) - message.getTimestamp()))
+            try:
+                self.sources[reader.name].send_message(message)
+            except RuntimeError as e:
+                log.warning(f"Replay stopped: {e}")
+                break
+            self.replayed_messages[reader.name] += 1
+        return time.monotonic() - start
+
+    def close(self) -> None:
+        for reader in self._readers.values():
+            reader.close()
@@ -1,4 +1,6 @@
+import time
 
+# TileScheduler and the tile index helpers are prepended from tile_scheduler.py and tile_index.py by oak_pipeline.load_script
 
 NUMBER_OF_CROPPED_IMAGES = 9
 
@@ -39,11 +41,54 @@ def clamp(num, minimum, maximum):
     return max(minimum, min(num, maximum))
 
 
+def forward_scheduled_tiles(scanned, scheduler):
+    """Send the scanned tiles to the detection network and emit one detections message per tile, in tile order.
+
+    Every tile goes to the network with its index packed into the sequence number, the detections are matched to their tile
+    by it, see app_pipeline/tile_index.py.
+    """
+    start = time.monotonic()
+    tiles = []
+    for i in range(NUMBER_OF_CROPPED_IMAGES):
+        tile = node.io["tile_frame"].get()
+        tiles.append((tile.getSequenceNum(), tile.getTimestamp(), tile.getTimestampDevice()))
+        if scanned[i]:
+            tile.setSequenceNum(tile_sequence_number(tiles[i][0], i))
+            node.io["nn_input"].send(tile)
+    sequence_number = tiles[0][0]
+    results = [None] * NUMBER_OF_CROPPED_IMAGES
+    pending = sum(scanned)
+    while pending:
+        detections = node.io["nn_detections"].get()
+        tile_index = restore_sequence_number(detections, sequence_number)
+        if tile_index is None or tile_index >= NUMBER_OF_CROPPED_IMAGES or not scanned[tile_index] or results[tile_index] is not None:
+            node.warn(f"Dropping detections with tile sequence number {detections.getSequenceNum()}, "
+                      f"waiting for the tiles of sequence number {sequence_number}")
+            continue
+        results[tile_index] = detections
+        pending -= 1
+    for i in range(NUMBER_OF_CROPPED_IMAGES):
+        detections = results[i]
+        if detections is None:
+            # skipped tiles get an empty result, the host and the QR crop script still see one message per tile
+            detections = ImgDetections()
+            detections.setSequenceNum(tiles[i][0])
+            detections.setTimestamp(tiles[i][1])
+            detections.setTimestampDevice(tiles[i][2])
+        node.io["qr_detections"].send(stamp_tile_index(detections, i))
+    scheduler.record_inference(seconds=time.monotonic() - start, scanned_tiles=sum(scanned))
+    report = scheduler.report()
+    if report is not None:
+        node.info(report)
+
+
 def run():
     message = node.io["script_node_input"].get()
     data = message.getData()
     node.error(f"Data received: {data[0]}")
     resolution = data[0]  # 0 for 5312x6000, 1 for 4k
+    scan_interval = data[1] if len(data) > 1 else 1  # 1 sends every tile to the detection network
+    scheduler = TileScheduler(tile_count=NUMBER_OF_CROPPED_IMAGES, scan_interval=scan_interval, clock=time.monotonic)
     if resolution == 0:
         IMG_PROPS = ImageProperties5312x6000()
     else:
@@ -51,6 +96,12 @@ def run():
 
     while True:
         rgb_frame = node.io["rgb_frame"].get()
+        scanned = [True] * NUMBER_OF_CROPPED_IMAGES
+        if scan_interval > 1:
+            history = node.io["tile_history"].tryGet()
+            if history is not None:
+                scheduler.update(list(history.getData()))
+            scanned = scheduler.schedule()
         for i in range(NUMBER_OF_CROPPED_IMAGES):
             xmin, ymin, = IMG_PROPS.crop_vals[i]
             xmax, ymax = xmin + IMG_PROPS.STEP_WIDTH + IMG_PROPS.OVERLAP_WIDTH, ymin + IMG_PROPS.STEP_HEIGHT + IMG_PROPS.OVERLAP_HEIGHT
@@ -64,6 +115,7 @@ def run():
             node.debug(f"Script QR Crop {i}")
             node.io['image_manip_1to1_crop_cfg'].send(cfg)
             node.io['image_manip_1to1_crop'].send(rgb_frame)
+        forward_scheduled_tiles(scanned=scanned, scheduler=scheduler)
 
 
 if __name__ == 'lpb':
@@ -41,19 +41,46 @@ def run():
     data = message.getData()
     node.error(f"Data received: {data[0]}")
     resolution = data[0]  # 0 for 5312x6000, 1 for 4k
+    # the decoder on the host needs a single channel, GRAY8 crops are a third of the BGR size
+    crop_frame_type = ImgFrame.Type.GRAY8 if len(data) > 2 and data[2] == 1 else ImgFrame.Type.BGR888p
+    # boxes decoded by the host in the last frames are not cropped again for up to data[3] frames, see app_pipeline/crop_skip.py
+    skip_crops = len(data) > 3 and data[3] > 0
+    skip_list = SkipList(expire_frames=data[3] if skip_crops else 0)
     if resolution == 0:
         IMG_PROPS = ImageProperties5312x6000()
     else:
         IMG_PROPS = ImageProperties4k()
+    tile_size = (IMG_PROPS.WIDTH_RELATIVE_SCALE, IMG_PROPS.HEIGHT_RELATIVE_SCALE)
+    grid_origin = IMG_PROPS.crop_vals[0]
+    grid_size = (IMG_PROPS.crop_vals[-1][0] + tile_size[0] - grid_origin[0], IMG_PROPS.crop_vals[-1][1] + tile_size[1] - grid_origin[1])
 
     while True:
         rgb_frame = node.io["rgb_frame"].get()
         counter = 0
+        tiles = []
         for i in range(NUMBER_OF_CROPPED_IMAGES):
             node.debug(f"Script Calling get() on nn detections {i}")
-            qr_detections = node.io["qr_detection_nn"].get()
+            tiles.append(node.io["qr_detection_nn"].get())
+        skipped = []
+        if skip_crops:
+            # the mask goes out before the crops, the host needs it to know which crops to wait for
+            skip_list_message = node.io["crop_skip_list"].tryGet()
+            skip_boxes = skip_list.update(skip_list_message.getData() if skip_list_message is not None else None)
+            boxes = [merged_box((detection.xmin, detection.ymin, detection.xmax, detection.ymax), IMG_PROPS.crop_vals[i], grid_origin,
+                                grid_size, tile_size)
+                     for i, qr_detections in enumerate(tiles) for detection in qr_detections.detections]
+            skipped = skip_mask(boxes, skip_boxes)
+            mask = Buffer(len(skipped) + 1)
+            mask.setData([len(skipped) % 256] + skipped)
+            mask.setSequenceNum(rgb_frame.getSequenceNum())
+            node.io["qr_crop_skips"].send(mask)
+        box_index = -1
+        for i, qr_detections in enumerate(tiles):
             xmin_orig_frame, ymin_orig_frame, = IMG_PROPS.crop_vals[i]
             for detection in qr_detections.detections:
+                box_index += 1
+                if skipped and skipped[box_index] == 1:
+                    continue
                 node.debug(f"Script QR Detection {counter}")
                 xmin, ymin, xmax, ymax = (detection.xmin * IMG_PROPS.WIDTH_RELATIVE_SCALE + xmin_orig_frame - PADDING,
                                           detection.ymin * IMG_PROPS.HEIGHT_RELATIVE_SCALE + ymin_orig_frame - PADDING,
@@ -69,7 +96,7 @@ def run():
                 cfg = ImageManipConfig()
                 cfg.setCropRect(xmin, ymin, xmax, ymax)
                 cfg.setKeepAspectRatio(False)
-                cfg.setFrameType(ImgFrame.Type.BGR888p)
+                cfg.setFrameType(crop_frame_type)
 
                 node.io['to_qr_crop_manip_cfg'].send(cfg)
                 node.io['to_qr_crop_manip'].send(rgb_frame)
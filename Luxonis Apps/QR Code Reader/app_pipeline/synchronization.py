@@ -1,42 +1,122 @@
 import logging as log
-from typing import Any
+from collections import defaultdict
+from typing import Any, Optional
+
+
+class _Group:
+    __slots__ = ("key", "sequence_number", "timestamp", "messages")
+
+    def __init__(self, key: int, sequence_number: int, timestamp: Optional[float]):
+        self.key = key
+        self.sequence_number = sequence_number
+        self.timestamp = timestamp
+        self.messages = {}
 
 
 class Synchronizer:
+    """
+    Group messages with the same sequence number and send the group once a message from every input arrived.
+
+    Pending groups live in a fixed size ring indexed by sequence number modulo `capacity`, so adding a message and
+    completing a group take constant time. Eviction sweeps the ring from the oldest pending sequence number on, but every
+    slot is swept at most once as that start moves forward, so it is amortized O(1) per sequence number and at most
+    O(capacity) for a single message. When a group completes, all older pending groups are dropped.
+    When the ring is full, the oldest pending groups are evicted to make room.
 
-    def __init__(self, number_of_messages_per_sequence_number: int):
+    With `timestamp_tolerance` set, messages are grouped by device timestamp (seconds) instead of sequence number, for
+    streams whose sequence numbers don't line up. A message joins a pending group of a neighbouring timestamp bucket if
+    the timestamps differ by at most the tolerance.
+
+    Dropped messages are counted per input in `statistics`:
+    late - arrived after its group was completed or dropped, duplicate - the input already had a message in its group,
+    evicted_incomplete - dropped together with a group that never completed.
+    """
+
+    def __init__(self, number_of_messages_per_sequence_number: int, capacity: int = 256, timestamp_tolerance: Optional[float] = None):
+        if capacity < 1:
+            raise ValueError(f"{capacity=} must be at least 1")
+        if timestamp_tolerance is not None and timestamp_tolerance <= 0:
+            raise ValueError(f"{timestamp_tolerance=} must be positive")
         self.__callbacks = []
-        self.__msgs = {}
+        self.__ring: list[Optional[_Group]] = [None] * capacity
+        self.__capacity = capacity
+        self.__oldest_key = None  # no group with a smaller key can be pending
+        self.__pending = 0
         self.__number_of_messages_per_sequence_number = number_of_messages_per_sequence_number
+        self.__timestamp_tolerance = timestamp_tolerance
+        self.statistics = {"late": defaultdict(int), "duplicate": defaultdict(int), "evicted_incomplete": defaultdict(int)}
 
     def add_callback(self, callback: callable):
         self.__callbacks.append(callback)
 
-    def add_message(self, message: any, sequence_number: int, identifier: Any):
-        if sequence_number not in self.__msgs:
-            self.__msgs[sequence_number] = {}
-        self.__msgs[sequence_number][identifier] = message
+    def add_message(self, message: any, sequence_number: int, identifier: Any, timestamp: Optional[float] = None):
+        group = self.__group_for(sequence_number=sequence_number, identifier=identifier, timestamp=timestamp)
+        if group is None:
+            self.statistics["late"][identifier] += 1
+            log.debug(f"Dropping late message {identifier} with sequence number {sequence_number}")
+            return
+        if identifier in group.messages:
+            self.statistics["duplicate"][identifier] += 1
+            log.debug(f"Duplicate message {identifier} with sequence number {sequence_number}, replacing the previous one")
+        group.messages[identifier] = message
 
-        if len(self.__msgs[sequence_number]) == self.__number_of_messages_per_sequence_number:
-            messages: dict = self.__msgs.pop(sequence_number)
-            messages["sequence_number"] = sequence_number
-            self.__send_synchronized_messages(messages)
+        if len(group.messages) == self.__number_of_messages_per_sequence_number:
+            self.__release(group)
             # remove older sequence_numbers
-            keys_to_remove = []
-            for sequence_number_memory in self.__msgs.keys():
-                if sequence_number_memory < sequence_number:
-                    keys_to_remove.append(sequence_number_memory)
-                else:
+            self.__evict_older_than(group.key + 1)
+            messages: dict = group.messages
+            messages["sequence_number"] = group.sequence_number
+            self.__send_synchronized_messages(messages)
+
+    def __group_for(self, sequence_number: int, identifier: Any, timestamp: Optional[float]) -> Optional[_Group]:
+        if self.__timestamp_tolerance is None:
+            key = sequence_number
+        else:
+            if timestamp is None:
+                raise ValueError("Timestamp is required when synchronizing by timestamp")
+            key = round(timestamp / self.__timestamp_tolerance)
+            for neighbour_key in (key - 1, key + 1):
+                neighbour = self.__ring[neighbour_key % self.__capacity]
+                if neighbour is not None and neighbour.key == neighbour_key and identifier not in neighbour.messages \
+                        and abs(neighbour.timestamp - timestamp) <= self.__timestamp_tolerance:
+                    return neighbour
+
+        if self.__oldest_key is None:
+            self.__oldest_key = key
+        if key < self.__oldest_key:
+            return None
+        if key - self.__oldest_key >= self.__capacity:
+            # make room for a few more groups at once, so the error isn't logged for every message
+            evict_before = key - self.__capacity + min(10, self.__capacity)
+            log.error(f"Too many sequence numbers in memory, evicting groups older than {evict_before}")
+            self.__evict_older_than(evict_before)
+
+        group = self.__ring[key % self.__capacity]
+        if group is None:
+            group = _Group(key=key, sequence_number=sequence_number, timestamp=timestamp)
+            self.__ring[key % self.__capacity] = group
+            self.__pending += 1
+        return group
+
+    def __release(self, group: _Group):
+        self.__ring[group.key % self.__capacity] = None
+        self.__pending -= 1
+
+    def __evict_older_than(self, key: int):
+        """Drop pending groups with a smaller key, visits at most `capacity` slots and never one before `__oldest_key`."""
+        if self.__pending > 0:
+            stop = min(key, self.__oldest_key + self.__capacity)
+            for old_key in range(self.__oldest_key, stop):
+                group = self.__ring[old_key % self.__capacity]
+                if group is None or group.key != old_key:
+                    continue
+                log.debug(f"Removing sequence number {group.sequence_number} from memory")
+                for identifier in group.messages:
+                    self.statistics["evicted_incomplete"][identifier] += 1
+                self.__release(group)
+                if self.__pending == 0:
                     break
-            # remove old keys
-            for key in keys_to_remove:
-                log.debug(f"Removing sequence number {key} from memory")
-                self.__msgs.pop(key)
-        # make sure memory doesn't get too long
-        if len(self.__msgs) > 200:
-            log.error(f"Too many sequence numbers in memory removing first 10")
-            for _ in range(10):
-                self.__msgs.pop(list(self.__msgs.keys())[0])
+        self.__oldest_key = max(self.__oldest_key, key)
 
     def __send_synchronized_messages(self, messages: dict):
         for callback in self.__callbacks:
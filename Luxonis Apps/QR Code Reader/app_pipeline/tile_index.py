@@ -0,0 +1,39 @@
+"""Shared by the Script nodes, keep it to plain Python without imports.
+
+oak_pipeline.load_script prepends this file to the Script node source.
+"""
+
+# tile indices are packed into the low bits of the sequence number a tile is sent to the detection network with
+TILE_SLOTS = 16
+
+
+def tile_sequence_number(sequence_number, tile_index):
+    """Sequence number to send a tile to the detection network with, the network copies it into the tile's detections."""
+    return sequence_number * TILE_SLOTS + tile_index
+
+
+def restore_sequence_number(detections, sequence_number):
+    """Tile index of detections of a tile sent with tile_sequence_number, None if they belong to another frame.
+
+    The detections get the sequence number of the frame back.
+    """
+    frame_sequence_number, tile_index = divmod(detections.getSequenceNum(), TILE_SLOTS)
+    if frame_sequence_number != sequence_number:
+        return None
+    detections.setSequenceNum(sequence_number)
+    return tile_index
+
+
+def stamp_tile_index(detections, tile_index):
+    """Write the index of the tile into the detections message, also when it has no detections.
+
+    The message data gets the index as its only byte, and the label of every detection too - the QR code detection network
+    has a single class, so the label is free. The host maps the message to its tile by it, instead of counting the
+    messages, which goes wrong as soon as one message is lost.
+    """
+    stamped = detections.detections
+    for detection in stamped:
+        detection.label = tile_index
+    detections.detections = stamped
+    detections.setData([tile_index])
+    return detections
@@ -0,0 +1,81 @@
+"""Shared between the host and the tiling Script node, keep it to plain Python without imports.
+
+oak_pipeline.load_script prepends this file to the Script node source, on the host it can be imported and run like any
+other module.
+"""
+
+
+class TileScheduler:
+    """
+    Decide which tiles of the crop grid go through the QR detection network.
+
+    Tiles with a detection in the last `hold_frames` frames are scanned every frame, the other tiles only every
+    `scan_interval`-th frame. Empty tiles are staggered over the interval, so the inference load stays even.
+    The detection history comes from the host, see `update`.
+    """
+
+    def __init__(self, tile_count, scan_interval, hold_frames=None, clock=None, report_every_seconds=30.0):
+        if scan_interval < 1:
+            raise ValueError("scan_interval must be at least 1")
+        self.tile_count = tile_count
+        self.scan_interval = scan_interval
+        self.hold_frames = scan_interval if hold_frames is None else hold_frames
+        self._frame_index = 0
+        # every tile starts as active, the first frames are scanned completely
+        self._last_detection = [0] * tile_count
+        self._clock = clock
+        self._report_every_seconds = report_every_seconds
+        self._report_started = None
+        self._skipped_tiles = 0
+        self._scanned_tiles = 0
+        self._inference_seconds = 0.0
+
+    def update(self, detection_counts):
+        """Detections per tile of the last frame the host processed."""
+        for tile_index, count in enumerate(detection_counts[:self.tile_count]):
+            if count > 0:
+                self._last_detection[tile_index] = self._frame_index
+
+    def schedule(self):
+        """List of booleans, True for the tiles to scan in the next frame."""
+        scanned = [schedule_tile(frame_index=self._frame_index, tile_index=tile_index, last_detection=self._last_detection[tile_index],
+                                 scan_interval=self.scan_interval, hold_frames=self.hold_frames)
+                   for tile_index in range(self.tile_count)]
+        self._frame_index += 1
+        scanned_count = sum(scanned)
+        self._scanned_tiles += scanned_count
+        self._skipped_tiles += self.tile_count - scanned_count
+        return scanned
+
+    def record_inference(self, seconds, scanned_tiles):
+        """Time the scanned tiles of one frame spent in the detection network."""
+        if scanned_tiles > 0:
+            self._inference_seconds += seconds
+
+    def report(self):
+        """Every `report_every_seconds` a summary of the inference time saved, None otherwise."""
+        if self._clock is None:
+            return None
+        now = self._clock()
+        if self._report_started is None:
+            self._report_started = now
+            return None
+        elapsed = now - self._report_started
+        if elapsed < self._report_every_seconds:
+            return None
+        seconds_per_tile = self._inference_seconds / self._scanned_tiles if self._scanned_tiles else 0.0
+        saved_per_second = self._skipped_tiles * seconds_per_tile / elapsed
+        report = (f"Tile scheduler: {self._skipped_tiles} of {self._skipped_tiles + self._scanned_tiles} tiles skipped, "
+                  f"~{saved_per_second * 1000:.0f} ms of NN inference saved per second")
+        self._report_started = now
+        self._skipped_tiles = 0
+        self._scanned_tiles = 0
+        self._inference_seconds = 0.0
+        return report
+
+
+def schedule_tile(frame_index, tile_index, last_detection, scan_interval, hold_frames):
+    """True when the tile is scanned in the given frame."""
+    if frame_index - last_detection < hold_frames:
+        return True
+    return (frame_index + tile_index) % scan_interval == 0
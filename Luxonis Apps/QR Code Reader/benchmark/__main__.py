@@ -0,0 +1,74 @@
+"""Measure the QR host nodes on synthetic scenes, no OAK needed.
+
+Run from the app directory, e.g.:
+
+    python -m benchmark --profiles 4k 5312x6000 --codes 8 --blur 1.5 --save-baseline baseline.json
+    python -m benchmark --profiles 4k 5312x6000 --codes 8 --blur 1.5 --baseline baseline.json
+    python -m benchmark --profiles 5312x6000 --crop-modes bgr gray
+    python -m benchmark --monitor
+"""
+import argparse
+import logging as log
+import sys
+from dataclasses import replace
+
+from benchmark import (CROP_MODES, PLACEMENTS, PROFILES, SceneConfig, compare_crop_modes, compare_to_baseline, measure_monitor, run_profile,
+                       save_baseline)
+from node_helpers import RUNGS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES), help="resolution profiles to run")
+    parser.add_argument("--frames", type=int, default=30, help="measured frames per profile")
+    parser.add_argument("--warmup", type=int, default=3, help="frames run before the measurement starts")
+    parser.add_argument("--codes", type=int, default=4, help="QR codes per frame")
+    parser.add_argument("--code-size", type=int, nargs=2, default=(120, 300), metavar=("MIN", "MAX"),
+                        help="side of the codes in sensor pixels")
+    parser.add_argument("--blur", type=float, default=0.0, help="sigma of the gaussian blur of the codes in sensor pixels")
+    parser.add_argument("--placement", choices=PLACEMENTS, default="random",
+                        help="anywhere, in the middle of the tiles, or on the seams where the tiles overlap")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--crop-modes", nargs="+", choices=CROP_MODES, default=["bgr"],
+                        help="run with BGR and/or GRAY8 QR code crops, see the gray_qr_crops option")
+    parser.add_argument("--static-scene", action="store_true", help="same codes at the same positions in every frame")
+    parser.add_argument("--decode-workers", type=int, default=2, help="decoding worker processes, 0 decodes in the main process")
+    parser.add_argument("--decode-budget-ms", type=int, default=300, help="decoding time budget per frame")
+    parser.add_argument("--decode-ladder", nargs="+", choices=list(RUNGS), default=list(RUNGS), help="crop variants tried in order")
+    parser.add_argument("--decode-crop-budget-ms", type=int, default=50, help="CPU time budget per crop")
+    parser.add_argument("--decode-cache-size", type=int, default=512, help="0 disables the decode cache")
+    parser.add_argument("--monitor", action="store_true", help="only time the drawing of the local monitor per frame")
+    parser.add_argument("--display-width", type=int, default=1280, help="width of the local monitor window for --monitor")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results to a baseline JSON file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the results to a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative change of a metric against the baseline which counts as a regression")
+    args = parser.parse_args()
+
+    scene_config = SceneConfig(codes=args.codes, min_code_size=args.code_size[0], max_code_size=args.code_size[1], blur=args.blur,
+                               placement=args.placement, seed=args.seed)
+    configuration = {"decode_workers": args.decode_workers, "decode_frame_budget_ms": args.decode_budget_ms,
+                     "decode_cache_size": args.decode_cache_size, "decode_cache_max_age_seconds": 300,
+                     "decode_ladder": args.decode_ladder, "decode_crop_budget_ms": args.decode_crop_budget_ms,
+                     "code_ledger_path": None}
+    if args.monitor:
+        for profile in args.profiles:
+            measure_monitor(profile=profile, scene_config=scene_config, frames=args.frames, warmup=args.warmup,
+                            display_width=args.display_width, configuration=configuration)
+        return
+    results = [run_profile(profile=profile, scene_config=replace(scene_config, gray_crops=crop_mode == "gray"), frames=args.frames,
+                           warmup=args.warmup, static_scene=args.static_scene, configuration=configuration)
+               for profile in args.profiles for crop_mode in args.crop_modes]
+    compare_crop_modes(results)
+    if args.save_baseline:
+        save_baseline(path=args.save_baseline, results=results, scene_config=scene_config)
+        log.info(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(path=args.baseline, results=results, tolerance=args.tolerance)
+        if regressions:
+            log.error(f"Regressions against {args.baseline}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import gc
+import json
+import logging as log
+import os
+import resource
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+import robothub as rh
+
+from app import RESOLUTION_MAPPING, derived_configuration
+from app_pipeline import messages
+from app_pipeline.host_graph import create_host_graph
+from app_pipeline.replay import ReplaySource
+from node_helpers import MonitorRenderer
+from .scenes import SceneConfig, SceneGenerator, SceneQueue
+
+__all__ = ["PROFILES", "CROP_MODES", "ProfileResult", "MonitorResult", "run_profile", "measure_monitor", "compare_crop_modes",
+           "save_baseline", "compare_to_baseline"]
+
+PROFILES = ("1080p", "4k", "5312x6000")
+CROP_MODES = ("bgr", "gray")
+# metric -> True when a higher value is better
+METRICS = {"frames_per_second": True, "codes_decoded_per_second": True, "decode_success_rate": True, "peak_rss_mb": False,
+           "crop_bytes_per_frame": False}
+
+
+@dataclass(slots=True, kw_only=True)
+class ProfileResult:
+    profile: str
+    crop_mode: str  # "bgr" or "gray"
+    frames: int  # measured frames, without the warmup
+    merged_frames: int  # measured frames which made it through the whole host pipeline
+    seconds: float  # time spent in the host nodes
+    codes: int
+    codes_decoded: int
+    frames_per_second: float
+    codes_decoded_per_second: float
+    decode_success_rate: float
+    peak_rss_mb: float
+    crop_bytes_per_frame: float  # QR code crop data sent from the device per frame
+    crop_bytes_per_second: float  # at the measured frame rate
+
+    @property
+    def name(self) -> str:
+        return self.profile if self.crop_mode == "bgr" else f"{self.profile}-{self.crop_mode}"
+
+
+@dataclass(slots=True, kw_only=True)
+class MonitorResult:
+    profile: str
+    frames: int
+    full_ms: float  # mean per frame: stitch the full mosaic, draw on it, resize it for display
+    downscaled_ms: float  # mean per frame: downscale the tiles into the display mosaic, draw on it
+
+
+class _MonitorTimer:
+    """Time the local monitor rendering of every frame, the downscaled path first, while the tiles aren't stitched yet."""
+
+    def __init__(self, renderer: MonitorRenderer):
+        self._renderer = renderer
+        self.frames: dict[int, tuple[float, float]] = {}  # sequence number -> full, downscaled seconds
+
+    def __call__(self, frames_and_detections: messages.FramesWithDetections) -> None:
+        bboxes = frames_and_detections.qr_bboxes.bounding_boxes
+        high_res_rgb = frames_and_detections.high_res_rgb
+        scale = self._renderer.scale(image_width=bboxes.width)
+        start = time.perf_counter()
+        self._renderer.draw(image=high_res_rgb.scaled(scale=scale), bboxes=bboxes)
+        downscaled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        image = high_res_rgb.frame
+        for (xmin, ymin, xmax, ymax), label, confidence in zip(bboxes.absolute.tolist(), bboxes.labels, bboxes.confidences.tolist()):
+            cv2.rectangle(image, (xmin, ymin), (xmax, ymax), color=(0, 0, 255), thickness=2)
+            cv2.putText(image, f"{label}, {confidence:.2f}", (xmin, ymin - 1), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (255, 255, 255), 2)
+        cv2.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        full = time.perf_counter() - start
+        self.frames[frames_and_detections.getSequenceNum()] = (full, downscaled)
+
+
+class _DecodedCodes:
+    """Collect the texts QrCodeDecoder attaches to the boxes of every frame."""
+
+    def __init__(self):
+        self.frames: dict[int, set[str]] = {}
+
+    def __call__(self, frames_and_detections: messages.FramesWithDetections) -> None:
+        labels = frames_and_detections.qr_bboxes.bounding_boxes.labels
+        self.frames[frames_and_detections.getSequenceNum()] = {label for label in labels if label}
+
+
+def run_profile(profile: str, scene_config: SceneConfig, frames: int, warmup: int = 3, static_scene: bool = False,
+                configuration: Optional[dict] = None) -> ProfileResult:
+    """
+    Drive the host nodes of the app with synthetic scenes of the given resolution profile.
+
+    Only the time spent in the host node callbacks is measured, rendering the scenes is not. Peak RSS is sampled after
+    every frame, once the synthetic sensor frame was released, so it reflects the memory held by the host nodes. It doesn't
+    include the decoding worker processes.
+
+    :param static_scene: render the same codes at the same positions in every frame, which lets the decode cache hit
+    :param configuration: overrides of the app configuration, e.g. decode_workers
+    """
+    generator, sources, crops_queue, host_graph = _host_graph(profile=profile, scene_config=scene_config, configuration=configuration)
+    decoded = _DecodedCodes()
+    host_graph.qr_code_decoder.set_callback(decoded)
+
+    seconds = 0.0
+    codes = 0
+    codes_decoded = 0
+    merged_frames = 0
+    crop_bytes = 0
+    peak_rss = _rss_bytes()
+    try:
+        for sequence_number in range(warmup + frames):
+            scene = generator.generate(sequence_number=sequence_number, layout_seed=0 if static_scene else sequence_number)
+            start = time.perf_counter()
+            crops_queue.put(scene.crops)
+            for tile, detections in zip(scene.tiles, scene.detections):
+                sources["high_res_frames"].send_message(tile)
+                sources["qr_detection_out"].send_message(detections)
+            sources["h264_stream"].send_message(scene.h264_frame)
+            elapsed = time.perf_counter() - start
+            texts = scene.texts
+            crop_frame_bytes = sum(crop.getData().nbytes for crop in scene.crops)
+            del scene
+            peak_rss = max(peak_rss, _rss_bytes())
+            if sequence_number < warmup:
+                continue
+            seconds += elapsed
+            codes += len(texts)
+            crop_bytes += crop_frame_bytes
+            if sequence_number in decoded.frames:
+                merged_frames += 1
+                codes_decoded += len(decoded.frames.pop(sequence_number) & texts)
+    finally:
+        host_graph.close()
+    gc.collect()
+
+    result = ProfileResult(profile=profile, crop_mode="gray" if scene_config.gray_crops else "bgr", frames=frames,
+                           merged_frames=merged_frames, seconds=seconds, codes=codes,
+                           codes_decoded=codes_decoded, frames_per_second=frames / max(seconds, 1e-9),
+                           codes_decoded_per_second=codes_decoded / max(seconds, 1e-9),
+                           decode_success_rate=codes_decoded / codes if codes else 1.0, peak_rss_mb=peak_rss / 2 ** 20,
+                           crop_bytes_per_frame=crop_bytes / max(frames, 1), crop_bytes_per_second=crop_bytes / max(seconds, 1e-9))
+    log.info(f"{result.name}: {result.frames_per_second:.2f} frames/s, {result.codes_decoded_per_second:.2f} codes decoded/s, "
+             f"{result.decode_success_rate:.1%} decoded ({codes_decoded}/{codes}), {merged_frames}/{frames} frames merged, "
+             f"peak RSS {result.peak_rss_mb:.0f} MB, QR code crops {result.crop_bytes_per_frame / 1024:.0f} kB/frame "
+             f"{result.crop_bytes_per_second / 2 ** 20:.1f} MB/s")
+    return result
+
+
+def measure_monitor(profile: str, scene_config: SceneConfig, frames: int, warmup: int = 3, display_width: int = 1280,
+                    configuration: Optional[dict] = None) -> MonitorResult:
+    """
+    Time the local monitor drawing of the frames of the given resolution profile, the way it was done before (full
+    resolution mosaic, resized for display) against the downscaled rendering of the Monitor node.
+    """
+    generator, sources, crops_queue, host_graph = _host_graph(profile=profile, scene_config=scene_config, configuration=configuration)
+    monitor_timer = _MonitorTimer(renderer=MonitorRenderer(display_width=display_width, max_fps=0))
+    host_graph.qr_code_decoder.set_callback(monitor_timer)
+    try:
+        for sequence_number in range(warmup + frames):
+            scene = generator.generate(sequence_number=sequence_number, layout_seed=sequence_number)
+            crops_queue.put(scene.crops)
+            for tile, detections in zip(scene.tiles, scene.detections):
+                sources["high_res_frames"].send_message(tile)
+                sources["qr_detection_out"].send_message(detections)
+            sources["h264_stream"].send_message(scene.h264_frame)
+            if sequence_number < warmup:
+                monitor_timer.frames.pop(sequence_number, None)
+    finally:
+        host_graph.close()
+    timings = np.array(list(monitor_timer.frames.values()), dtype=np.float64).reshape(-1, 2)
+    full_ms, downscaled_ms = (timings.mean(axis=0) * 1000).tolist() if len(timings) else (0.0, 0.0)
+    result = MonitorResult(profile=profile, frames=len(timings), full_ms=full_ms, downscaled_ms=downscaled_ms)
+    log.info(f"{profile} monitor: {full_ms:.1f} ms/frame full resolution, {downscaled_ms:.1f} ms/frame downscaled to {display_width} px, "
+             f"{full_ms / max(downscaled_ms, 1e-9):.1f}x faster")
+    return result
+
+
+def compare_crop_modes(results: list[ProfileResult]) -> None:
+    """Log the QR code crop bandwidth of the GRAY8 crops relative to the BGR ones, for profiles which ran in both modes."""
+    by_mode = {(result.profile, result.crop_mode): result for result in results}
+    for profile in dict.fromkeys(result.profile for result in results):
+        bgr = by_mode.get((profile, "bgr"))
+        gray = by_mode.get((profile, "gray"))
+        if bgr is None or gray is None or gray.crop_bytes_per_frame == 0:
+            continue
+        log.info(f"{profile}: gray crops {gray.crop_bytes_per_second / 2 ** 20:.1f} MB/s "
+                 f"vs. bgr crops {bgr.crop_bytes_per_second / 2 ** 20:.1f} MB/s, "
+                 f"{bgr.crop_bytes_per_frame / gray.crop_bytes_per_frame:.1f}x less data per frame, "
+                 f"{gray.frames_per_second / max(bgr.frames_per_second, 1e-9):.2f}x the frame rate")
+
+
+def save_baseline(path: str, results: list[ProfileResult], scene_config: SceneConfig) -> None:
+    with open(path, "w") as f:
+        json.dump({"scene": asdict(scene_config), "profiles": {result.name: asdict(result) for result in results}}, f, indent=2)
+
+
+def compare_to_baseline(path: str, results: list[ProfileResult], tolerance: float) -> list[str]:
+    """Log the change of every metric against a saved baseline, returns the metrics which got worse by more than `tolerance`."""
+    with open(path) as f:
+        baseline = json.load(f)["profiles"]
+    regressions = []
+    for result in results:
+        if result.name not in baseline:
+            log.warning(f"No baseline for {result.name}")
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in baseline[result.name]:
+                continue
+            before = baseline[result.name][metric]
+            after = getattr(result, metric)
+            change = (after - before) / before if before else 0.0
+            log.info(f"{result.name} {metric}: {before:.3f} -> {after:.3f} ({change:+.1%})")
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{result.name} {metric} {change:+.1%}")
+    return regressions
+
+
+def _host_graph(profile: str, scene_config: SceneConfig, configuration: Optional[dict]):
+    """Configure the app for the profile, returns the scene generator, the replay sources, the crops queue and the host graph."""
+    rh.CONFIGURATION["resolution"] = profile
+    rh.CONFIGURATION.update(derived_configuration(resolution=profile))
+    rh.CONFIGURATION.update(configuration or {})
+    sensor_width, sensor_height = RESOLUTION_MAPPING[profile]
+    generator = SceneGenerator(resolution=profile, sensor_width=sensor_width, sensor_height=sensor_height,
+                               tile_width=rh.CONFIGURATION["high_res_crop_width"], tile_height=rh.CONFIGURATION["high_res_crop_height"],
+                               config=scene_config)
+    sources = {name: ReplaySource(name=name) for name in ("high_res_frames", "qr_detection_out", "h264_stream")}
+    crops_queue = SceneQueue()
+    host_graph = create_host_graph(high_res_frames=sources["high_res_frames"], qr_detection_out=sources["qr_detection_out"],
+                                   h264_frames=sources["h264_stream"], qr_crops_queue=crops_queue, with_monitor=False)
+    return generator, sources, crops_queue, host_graph
+
+
+def _rss_bytes() -> int:
+    """Current resident set size, or the peak one where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # kB on Linux, bytes on macOS - close enough for a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
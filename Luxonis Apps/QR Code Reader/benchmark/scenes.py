@@ -0,0 +1,230 @@
+import logging as log
+import random
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+
+import cv2
+import depthai as dai
+import numpy as np
+import zxingcpp
+
+from app_pipeline import script_node, script_node_qr_crops
+
+__all__ = ["SceneConfig", "Scene", "SceneGenerator", "SceneQueue", "PLACEMENTS"]
+
+PLACEMENTS = ("random", "tile_centers", "tile_overlaps")
+
+
+@dataclass(slots=True, kw_only=True)
+class SceneConfig:
+    codes: int = 4
+    min_code_size: int = 120  # side of a code with its quiet zone, in sensor pixels
+    max_code_size: int = 300
+    blur: float = 0.0  # sigma of the gaussian blur applied to the codes, in sensor pixels
+    placement: str = "random"  # one of PLACEMENTS
+    seed: int = 0
+    gray_crops: bool = False  # GRAY8 QR code crops, like with the gray_qr_crops option
+
+
+@dataclass(slots=True, kw_only=True)
+class Scene:
+    """Messages the device would send for one synthetic frame."""
+    sequence_number: int
+    tiles: list[dai.ImgFrame]
+    detections: list[dai.ImgDetections]
+    crops: list[dai.ImgFrame]
+    h264_frame: dai.ImgFrame
+    texts: set[str]
+
+
+class SceneQueue:
+    """Stands in for the qr_crops output queue which QrCodeDecoder reads directly."""
+
+    def __init__(self):
+        self._crops: deque[dai.ImgFrame] = deque()
+
+    def put(self, crops: list[dai.ImgFrame]) -> None:
+        self._crops.extend(crops)
+
+    def get(self) -> dai.ImgFrame:
+        if not self._crops:
+            # a closed device queue raises RuntimeError as well
+            raise RuntimeError("No more synthetic QR code crops")
+        return self._crops.popleft()
+
+    def tryGet(self):
+        return self._crops.popleft() if self._crops else None
+
+
+class SceneGenerator:
+    """
+    Render synthetic sensor frames with QR codes and cut them into the messages of the device pipeline.
+
+    Tiles, detections and QR code crops are computed like the script nodes do it on the device, so the host nodes get the
+    same geometry as from a real OAK. Detections are the ground truth boxes of the codes which lie completely inside a tile.
+    """
+    BACKGROUND = 170
+    CONFIDENCE = 0.9
+    PLACEMENT_ATTEMPTS = 200
+
+    def __init__(self, resolution: str, sensor_width: int, sensor_height: int, tile_width: int, tile_height: int, config: SceneConfig):
+        if config.placement not in PLACEMENTS:
+            raise ValueError(f"Unknown placement {config.placement!r}, use one of {PLACEMENTS}")
+        if not 0 < config.min_code_size <= config.max_code_size:
+            raise ValueError(f"Invalid code size range {config.min_code_size}-{config.max_code_size}")
+        self._config = config
+        self._width = sensor_width
+        self._height = sensor_height
+        self._tile_size = (tile_width, tile_height)
+        # the device script nodes tell the resolutions apart only by 5312x6000 and anything else
+        if resolution == "5312x6000":
+            tile_properties = script_node.ImageProperties5312x6000
+            self._crop_properties = script_node_qr_crops.ImageProperties5312x6000
+        else:
+            tile_properties = script_node.ImageProperties4k
+            self._crop_properties = script_node_qr_crops.ImageProperties4k
+        self._tile_rects = [self._to_pixels(xmin, ymin, xmin + tile_properties.STEP_WIDTH + tile_properties.OVERLAP_WIDTH,
+                                            ymin + tile_properties.STEP_HEIGHT + tile_properties.OVERLAP_HEIGHT)
+                            for xmin, ymin in tile_properties.crop_vals]
+        self._covered = (min(rect[0] for rect in self._tile_rects), min(rect[1] for rect in self._tile_rects),
+                         max(rect[2] for rect in self._tile_rects), max(rect[3] for rect in self._tile_rects))
+        rng = np.random.default_rng(config.seed)
+        # mild sensor noise, so that the crops aren't trivially flat
+        self._background = (self.BACKGROUND + rng.integers(-12, 13, size=(sensor_height, sensor_width, 1), dtype=np.int16)).astype(np.uint8)
+
+    def generate(self, sequence_number: int, layout_seed: int) -> Scene:
+        """Render a scene, scenes with the same `layout_seed` have the same codes at the same positions."""
+        layout = random.Random(f"{self._config.seed}-{layout_seed}")
+        sensor = np.repeat(self._background, 3, axis=2)
+        boxes = []
+        texts = []
+        for i in range(self._config.codes):
+            size = layout.randint(self._config.min_code_size, self._config.max_code_size)
+            box = self._place(size=size, boxes=boxes, layout=layout)
+            if box is None:
+                log.warning(f"No free space for QR code {i} of size {size}, the scene gets {len(boxes)} codes")
+                break
+            text = f"bench-{layout_seed}-{i}"
+            self._draw_code(sensor=sensor, box=box, text=text)
+            boxes.append(box)
+            texts.append(text)
+
+        timestamp = dai.Clock.now()
+        tiles = []
+        detections = []
+        crops = []
+        for tile_index, (x0, y0, x1, y1) in enumerate(self._tile_rects):
+            tile = cv2.resize(sensor[y0:y1, x0:x1], self._tile_size, interpolation=cv2.INTER_AREA)
+            tiles.append(_img_frame(image=tile, sequence_number=sequence_number, timestamp=timestamp))
+            tile_detections = [self._detection(box=box, tile_rect=(x0, y0, x1, y1), tile_index=tile_index) for box in boxes
+                               if x0 <= box[0] and y0 <= box[1] and box[2] <= x1 and box[3] <= y1]
+            message = dai.ImgDetections()
+            message.detections = tile_detections
+            message.setSequenceNum(sequence_number)
+            message.setTimestamp(timestamp)
+            message.setTimestampDevice(timestamp)
+            message.setData([tile_index])  # like the tiling Script node, see app_pipeline/tile_index.py
+            detections.append(message)
+            for detection in tile_detections:
+                crops.append(self._crop(sensor=sensor, tile_index=tile_index, detection=detection, sequence_number=sequence_number,
+                                        timestamp=timestamp))
+        h264_frame = dai.ImgFrame()
+        h264_frame.setSequenceNum(sequence_number)
+        h264_frame.setTimestamp(timestamp)
+        h264_frame.setTimestampDevice(timestamp)
+        return Scene(sequence_number=sequence_number, tiles=tiles, detections=detections, crops=crops, h264_frame=h264_frame,
+                     texts=set(texts))
+
+    def _place(self, size: int, boxes: list[tuple[int, int, int, int]], layout: random.Random):
+        for _ in range(self.PLACEMENT_ATTEMPTS):
+            center_x, center_y = self._candidate_center(size=size, layout=layout)
+            box = (int(center_x - size / 2), int(center_y - size / 2), int(center_x - size / 2) + size, int(center_y - size / 2) + size)
+            inside = (self._covered[0] <= box[0] and self._covered[1] <= box[1]
+                      and box[2] <= self._covered[2] and box[3] <= self._covered[3])
+            if inside and not any(_intersects(box, other) for other in boxes):
+                return box
+        return None
+
+    def _candidate_center(self, size: int, layout: random.Random) -> tuple[float, float]:
+        xmin, ymin, xmax, ymax = self._covered
+        if self._config.placement == "tile_centers":
+            x0, y0, x1, y1 = layout.choice(self._tile_rects)
+            jitter_x = max((x1 - x0 - size) / 4, 0)
+            jitter_y = max((y1 - y0 - size) / 4, 0)
+            return (x0 + x1) / 2 + layout.uniform(-jitter_x, jitter_x), (y0 + y1) / 2 + layout.uniform(-jitter_y, jitter_y)
+        if self._config.placement == "tile_overlaps":
+            # center the code on a seam, halfway through the overlap of two neighbouring tiles
+            x_seams = sorted({rect[0] for rect in self._tile_rects} - {xmin})
+            y_seams = sorted({rect[1] for rect in self._tile_rects} - {ymin})
+            x_ends = sorted({rect[2] for rect in self._tile_rects} - {xmax})
+            y_ends = sorted({rect[3] for rect in self._tile_rects} - {ymax})
+            if x_seams and layout.random() < 0.5:
+                seam = layout.randrange(len(x_seams))
+                return (x_seams[seam] + x_ends[seam]) / 2, layout.uniform(ymin + size / 2, ymax - size / 2)
+            if y_seams:
+                seam = layout.randrange(len(y_seams))
+                return layout.uniform(xmin + size / 2, xmax - size / 2), (y_seams[seam] + y_ends[seam]) / 2
+        return layout.uniform(xmin + size / 2, xmax - size / 2), layout.uniform(ymin + size / 2, ymax - size / 2)
+
+    def _draw_code(self, sensor: np.ndarray, box: tuple[int, int, int, int], text: str) -> None:
+        xmin, ymin, xmax, ymax = box
+        code = np.asarray(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.QRCode, text, quiet_zone=4), dtype=np.uint8)
+        code = cv2.resize(code, (xmax - xmin, ymax - ymin), interpolation=cv2.INTER_NEAREST)
+        region = sensor[ymin:ymax, xmin:xmax]
+        region[:] = code[:, :, None]
+        if self._config.blur > 0:
+            region[:] = cv2.GaussianBlur(region, (0, 0), sigmaX=self._config.blur)
+
+    def _detection(self, box: tuple[int, int, int, int], tile_rect: tuple[int, int, int, int], tile_index: int) -> dai.ImgDetection:
+        x0, y0, x1, y1 = tile_rect
+        detection = dai.ImgDetection()
+        detection.label = tile_index  # like the tiling Script node
+        detection.confidence = self.CONFIDENCE
+        detection.xmin = (box[0] - x0) / (x1 - x0)
+        detection.ymin = (box[1] - y0) / (y1 - y0)
+        detection.xmax = (box[2] - x0) / (x1 - x0)
+        detection.ymax = (box[3] - y0) / (y1 - y0)
+        return detection
+
+    def _crop(self, sensor: np.ndarray, tile_index: int, detection: dai.ImgDetection, sequence_number: int,
+              timestamp: timedelta) -> dai.ImgFrame:
+        # same math as script_node_qr_crops.py
+        properties = self._crop_properties
+        padding = script_node_qr_crops.PADDING
+        clamp = script_node_qr_crops.clamp
+        xmin_orig_frame, ymin_orig_frame = properties.crop_vals[tile_index]
+        xmin = clamp(detection.xmin * properties.WIDTH_RELATIVE_SCALE + xmin_orig_frame - padding, 0, 0.93)
+        ymin = clamp(detection.ymin * properties.HEIGHT_RELATIVE_SCALE + ymin_orig_frame - padding, 0, 0.93)
+        xmax = clamp(detection.xmax * properties.WIDTH_RELATIVE_SCALE + xmin_orig_frame + padding, xmin + 0.01, 1)
+        ymax = clamp(detection.ymax * properties.HEIGHT_RELATIVE_SCALE + ymin_orig_frame + padding, ymin + 0.01, 1)
+        x0, y0, x1, y1 = self._to_pixels(xmin, ymin, xmax, ymax)
+        crop = sensor[y0:y1, x0:x1]
+        if self._config.gray_crops:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return _img_frame(image=crop, sequence_number=sequence_number, timestamp=timestamp)
+
+    def _to_pixels(self, xmin: float, ymin: float, xmax: float, ymax: float) -> tuple[int, int, int, int]:
+        return (int(round(xmin * self._width)), int(round(ymin * self._height)),
+                min(int(round(xmax * self._width)), self._width), min(int(round(ymax * self._height)), self._height))
+
+
+def _img_frame(image: np.ndarray, sequence_number: int, timestamp: timedelta) -> dai.ImgFrame:
+    """Planar BGR frame of a BGR image or GRAY8 frame of a single channel one, like the ImageManip nodes send them."""
+    frame = dai.ImgFrame()
+    frame.setWidth(image.shape[1])
+    frame.setHeight(image.shape[0])
+    if image.ndim == 2:
+        frame.setType(dai.ImgFrame.Type.GRAY8)
+        frame.setData(np.ascontiguousarray(image).reshape(-1))
+    else:
+        frame.setType(dai.ImgFrame.Type.BGR888p)
+        frame.setData(np.ascontiguousarray(image.transpose(2, 0, 1)).reshape(-1))
+    frame.setSequenceNum(sequence_number)
+    frame.setTimestamp(timestamp)
+    frame.setTimestampDevice(timestamp)
+    return frame
+
+
+def _intersects(box: tuple[int, int, int, int], other: tuple[int, int, int, int]) -> bool:
+    return box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
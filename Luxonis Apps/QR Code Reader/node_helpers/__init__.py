@@ -1,3 +1,13 @@
 from .bounding_box import *
-from .find_start import *
+from .box_tracker import *
+from .code_ledger import *
+from .decode_cache import *
+from .decode_ladder import *
+from .decode_pool import *
+from .latency_tracer import *
+from .local_display import *
+from .monitor_renderer import *
+from .mosaic import *
+from .recording import *
+from .report_aggregator import *
 from .timer import Timer
@@ -1,4 +1,9 @@
-__all__ = ["BoundingBox"]
+from typing import Optional
+
+import cv2
+import numpy as np
+
+__all__ = ["BoundingBox", "BoundingBoxBatch"]
 
 
 class BoundingBox:
@@ -98,5 +103,116 @@ class BoundingBox:
         return xmin_nn_out, ymin_nn_out, xmax_nn_out, ymax_nn_out
 
 
+class BoundingBoxBatch:
+    """
+    Struct of arrays variant of BoundingBox for a whole frame of detections.
+    Row i of every array (and of `labels` and `crops`) belongs to the same bounding box.
+    Relative coordinates are corrected the same way as in BoundingBox, all operations are vectorized.
+    """
+
+    def __init__(self, relative: np.ndarray, confidences: np.ndarray, image_width: int, image_height: int,
+                 sequence_numbers: Optional[np.ndarray] = None, counters: Optional[np.ndarray] = None,
+                 labels: Optional[list[str]] = None, crops: Optional[list] = None):
+        self.relative = self.correct(np.asarray(relative, dtype=np.float64).reshape(-1, 4))  # xmin, ymin, xmax, ymax
+        count = len(self.relative)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(count)
+        self.sequence_numbers = np.zeros(count, dtype=np.int64) if sequence_numbers is None else np.asarray(sequence_numbers, dtype=np.int64)
+        self.counters = np.arange(count) if counters is None else np.asarray(counters)
+        self.labels: list[str] = [""] * count if labels is None else labels
+        self.crops: list = [None] * count if crops is None else crops
+
+        self.height = image_height
+        self.width = image_width
+        self.absolute = (self.relative * (self.width, self.height, self.width, self.height)).astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self.relative)
+
+    def __repr__(self):
+        return f"BBoxBatch: {len(self)} boxes, seq_nums: {np.unique(self.sequence_numbers).tolist()}"
+
+    @classmethod
+    def from_absolute(cls, absolute: np.ndarray, confidences: np.ndarray, image_width: int, image_height: int,
+                      sequence_numbers: Optional[np.ndarray] = None):
+        relative = np.asarray(absolute, dtype=np.float64).reshape(-1, 4) / (image_width, image_height, image_width, image_height)
+        return cls(relative=relative, confidences=confidences, image_width=image_width, image_height=image_height,
+                   sequence_numbers=sequence_numbers)
+
+    @classmethod
+    def empty(cls, image_width: int, image_height: int):
+        return cls(relative=np.empty((0, 4)), confidences=np.empty(0), image_width=image_width, image_height=image_height)
+
+    @staticmethod
+    def correct(relative: np.ndarray) -> np.ndarray:
+        """Vectorized BoundingBox.correct()."""
+        corrected = np.empty_like(relative)
+        corrected[:, :2] = np.clip(relative[:, :2], 0.001, 0.996)
+        corrected[:, 2:] = np.maximum(corrected[:, :2] + 0.001, np.minimum(relative[:, 2:], 0.999))
+        return corrected
+
+    @property
+    def xmin(self) -> np.ndarray:
+        return self.absolute[:, 0]
+
+    @property
+    def ymin(self) -> np.ndarray:
+        return self.absolute[:, 1]
+
+    @property
+    def xmax(self) -> np.ndarray:
+        return self.absolute[:, 2]
+
+    @property
+    def ymax(self) -> np.ndarray:
+        return self.absolute[:, 3]
+
+    def set_label(self, index: int, label: str):
+        self.labels[index] = label
+
+    def set_crop(self, index: int, crop):
+        self.crops[index] = crop
+
+    def select(self, indices) -> "BoundingBoxBatch":
+        """New batch with the given rows, labels and crops included."""
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        batch = BoundingBoxBatch.__new__(BoundingBoxBatch)
+        batch.relative = self.relative[indices]
+        batch.absolute = self.absolute[indices]
+        batch.confidences = self.confidences[indices]
+        batch.sequence_numbers = self.sequence_numbers[indices]
+        batch.counters = self.counters[indices]
+        batch.labels = [self.labels[i] for i in indices]
+        batch.crops = [self.crops[i] for i in indices]
+        batch.height = self.height
+        batch.width = self.width
+        return batch
+
+    def as_nms_boxes(self) -> np.ndarray:
+        """Defined as xmin, ymin, width, height. In absolute coordinates."""
+        nms_boxes = self.absolute.copy()
+        nms_boxes[:, 2:] -= nms_boxes[:, :2]
+        return nms_boxes
+
+    def nms(self, confidence_threshold: float, overlap_threshold: float) -> "BoundingBoxBatch":
+        if len(self) == 0:
+            return self
+        indices = cv2.dnn.NMSBoxes(self.as_nms_boxes(), self.confidences, confidence_threshold, overlap_threshold)
+        return self.select(indices)
+
+    def transform(self, width: int, height: int) -> np.ndarray:
+        """Vectorized BoundingBox.transform(), returns an array of rows (xmin, ymin, xmax, ymax) with respect to the new image size."""
+        larger_side_current = max(self.height, self.width)
+        shorter_side_current = min(self.height, self.width)
+        larger_side_new = max(width, height)
+        shorter_side_new = min(width, height)
+
+        scaling_factor = larger_side_current / larger_side_new
+        letter_box_offset = (shorter_side_new - (shorter_side_current / scaling_factor)) / 2
+
+        transformed = self.absolute / scaling_factor
+        transformed[:, 1::2] += letter_box_offset
+        return transformed.astype(np.int32)
+
+
 def clamp(num, minimum, maximum):
     return max(minimum, min(num, maximum))
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+__all__ = ["BoxTracker", "Track", "iou_matrix"]
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU of every box in `a` with every box in `b`, boxes are rows of xmin, ymin, xmax, ymax."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    width = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    height = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    areas_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    areas_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = areas_a[:, None] + areas_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+@dataclass(slots=True, kw_only=True)
+class Track:
+    track_id: int
+    box: np.ndarray  # xmin, ymin, xmax, ymax relative to the merged image
+    text: Optional[str] = None  # last decoded text
+    confirmed: bool = False  # the last crop of the track decoded
+    stationary_frames: int = 0  # consecutive frames the box stayed in place
+    skipped_frames: int = 0  # consecutive frames the box was not cropped
+    missed_frames: int = 0  # consecutive frames without a matching box
+
+
+class BoxTracker:
+    """
+    Follow QR code boxes from frame to frame and remember the decoded text of every track.
+
+    Boxes are matched to the tracks greedily, best IoU first, pairs below `match_iou` start new tracks. A decoded track
+    whose box moved less than `stationary_iou` since the last frame goes to the skip list - the crop Script node doesn't
+    crop boxes matching it, the host reuses the text of the track instead. After `skip_frames` skipped frames the box is
+    cropped and decoded again, a failed decode takes the track off the skip list until it decodes again.
+    """
+
+    def __init__(self, skip_frames: int, match_iou: float = 0.3, stationary_iou: float = 0.8, max_missed_frames: int = 2):
+        self.skip_frames = skip_frames
+        self.match_iou = match_iou
+        self.stationary_iou = stationary_iou
+        self.max_missed_frames = max_missed_frames
+        self.tracks: list[Track] = []
+        self._next_id = 0
+        self.statistics = {"boxes": 0, "skipped": 0, "tracks": 0}
+
+    def update(self, boxes: np.ndarray, labels: list[Optional[str]], skipped: list[bool]) -> list[Track]:
+        """
+        :param boxes: rows of xmin, ymin, xmax, ymax relative to the merged image
+        :param labels: decoded text per box, None when the box was not cropped or didn't decode
+        :param skipped: True for the boxes the device didn't crop
+        :returns: the track of every box
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        matches = self._match(boxes)
+        box_tracks = []
+        for i, box in enumerate(boxes):
+            track = matches.get(i)
+            if track is None:
+                track = Track(track_id=self._next_id, box=box)
+                self._next_id += 1
+                self.tracks.append(track)
+                self.statistics["tracks"] += 1
+            else:
+                moved = iou_matrix(track.box, box)[0, 0] < self.stationary_iou
+                track.stationary_frames = 0 if moved else track.stationary_frames + 1
+                track.box = box
+                track.missed_frames = 0
+            if skipped[i]:
+                track.skipped_frames += 1
+            else:
+                track.skipped_frames = 0
+                track.confirmed = labels[i] is not None
+                if labels[i] is not None:
+                    track.text = labels[i]
+            box_tracks.append(track)
+        matched_ids = {track.track_id for track in box_tracks}
+        for track in self.tracks:
+            if track.track_id not in matched_ids:
+                track.missed_frames += 1
+        self.tracks = [track for track in self.tracks if track.missed_frames <= self.max_missed_frames]
+        self.statistics["boxes"] += len(boxes)
+        self.statistics["skipped"] += sum(bool(box_skipped) for box_skipped in skipped)
+        return box_tracks
+
+    def skip_list(self) -> np.ndarray:
+        """Boxes the device doesn't have to crop in the next frame, rows of xmin, ymin, xmax, ymax."""
+        boxes = [track.box for track in self.tracks
+                 if track.confirmed and track.text is not None and track.missed_frames == 0 and track.stationary_frames > 0
+                 and track.skipped_frames < self.skip_frames]
+        return np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+    def _match(self, boxes: np.ndarray) -> dict[int, Track]:
+        """Box index -> matched track."""
+        if len(boxes) == 0 or len(self.tracks) == 0:
+            return {}
+        ious = iou_matrix(boxes, np.array([track.box for track in self.tracks]))
+        matches = {}
+        matched_tracks = set()
+        for flat_index in np.argsort(ious, axis=None)[::-1]:
+            box_index, track_index = np.unravel_index(flat_index, ious.shape)
+            if ious[box_index, track_index] < self.match_iou:
+                break
+            if box_index in matches or track_index in matched_tracks:
+                continue
+            matches[int(box_index)] = self.tracks[track_index]
+            matched_tracks.add(track_index)
+        return matches
@@ -0,0 +1,199 @@
+import logging as log
+import sqlite3
+import sys
+import threading
+import time
+from typing import NamedTuple, Optional
+
+__all__ = ["CodeLedger", "LedgerEntry"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS codes (
+    text TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    count INTEGER NOT NULL,
+    xmin INTEGER, ymin INTEGER, xmax INTEGER, ymax INTEGER
+);
+CREATE INDEX IF NOT EXISTS codes_last_seen ON codes (last_seen);
+CREATE TABLE IF NOT EXISTS sightings (
+    text TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    count INTEGER NOT NULL,
+    xmin INTEGER, ymin INTEGER, xmax INTEGER, ymax INTEGER
+);
+CREATE INDEX IF NOT EXISTS sightings_text ON sightings (text);
+CREATE INDEX IF NOT EXISTS sightings_last_seen ON sightings (last_seen);
+-- a ledger written before the log existed starts it with one sighting per code
+INSERT INTO sightings SELECT * FROM codes WHERE NOT EXISTS (SELECT 1 FROM sightings);
+"""
+_APPEND = "INSERT INTO sightings (text, first_seen, last_seen, count, xmin, ymin, xmax, ymax) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_UPSERT = """
+INSERT INTO codes (text, first_seen, last_seen, count, xmin, ymin, xmax, ymax) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (text) DO UPDATE SET
+    first_seen = min(first_seen, excluded.first_seen),
+    last_seen = max(last_seen, excluded.last_seen),
+    count = count + excluded.count,
+    xmin = excluded.xmin, ymin = excluded.ymin, xmax = excluded.xmax, ymax = excluded.ymax
+"""
+_COLUMNS = "text, first_seen, last_seen, count, xmin, ymin, xmax, ymax"
+
+
+class LedgerEntry(NamedTuple):
+    text: str
+    first_seen: float  # unix time
+    last_seen: float
+    count: int  # frames the code was decoded in
+    box: tuple[int, int, int, int]  # last bounding box, xmin, ymin, xmax, ymax
+
+
+class CodeLedger:
+    """
+    Every decoded QR code in a SQLite database, kept across restarts.
+
+    The `sightings` table is the append-only log - every batch appends one row per code recorded in it, rows are never
+    updated or deleted. Summing a code's sightings would make a lookup grow with how long the code was in view, so the
+    `codes` table keeps one upserted row per code text, the running total of its sightings, written in the same
+    transaction. Its primary key index makes lookups by text and by prefix O(log n), time ranges are answered from the log.
+    `record` only updates an in-memory batch, a writer thread writes the batch every `flush_interval_ms` in one
+    transaction. The database runs in WAL mode, so range queries don't wait for the writer. `get` sees the batch not
+    written yet too, it waits for a flush in progress, so a sighting is counted exactly once, from the database or the batch.
+    `close` writes the last batch, without it the codes recorded in the last `flush_interval_ms` are lost.
+    """
+
+    def __init__(self, path: str, flush_interval_ms: float = 200):
+        self._path = path
+        self._flush_interval_seconds = flush_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._batch: dict[str, list] = {}  # text -> [first seen, last seen, count, xmin, ymin, xmax, ymax]
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._local = threading.local()  # one read connection per querying thread
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        connection.close()
+        self.statistics = {"recorded": 0, "written_rows": 0, "flushes": 0}
+        self._writer = threading.Thread(target=self._write_loop, name="CodeLedgerWriter", daemon=True)
+        self._writer.start()
+
+    def record(self, text: str, box: tuple[int, int, int, int], seen: Optional[float] = None) -> None:
+        seen = time.time() if seen is None else seen
+        with self._lock:
+            row = self._batch.get(text)
+            if row is None:
+                self._batch[text] = [seen, seen, 1, *box]
+            else:
+                row[1] = max(row[1], seen)
+                row[2] += 1
+                row[3:] = box
+            self.statistics["recorded"] += 1
+
+    def get(self, text: str) -> Optional[LedgerEntry]:
+        # with the flush lock held no batch is half written, a sighting is either in the database or in the batch
+        with self._flush_lock:
+            entry = self._query(f"SELECT {_COLUMNS} FROM codes WHERE text = ?", (text,))
+            return self._merge_batch(entry[0] if entry else None, text)
+
+    def seen_since(self, text: str, since: float) -> bool:
+        """True when the code was seen at or after the unix time `since`."""
+        entry = self.get(text)
+        return entry is not None and entry.last_seen >= since
+
+    def between(self, start: float, end: float, limit: int = 1000) -> list[LedgerEntry]:
+        """
+        Codes with a sighting in the time range, most recently seen first. Only written rows are returned.
+
+        A code seen before and after the range, but not in it, isn't returned.
+        """
+        return self._query(f"SELECT {_COLUMNS} FROM codes WHERE text IN "
+                           f"(SELECT text FROM sightings WHERE last_seen >= ? AND first_seen <= ?) ORDER BY last_seen DESC LIMIT ?",
+                           (start, end, limit))
+
+    def history(self, text: str) -> list[LedgerEntry]:
+        """Sightings of the code in the log, oldest first - one per batch it was recorded in. Only written rows are returned."""
+        return self._query(f"SELECT {_COLUMNS} FROM sightings WHERE text = ? ORDER BY rowid", (text,))
+
+    def with_prefix(self, prefix: str, limit: int = 1000) -> list[LedgerEntry]:
+        """Codes starting with `prefix`, ordered by text. Only written rows are returned."""
+        # a range on the primary key instead of LIKE, which doesn't use the index for case sensitive matches
+        upper = _prefix_upper_bound(prefix)
+        if upper is None:
+            return self._query(f"SELECT {_COLUMNS} FROM codes WHERE text >= ? ORDER BY text LIMIT ?", (prefix, limit))
+        return self._query(f"SELECT {_COLUMNS} FROM codes WHERE text >= ? AND text < ? ORDER BY text LIMIT ?", (prefix, upper, limit))
+
+    def flush(self) -> None:
+        """Write the current batch now, from the calling thread."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._batch = self._batch, {}
+            if not batch:
+                return
+            rows = [(text, *row) for text, row in batch.items()]
+            connection = self._writer_connection()
+            with connection:
+                connection.executemany(_APPEND, rows)
+                connection.executemany(_UPSERT, rows)
+            self.statistics["written_rows"] += len(batch)
+            self.statistics["flushes"] += 1
+
+    def close(self) -> None:
+        """Write the last batch and stop the writer thread."""
+        self._stop_event.set()
+        self._writer.join()
+
+    def _write_loop(self) -> None:
+        while not self._stop_event.wait(self._flush_interval_seconds):
+            self._flush_logged()
+        self._flush_logged()
+
+    def _flush_logged(self) -> None:
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            log.error(f"Writing the QR code ledger {self._path} failed: {e!r}")
+
+    def _merge_batch(self, entry: Optional[LedgerEntry], text: str) -> Optional[LedgerEntry]:
+        with self._lock:
+            pending = self._batch.get(text)
+            pending = None if pending is None else list(pending)
+        if pending is None:
+            return entry
+        first_seen, last_seen, count, *box = pending
+        if entry is not None:
+            first_seen, last_seen, count = min(first_seen, entry.first_seen), max(last_seen, entry.last_seen), count + entry.count
+        return LedgerEntry(text=text, first_seen=first_seen, last_seen=last_seen, count=count, box=tuple(box))
+
+    def _query(self, sql: str, parameters: tuple) -> list[LedgerEntry]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return [LedgerEntry(text=text, first_seen=first_seen, last_seen=last_seen, count=count, box=(xmin, ymin, xmax, ymax))
+                for text, first_seen, last_seen, count, xmin, ymin, xmax, ymax in connection.execute(sql, parameters)]
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        if not hasattr(self._local, "writer"):
+            self._local.writer = self._connect()
+            # WAL keeps the database consistent with NORMAL, a power loss may only lose the last transactions
+            self._local.writer.execute("PRAGMA synchronous=NORMAL")
+        return self._local.writer
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=5)
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    The smallest text greater than every text starting with `prefix`, None when there is none.
+
+    SQLite compares TEXT as UTF-8 bytes, which orders like the code points. U+10FFFF has no successor, a prefix ending with
+    it is bounded by incrementing the character before it. Surrogates can't be encoded to UTF-8, U+D7FF is followed by U+E000.
+    """
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    successor = ord(prefix[-1]) + 1
+    if 0xD800 <= successor <= 0xDFFF:
+        successor = 0xE000
+    return prefix[:-1] + chr(successor)
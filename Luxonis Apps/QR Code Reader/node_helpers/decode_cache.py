@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import cv2
+import numpy as np
+
+__all__ = ["DecodeCache"]
+
+
+class DecodeCache:
+    """
+    Remember decoded QR codes so that stationary codes don't have to be decoded again on every frame.
+
+    Entries are keyed by the quantized position of the bounding box and by an average hash of the downsampled crop.
+    Crops of the same code differ slightly between frames (sensor noise, box jitter), so the hash matches when it differs
+    in at most `max_hash_distance` bits. A tolerant hash can't tell apart two very similar codes placed at the same spot,
+    so every `verify_every`-th hit of an entry is reported as a miss and the caller decodes the crop again.
+    The least recently used entry is evicted when the cache is full, entries which weren't refreshed by a successful decode
+    for `max_age_seconds` are evicted on lookup.
+    """
+    HASH_SIZE = 16
+
+    def __init__(self, max_entries: int = 512, max_age_seconds: float = 300, position_quantum: int = 16, max_hash_distance: int = 40,
+                 verify_every: int = 10):
+        self._entries: OrderedDict[tuple, list] = OrderedDict()  # position -> [fingerprint, text, created_at, hits]
+        self._max_entries = max_entries
+        self._max_age_seconds = max_age_seconds
+        self._position_quantum = position_quantum
+        self._max_hash_distance = max_hash_distance
+        self._verify_every = verify_every
+        self.statistics = {"hits": 0, "misses": 0, "evictions": 0, "verifications": 0}
+
+    def key(self, crop: np.ndarray, box: tuple[int, int, int, int]) -> tuple[tuple, int]:
+        """Cache key of a single channel crop and its (xmin, ymin, xmax, ymax) bounding box."""
+        position = tuple(coordinate // self._position_quantum for coordinate in box)
+        return position, self.fingerprint(crop)
+
+    @classmethod
+    def fingerprint(cls, crop: np.ndarray) -> int:
+        """Average hash - each bit tells if a pixel of the downsampled crop is brighter than the mean."""
+        if crop.size == 0:
+            return 0
+        small = cv2.resize(np.ascontiguousarray(crop), (cls.HASH_SIZE, cls.HASH_SIZE), interpolation=cv2.INTER_AREA)
+        bits = np.packbits(small > small.mean())
+        return int.from_bytes(bits.tobytes(), "big")
+
+    def get(self, key: tuple[tuple, int]) -> Optional[str]:
+        position, fingerprint = key
+        entry = self._entries.get(position)
+        if entry is None:
+            self.statistics["misses"] += 1
+            return None
+        cached_fingerprint, text, created_at, hits = entry
+        if time.monotonic() - created_at > self._max_age_seconds:
+            del self._entries[position]
+            self.statistics["evictions"] += 1
+            self.statistics["misses"] += 1
+            return None
+        if (cached_fingerprint ^ fingerprint).bit_count() > self._max_hash_distance:
+            self.statistics["misses"] += 1
+            return None
+        self._entries.move_to_end(position)
+        entry[3] = hits + 1
+        if entry[3] % self._verify_every == 0:
+            self.statistics["verifications"] += 1
+            return None
+        self.statistics["hits"] += 1
+        return text
+
+    def put(self, key: tuple[tuple, int], text: str) -> None:
+        position, fingerprint = key
+        self._entries[position] = [fingerprint, text, time.monotonic(), 0]
+        self._entries.move_to_end(position)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.statistics["evictions"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
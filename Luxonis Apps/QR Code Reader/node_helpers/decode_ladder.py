@@ -0,0 +1,112 @@
+import logging as log
+import time
+from typing import NamedTuple, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+import zxingcpp
+
+__all__ = ["DecodeLadder", "LadderResult", "decode_codes", "decode_crop", "RUNGS"]
+
+
+def decode_codes(crop: np.ndarray) -> list[str]:
+    """Decode a single channel QR code crop. Returns the texts of all decoded codes, empty if none decoded."""
+    height, width = crop.shape[:2]
+    if width == 0 or height == 0:
+        return []
+    try:
+        decoded_codes = zxingcpp.read_barcodes(crop)
+    except IndexError:
+        return []
+    return [code.text for code in decoded_codes]
+
+
+def decode_crop(crop: np.ndarray) -> Optional[str]:
+    """Decode a single channel QR code crop. Returns the text of the first decoded code or None."""
+    codes = decode_codes(crop)
+    return codes[0] if codes else None
+
+
+def _raw(crop: np.ndarray) -> np.ndarray:
+    return crop
+
+
+def _upscale(crop: np.ndarray) -> np.ndarray:
+    # small codes have modules of one or two pixels, zxing finds the finder patterns more easily at twice the size
+    return cv2.resize(crop, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+
+
+def _threshold(crop: np.ndarray) -> np.ndarray:
+    # uneven lighting and glare across the code
+    block_size = max(3, min(crop.shape[:2]) // 8 | 1)
+    return cv2.adaptiveThreshold(crop, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, 2)
+
+
+def _sharpen(crop: np.ndarray) -> np.ndarray:
+    # unsharp mask against motion and focus blur
+    return cv2.addWeighted(crop, 1.5, cv2.GaussianBlur(crop, (0, 0), sigmaX=2), -0.5, 0)
+
+
+# rung name -> preprocessing of the single channel crop
+RUNGS = {"raw": _raw, "upscale": _upscale, "threshold": _threshold, "sharpen": _sharpen}
+# smaller crops can't hold a code, and the OpenCV rungs raise on empty ones
+MIN_CROP_SIDE = 4
+
+
+def _parse_rungs(rungs: Union[str, Sequence[str]]) -> list[str]:
+    """Rung names of a comma separated text, recordings made before the ladder was configurable hold a list already."""
+    if isinstance(rungs, str):
+        return [rung.strip() for rung in rungs.split(",") if rung.strip()]
+    return list(rungs)
+
+
+class LadderResult(NamedTuple):
+    text: Optional[str]
+    rung: Optional[str]  # the rung which decoded the crop
+    out_of_budget: bool = False  # gave up before trying all rungs
+    codes: int = 0  # codes the rung decoded in the crop, the text is the first one's
+
+
+class DecodeLadder:
+    """
+    Try increasingly expensive variants of a crop until one of them decodes.
+
+    The rungs run in the given order and the ladder stops at the first success. Before every rung but the first, the CPU
+    time spent on the crop is checked against `crop_budget_seconds` and the wall clock against the frame deadline, a crop
+    over budget is given up. The CPU time is measured per thread, so the budget holds in the decoding worker processes too.
+    """
+
+    def __init__(self, rungs: Sequence[str] = tuple(RUNGS), crop_budget_seconds: float = 0.05):
+        unknown = [rung for rung in rungs if rung not in RUNGS]
+        if unknown or not rungs:
+            raise ValueError(f"Invalid decode ladder {list(rungs)}, rungs are {list(RUNGS)}")
+        self.rungs = list(rungs)
+        self.crop_budget_seconds = crop_budget_seconds
+        self.statistics = dict.fromkeys(self.rungs + ["failed", "out_of_budget"], 0)
+
+    @classmethod
+    def from_configuration(cls, configuration: dict) -> "DecodeLadder":
+        """The ladder of `decode_ladder`, comma separated rung names, and `decode_crop_budget_ms` of the app configuration."""
+        return cls(rungs=_parse_rungs(configuration["decode_ladder"]), crop_budget_seconds=configuration["decode_crop_budget_ms"] / 1000)
+
+    def decode(self, crop: np.ndarray, deadline: Optional[float] = None) -> LadderResult:
+        """Decode a single channel crop, `deadline` is a time.monotonic() timestamp."""
+        if crop.size == 0 or min(crop.shape[:2]) < MIN_CROP_SIDE:
+            return LadderResult(text=None, rung=None)
+        start = time.thread_time()
+        for i, rung in enumerate(self.rungs):
+            if i > 0 and (time.thread_time() - start > self.crop_budget_seconds or (deadline is not None and time.monotonic() >= deadline)):
+                return LadderResult(text=None, rung=None, out_of_budget=True)
+            codes = decode_codes(RUNGS[rung](crop))
+            if codes:
+                return LadderResult(text=codes[0], rung=rung, codes=len(codes))
+        return LadderResult(text=None, rung=None)
+
+    def record(self, result: LadderResult) -> None:
+        """Count the result in the statistics - results from worker processes have to be recorded by the caller."""
+        if result.rung is not None:
+            self.statistics[result.rung] += 1
+        elif result.out_of_budget:
+            self.statistics["out_of_budget"] += 1
+        else:
+            self.statistics["failed"] += 1
@@ -0,0 +1,196 @@
+import concurrent.futures
+import logging as log
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .decode_ladder import DecodeLadder, LadderResult
+
+__all__ = ["DecodePool"]
+
+
+# shared memory block and decode ladder set up once per worker process
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+_worker_ladder: Optional[DecodeLadder] = None
+
+
+def _init_worker(name: str, ladder: DecodeLadder) -> None:
+    global _worker_memory, _worker_ladder
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_ladder = ladder
+
+
+def _decode_slot(offset: int, shape: tuple[int, ...], deadline: float) -> LadderResult:
+    crop = np.ndarray(shape, dtype=np.uint8, buffer=_worker_memory.buf, offset=offset)
+    try:
+        return _worker_ladder.decode(crop, deadline=deadline)
+    finally:
+        del crop
+
+
+class _Job(NamedTuple):
+    client: str
+    slot: int
+    shape: tuple[int, ...]
+    deadline: float
+    result: concurrent.futures.Future  # resolved once a worker decoded the crop
+
+
+class DecodePool:
+    """
+    Decode QR code crops in a pool of worker processes, shared by the decoders of all devices.
+
+    Crops are copied into fixed size slots of one shared memory block, only the slot offset and the crop shape are sent to
+    the workers, so no pixel data gets pickled. Crops larger than a slot, or crops for which no slot is free, are decoded in
+    the calling process.
+    A slot stays reserved until its worker finishes, even when the result came too late to be used.
+    Every crop goes through the decode ladder, the workers stop climbing it once the frame budget is used up.
+
+    `decode` can be called from several threads, one per client (device). Every client gets an equal share of the slots,
+    and the crops wait in one queue per client - the workers take them round robin over the clients, so a device with many
+    codes in view can't starve the others. Only `2 * workers` crops are handed to the executor at a time.
+    """
+
+    def __init__(self, workers: int, ladder: DecodeLadder, slots: int = 32, slot_bytes: int = 1024 * 1024):
+        if workers < 1:
+            raise ValueError(f"{workers=} must be at least 1")
+        self._slot_bytes = slot_bytes
+        self._slots = slots
+        self._ladder = ladder
+        self._memory = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._lock = threading.Lock()
+        self._free_slots = deque(range(slots))
+        self._waiting: dict[str, deque[_Job]] = {}  # client -> crops waiting for a worker
+        self._slots_used: dict[str, int] = {}
+        self._round_robin = deque()  # clients in the order they get the next worker
+        self._in_flight = 0
+        self._max_in_flight = 2 * workers
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                                initargs=(self._memory.name, ladder))
+        self.statistics = {"submitted": 0, "decoded": 0, "late": 0, "inline": 0, "no_free_slot": 0}
+        self.client_statistics: dict[str, dict[str, int]] = {}
+        log.info(f"Decode pool started with {workers} workers and {slots} slots of {slot_bytes / 1024:.0f} kB")
+
+    def register(self, client: str) -> None:
+        """Add a client before its first frame, so the slots are shared fairly from the start."""
+        with self._lock:
+            if client not in self._waiting:
+                self._waiting[client] = deque()
+                self._slots_used[client] = 0
+                self._round_robin.append(client)
+                self.client_statistics[client] = {"submitted": 0, "decoded": 0, "late": 0}
+
+    def decode(self, crops: list[np.ndarray], budget_seconds: float, client: str = "") -> list[Optional[LadderResult]]:
+        """Decode all crops, results keep the order of the crops.
+
+        Crops which are not decoded within `budget_seconds` have no result (None).
+        """
+        self.register(client)
+        deadline = time.monotonic() + budget_seconds
+        results: list[Optional[LadderResult]] = [None] * len(crops)
+        pending: dict[concurrent.futures.Future, int] = {}
+        inline: list[int] = []
+        for i, crop in enumerate(crops):
+            if crop.nbytes > self._slot_bytes:
+                inline.append(i)
+                continue
+            future = self._submit(crop, deadline=deadline, client=client)
+            if future is None:
+                self._count("no_free_slot")
+                inline.append(i)
+                continue
+            pending[future] = i
+        self._dispatch()
+
+        # large crops and crops without a free slot are decoded here while the workers are busy with the rest
+        for i in inline:
+            if time.monotonic() >= deadline:
+                self._count("late", client=client)
+                continue
+            self._count("inline")
+            results[i] = self._ladder.decode(crops[i], deadline=deadline)
+
+        done, not_done = concurrent.futures.wait(pending, timeout=max(deadline - time.monotonic(), 0))
+        for future in done:
+            try:
+                results[pending[future]] = future.result()
+            except Exception as e:
+                log.error(f"QR code decoding failed in worker process: {e!r}")
+        self._count("late", client=client, count=len(not_done))
+        self._count("decoded", client=client, count=sum(result is not None and result.text is not None for result in results))
+        return results
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._memory.close()
+        self._memory.unlink()
+
+    def _submit(self, crop: np.ndarray, deadline: float, client: str) -> Optional[concurrent.futures.Future]:
+        """Copy the crop into a free slot and queue it for the workers, None when the client used up its share of slots."""
+        with self._lock:
+            share = max(1, self._slots // len(self._waiting))
+            if not self._free_slots or self._slots_used[client] >= share:
+                return None
+            slot = self._free_slots.popleft()
+            self._slots_used[client] += 1
+        slot_view = np.ndarray(crop.shape, dtype=np.uint8, buffer=self._memory.buf, offset=slot * self._slot_bytes)
+        slot_view[...] = crop
+        del slot_view
+        job = _Job(client=client, slot=slot, shape=crop.shape, deadline=deadline, result=concurrent.futures.Future())
+        with self._lock:
+            self._waiting[client].append(job)
+        self._count("submitted", client=client)
+        return job.result
+
+    def _dispatch(self) -> None:
+        """Hand waiting crops to the executor, one client after the other."""
+        while True:
+            with self._lock:
+                if self._in_flight >= self._max_in_flight:
+                    return
+                job = self._next_job()
+                if job is None:
+                    return
+                if time.monotonic() >= job.deadline:
+                    # nobody waits for the result anymore
+                    self._release(job)
+                    job.result.set_result(None)
+                    continue
+                self._in_flight += 1
+            future = self._executor.submit(_decode_slot, job.slot * self._slot_bytes, job.shape, job.deadline)
+            # the callback runs from the executor thread once the worker is done with the slot
+            future.add_done_callback(lambda worker_future, job=job: self._finish(job=job, worker_future=worker_future))
+
+    def _next_job(self) -> Optional[_Job]:
+        for _ in range(len(self._round_robin)):
+            client = self._round_robin[0]
+            self._round_robin.rotate(-1)
+            if self._waiting[client]:
+                return self._waiting[client].popleft()
+        return None
+
+    def _finish(self, job: _Job, worker_future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._release(job)
+        if worker_future.cancelled():
+            job.result.cancel()
+        elif worker_future.exception() is not None:
+            job.result.set_exception(worker_future.exception())
+        else:
+            job.result.set_result(worker_future.result())
+        self._dispatch()
+
+    def _release(self, job: _Job) -> None:
+        self._free_slots.append(job.slot)
+        self._slots_used[job.client] -= 1
+
+    def _count(self, key: str, client: Optional[str] = None, count: int = 1) -> None:
+        with self._lock:
+            self.statistics[key] += count
+            if client is not None:
+                self.client_statistics[client][key] += count
@@ -0,0 +1,150 @@
+import json
+import logging as log
+import threading
+from collections import defaultdict, deque
+from functools import partial
+from typing import Callable, Optional
+
+import numpy as np
+
+from .timer import Timer
+
+__all__ = ["LatencyTracer"]
+
+
+class LatencyTracer:
+    """
+    Measure where a frame spends its time on the host.
+
+    Every callback call of a host node is timed with the host clock used by depthai (dai.Clock), which is also the clock
+    of ImgFrame.getTimestamp(). That gives per node
+    - self time: duration of the callback without the callbacks of the nodes downstream, which run nested inside it,
+    - latency: time from the device capture of the frame to the end of the callback.
+    Latency of nodes which don't pass the message on to any callback (the ends of the pipeline) is reported as end to end
+    latency.
+
+    The device-to-host clock offset is tracked from ImgFrame.getTimestamp() - ImgFrame.getTimestampDevice().
+    The last `trace_events` calls are kept in a ring buffer and can be exported to a Chrome trace file (chrome://tracing,
+    https://ui.perfetto.dev).
+    """
+    END_TO_END = "end_to_end"
+
+    def __init__(self, window: int = 1000, trace_events: int = 20000, report_every_seconds: float = 60,
+                 trace_path: Optional[str] = None):
+        self._self_times: dict[str, deque] = defaultdict(partial(deque, maxlen=window))
+        self._latencies: dict[str, deque] = defaultdict(partial(deque, maxlen=window))
+        self._device_offsets: deque = deque(maxlen=window)
+        self._events: deque = deque(maxlen=trace_events)
+        self._owners: dict[int, tuple[str, object]] = {}  # id(callback) -> node name, node
+        self._local = threading.local()
+        self._trace_path = trace_path
+        self._report_every_seconds = report_every_seconds
+        self._last_report = Timer()
+        self._last_report.reset()
+
+    def call(self, callback: Callable, message) -> None:
+        """Call `callback(message)` and record its timing."""
+        stack = self._stack()
+        stack.append(0.)  # time spent in nested callbacks
+        start = _now()
+        try:
+            callback(message)
+        finally:
+            end = _now()
+            nested = stack.pop()
+            if stack:
+                stack[-1] += end - start
+            name, owner = self._owner(callback)
+            is_sink = not getattr(owner, "callbacks", True)
+            self._record(name=name, message=message, start=start, end=end, nested=nested, is_sink=is_sink)
+            if not stack:
+                self._maybe_report()
+
+    def percentiles(self) -> dict[str, dict[str, dict[str, float]]]:
+        """p50, p95 and p99 in milliseconds of the self time and the latency of every node."""
+        return {
+            "self_time": {name: _percentiles(samples) for name, samples in list(self._self_times.items())},
+            "latency": {name: _percentiles(samples) for name, samples in list(self._latencies.items())},
+        }
+
+    @property
+    def device_offset_ms(self) -> Optional[float]:
+        if not self._device_offsets:
+            return None
+        return float(np.median(self._device_offsets)) * 1000
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Write the buffered calls as Chrome trace JSON, durations in microseconds."""
+        trace = {"traceEvents": list(self._events), "displayTimeUnit": "ms"}
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        log.info(f"Latency trace with {len(trace['traceEvents'])} events written to {path}")
+
+    def report(self) -> None:
+        percentiles = self.percentiles()
+        for name, values in sorted(percentiles["latency"].items()):
+            self_time = percentiles["self_time"].get(name)
+            self_time = f", self time {_format(self_time)}" if self_time else ""
+            log.info(f"Latency {name}: {_format(values)}{self_time}")
+        if self.device_offset_ms is not None:
+            log.info(f"Device to host clock offset: {self.device_offset_ms:.3f} ms")
+        if self._trace_path is not None:
+            try:
+                self.export_chrome_trace(self._trace_path)
+            except OSError as e:
+                log.warning(f"Couldn't write latency trace: {e}")
+
+    def _record(self, name: str, message, start: float, end: float, nested: float, is_sink: bool) -> None:
+        sequence_number = message.getSequenceNum() if hasattr(message, "getSequenceNum") else None
+        self._self_times[name].append(end - start - nested)
+        self._events.append({"name": name, "cat": "host_node", "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6, "pid": 0,
+                             "tid": threading.get_ident(), "args": {"sequence_number": sequence_number}})
+
+        captured = message.getTimestamp() if hasattr(message, "getTimestamp") else None
+        if captured is None:
+            return
+        latency = end - captured.total_seconds()
+        self._latencies[name].append(latency)
+        if is_sink:
+            self._latencies[self.END_TO_END].append(latency)
+        if hasattr(message, "getTimestampDevice"):
+            self._device_offsets.append((captured - message.getTimestampDevice()).total_seconds())
+
+    def _owner(self, callback: Callable) -> tuple[str, object]:
+        """Name of the node the callback belongs to and the node itself (None for plain functions)."""
+        cached = self._owners.get(id(callback))
+        if cached is None:
+            function = callback.func if isinstance(callback, partial) else callback
+            owner = getattr(function, "__self__", None)
+            name = type(owner).__name__ if owner is not None else getattr(function, "__qualname__", repr(function))
+            if isinstance(getattr(owner, "name", None), str):
+                name = f"{name}({owner.name})"
+            cached = self._owners[id(callback)] = (name, owner)
+        return cached
+
+    def _stack(self) -> list[float]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _maybe_report(self) -> None:
+        if self._last_report.has_elapsed(time_in_seconds=self._report_every_seconds):
+            self._last_report.reset()
+            self.report()
+
+
+def _now() -> float:
+    import depthai as dai  # imported where it is used, the tracer is optional and node_helpers loads without the SDK
+    return dai.Clock.now().total_seconds()
+
+
+def _percentiles(samples: deque) -> dict[str, float]:
+    if not samples:
+        return {}
+    p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), (50, 95, 99)) * 1000
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def _format(values: dict[str, float]) -> str:
+    return ", ".join(f"{key} {value:.1f} ms" for key, value in values.items())
@@ -0,0 +1,51 @@
+import threading
+from typing import Callable
+
+import cv2
+import numpy as np
+
+__all__ = ["LocalDisplay"]
+
+
+class LocalDisplay:
+    """
+    The OpenCV windows of all host nodes, drawn by a single thread.
+
+    HighGUI isn't thread safe - imshow and waitKey called from the dispatcher threads of several devices at once crash or
+    freeze the windows on some backends. Host nodes `show` their images from any thread, only the newest image of every
+    window is kept. The thread which owns the windows draws them with `run` until it is stopped, or `pump` for one round.
+    """
+
+    def __init__(self, idle_ms: int = 50):
+        """:param idle_ms: how often the windows process their events while no new image arrives"""
+        self._idle_seconds = idle_ms / 1000
+        self._lock = threading.Lock()
+        self._pending: dict[str, np.ndarray] = {}
+        self._updated = threading.Event()
+        self.statistics = {"shown": 0, "replaced": 0}  # replaced - images newer ones took the place of before they were shown
+
+    def show(self, window: str, image: np.ndarray) -> None:
+        """Show `image` in `window` from the drawing thread, a copy is kept, so the caller may reuse the buffer."""
+        image = image.copy()
+        with self._lock:
+            if window in self._pending:
+                self.statistics["replaced"] += 1
+            self._pending[window] = image
+        self._updated.set()
+
+    def pump(self) -> None:
+        """Draw the images shown since the last call and let the windows process their events, only from the drawing thread."""
+        self._updated.clear()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for window, image in pending.items():
+            cv2.imshow(window, image)
+        self.statistics["shown"] += len(pending)
+        cv2.waitKey(1)
+
+    def run(self, stop: Callable[[], bool]) -> None:
+        """Draw the windows in the calling thread until `stop` returns True, then close them."""
+        while not stop():
+            self._updated.wait(timeout=self._idle_seconds)
+            self.pump()
+        cv2.destroyAllWindows()
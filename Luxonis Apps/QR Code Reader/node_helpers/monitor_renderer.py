@@ -0,0 +1,65 @@
+import functools
+import time
+
+import cv2
+import numpy as np
+
+from .bounding_box import BoundingBoxBatch
+
+__all__ = ["MonitorRenderer"]
+
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+@functools.lru_cache(maxsize=1024)
+def _text_size(text: str, font_scale: float, thickness: int) -> tuple[int, int, int]:
+    """Width, height and baseline of the rendered text, labels repeat from frame to frame."""
+    (width, height), baseline = cv2.getTextSize(text, _FONT, font_scale, thickness)
+    return width, height, baseline
+
+
+class MonitorRenderer:
+    """
+    Draw the QR code boxes on a downscaled image for the local monitor.
+
+    The image is downscaled before anything is drawn, the boxes are scaled to it in one vectorized step. `should_render`
+    caps the display frame rate at `max_fps` independently of the pipeline frame rate, frames in between are not drawn.
+    """
+
+    def __init__(self, display_width: int = 1280, max_fps: float = 10, font_scale: float = 0.5, thickness: int = 1):
+        self.display_width = display_width
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self._min_interval_seconds = 1 / max_fps if max_fps > 0 else 0.0
+        self._last_render = None
+        self.statistics = {"rendered": 0, "skipped": 0, "draw_seconds": 0.0}
+
+    def should_render(self) -> bool:
+        now = time.monotonic()
+        if self._last_render is not None and now - self._last_render < self._min_interval_seconds:
+            self.statistics["skipped"] += 1
+            return False
+        self._last_render = now
+        return True
+
+    def scale(self, image_width: int) -> float:
+        """Factor the image has to be resized by to fit the display width, images are never upscaled."""
+        return min(1.0, self.display_width / image_width)
+
+    def draw(self, image: np.ndarray, bboxes: BoundingBoxBatch) -> np.ndarray:
+        """Draw the boxes, relative to the full image, with their labels and confidences onto the downscaled `image`."""
+        start = time.perf_counter()
+        height, width = image.shape[:2]
+        boxes = (bboxes.relative * (width, height, width, height)).astype(np.int32)
+        for (xmin, ymin, xmax, ymax), label, confidence in zip(boxes.tolist(), bboxes.labels, bboxes.confidences.tolist()):
+            cv2.rectangle(image, (xmin, ymin), (xmax, ymax), color=(0, 0, 255), thickness=self.thickness + 1)
+            text = f"{label}, {confidence:.2f}"
+            text_width, text_height, baseline = _text_size(text, self.font_scale, self.thickness)
+            # above the box, inside the image when the box touches the top edge
+            text_y = max(ymin - baseline, text_height)
+            text_x = min(xmin, max(width - text_width, 0))
+            cv2.rectangle(image, (text_x, text_y - text_height), (text_x + text_width, text_y + baseline), color=(0, 0, 0), thickness=-1)
+            cv2.putText(image, text, (text_x, text_y), _FONT, self.font_scale, (255, 255, 255), self.thickness)
+        self.statistics["rendered"] += 1
+        self.statistics["draw_seconds"] += time.perf_counter() - start
+        return image
@@ -0,0 +1,176 @@
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+if TYPE_CHECKING:
+    import depthai as dai
+
+__all__ = ["MosaicAssembler", "frame_view", "frame_plane"]
+
+# ImgFrame.Type names, compared by name so the helpers run on stand-in frames without the depthai SDK
+_PLANAR_BGR = "BGR888p"
+_INTERLEAVED_BGR = "BGR888i"
+_SINGLE_CHANNEL = ("GRAY8", "RAW8")
+
+
+def frame_view(frame: "dai.ImgFrame") -> np.ndarray:
+    """Return the frame pixels as a (height, width[, channels]) view of the message data.
+
+    Unlike getCvFrame(), planar BGR frames are not converted to a new interleaved array, numpy copies the strided view
+    directly into its destination. Unsupported frame types fall back to getCvFrame().
+    """
+    width = frame.getWidth()
+    height = frame.getHeight()
+    frame_type = frame.getType().name
+    data = frame.getData()
+    if frame_type == _PLANAR_BGR and data.size == 3 * width * height:
+        return data.reshape(3, height, width).transpose(1, 2, 0)
+    if frame_type == _INTERLEAVED_BGR and data.size == 3 * width * height:
+        return data.reshape(height, width, 3)
+    if frame_type in _SINGLE_CHANNEL and data.size == width * height:
+        return data.reshape(height, width)
+    return frame.getCvFrame()
+
+
+def frame_plane(frame: "dai.ImgFrame", channel: int) -> np.ndarray:
+    """Return a single channel of the frame as a (height, width) view of the message data.
+
+    GRAY8 frames are returned as they are, whatever the channel, and a plane of a planar BGR frame is contiguous, so neither
+    gets copied. Other frame types go through frame_view().
+    """
+    width = frame.getWidth()
+    height = frame.getHeight()
+    frame_type = frame.getType().name
+    data = frame.getData()
+    if frame_type == _PLANAR_BGR and data.size == 3 * width * height:
+        return data.reshape(3, height, width)[channel]
+    view = frame_view(frame)
+    return view if view.ndim == 2 else view[:, :, channel]
+
+
+class MosaicAssembler:
+    """
+    Stitch a grid of overlapping tiles into one image.
+
+    Tiles are written straight into a preallocated canvas, either one by one as they arrive (`start`, `add_tile`, `finish`)
+    or all at once with `assemble`. Canvases are recycled from a small pool, so a merged image is only valid until
+    `pool_size` further mosaics were assembled - copy it if you need to keep it longer.
+    `assemble_scaled` builds a downscaled mosaic for display without stitching the full resolution one.
+    Tiles are indexed column by column, the same way as `crop_vals` in the script node.
+    """
+
+    def __init__(self, rows: int, columns: int, overlap: float, pool_size: int = 3):
+        if rows < 1 or columns < 1:
+            raise ValueError(f"Mosaic grid must have at least one row and one column, got {rows}x{columns}")
+        if pool_size < 1:
+            raise ValueError(f"{pool_size=} must be at least 1")
+        self.rows = rows
+        self.columns = columns
+        self._overlap = overlap
+        self._pool_size = pool_size
+        self._pool: list[np.ndarray] = []
+        self._next_canvas = 0
+        self._canvas = None
+        self._allocated_bytes = 0
+        self._scaled_canvas = None
+
+        self.allocated_bytes_last_frame = 0
+        self.total_allocated_bytes = 0
+        self.merged_frames = 0
+
+    @property
+    def tile_count(self) -> int:
+        return self.rows * self.columns
+
+    def tile_origin(self, tile_index: int, tile_width: int, tile_height: int) -> tuple[int, int]:
+        """Top left corner (x, y) of the tile in the merged image."""
+        column, row = divmod(tile_index, self.rows)
+        return column * (tile_width - int(tile_width * self._overlap)), row * (tile_height - int(tile_height * self._overlap))
+
+    def merged_size(self, tile_width: int, tile_height: int) -> tuple[int, int]:
+        """Size (width, height) of the merged image."""
+        overlap_width = int(tile_width * self._overlap)
+        overlap_height = int(tile_height * self._overlap)
+        return (self.columns * tile_width - (self.columns - 1) * overlap_width,
+                self.rows * tile_height - (self.rows - 1) * overlap_height)
+
+    def start(self) -> None:
+        """Start a new mosaic, tiles of an unfinished mosaic are discarded."""
+        self._canvas = None
+        self._allocated_bytes = 0
+
+    def add_tile(self, tile_index: int, frame: "dai.ImgFrame") -> None:
+        if not 0 <= tile_index < self.tile_count:
+            raise IndexError(f"Tile index {tile_index} out of range for {self.rows}x{self.columns} grid")
+        tile = frame_view(frame)
+        tile_height, tile_width = tile.shape[:2]
+        if self._canvas is None:
+            self._canvas = self._acquire_canvas(tile_width=tile_width, tile_height=tile_height, shape_suffix=tile.shape[2:])
+        x, y = self.tile_origin(tile_index=tile_index, tile_width=tile_width, tile_height=tile_height)
+        self._canvas[y: y + tile_height, x: x + tile_width] = tile
+
+    def finish(self) -> np.ndarray:
+        """Return the merged image and update the allocation statistics."""
+        if self._canvas is None:
+            raise RuntimeError("No tiles were added to the mosaic")
+        canvas = self._canvas
+        self._canvas = None
+        self.allocated_bytes_last_frame = self._allocated_bytes
+        self.total_allocated_bytes += self._allocated_bytes
+        self.merged_frames += 1
+        self._allocated_bytes = 0
+        return canvas
+
+    def assemble(self, tiles: list["dai.ImgFrame"]) -> np.ndarray:
+        """Merge a complete list of tiles, ordered by tile index."""
+        if len(tiles) != self.tile_count:
+            raise ValueError(f"Got {len(tiles)} tiles for {self.rows}x{self.columns} grid")
+        self.start()
+        for tile_index, frame in enumerate(tiles):
+            self.add_tile(tile_index=tile_index, frame=frame)
+        return self.finish()
+
+    def assemble_scaled(self, tiles: list["dai.ImgFrame"], scale: float) -> np.ndarray:
+        """
+        Merge a complete list of tiles into an image `scale` times the size of the merged one.
+
+        Every tile is resized on its own straight into the canvas, the full resolution mosaic is never built. The canvas
+        is not part of the pool, it is reused by the next call.
+        """
+        if len(tiles) != self.tile_count:
+            raise ValueError(f"Got {len(tiles)} tiles for {self.rows}x{self.columns} grid")
+        views = [frame_view(frame) for frame in tiles]
+        tile_height, tile_width = views[0].shape[:2]
+        merged_width, merged_height = self.merged_size(tile_width=tile_width, tile_height=tile_height)
+        width = max(1, round(merged_width * scale))
+        height = max(1, round(merged_height * scale))
+        shape = (height, width, *views[0].shape[2:])
+        if self._scaled_canvas is None or self._scaled_canvas.shape != shape:
+            self._scaled_canvas = np.empty(shape, dtype=np.uint8)
+        canvas = self._scaled_canvas
+        for tile_index, tile in enumerate(views):
+            x, y = self.tile_origin(tile_index=tile_index, tile_width=tile_width, tile_height=tile_height)
+            xmin, ymin = round(x * scale), round(y * scale)
+            xmax, ymax = min(width, round((x + tile_width) * scale)), min(height, round((y + tile_height) * scale))
+            canvas[ymin: ymax, xmin: xmax] = cv2.resize(tile, (xmax - xmin, ymax - ymin), interpolation=cv2.INTER_AREA).reshape(
+                ymax - ymin, xmax - xmin, *shape[2:])
+        return canvas
+
+    def _acquire_canvas(self, tile_width: int, tile_height: int, shape_suffix: tuple) -> np.ndarray:
+        merged_width, merged_height = self.merged_size(tile_width=tile_width, tile_height=tile_height)
+        shape = (merged_height, merged_width, *shape_suffix)
+        if len(self._pool) < self._pool_size:
+            canvas = self._allocate(shape)
+            self._pool.append(canvas)
+            return canvas
+        index = self._next_canvas
+        self._next_canvas = (self._next_canvas + 1) % self._pool_size
+        if self._pool[index].shape != shape:
+            self._pool[index] = self._allocate(shape)
+        return self._pool[index]
+
+    def _allocate(self, shape: tuple) -> np.ndarray:
+        canvas = np.empty(shape, dtype=np.uint8)
+        self._allocated_bytes += canvas.nbytes
+        return canvas
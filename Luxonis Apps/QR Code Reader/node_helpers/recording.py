@@ -0,0 +1,166 @@
+import json
+import os
+import struct
+from datetime import timedelta
+from typing import TYPE_CHECKING, Iterator, Optional, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import depthai as dai
+
+__all__ = ["StreamWriter", "StreamReader", "RecordedMessage", "write_config", "read_config"]
+
+RecordedMessage = Union["dai.ImgFrame", "dai.ImgDetections", "dai.Buffer"]
+
+# kind, sequence number, timestamp [ns], device timestamp [ns], host receive time [ns], payload length
+_HEADER = struct.Struct("<BqqqqI")
+_FRAME_HEADER = struct.Struct("<III")  # frame type, width, height
+_DATA_LENGTH = struct.Struct("<I")  # length of the data of a detections message, the tile index, in front of the detections
+_DETECTION = np.dtype([("label", "<u4"), ("confidence", "<f4"), ("xmin", "<f4"), ("ymin", "<f4"), ("xmax", "<f4"), ("ymax", "<f4")])
+# sequence number, host receive time [ns], offset of the record in the .rec file
+_INDEX = np.dtype([("sequence_number", "<i8"), ("received_ns", "<i8"), ("offset", "<i8")])
+
+_KIND_FRAME = 1
+_KIND_DETECTIONS = 2
+_KIND_BUFFER = 3
+_KIND_DETECTIONS_WITH_DATA = 4
+_CONFIG_FILE = "config.json"
+
+
+class StreamWriter:
+    """
+    Append the messages of one device stream to `<directory>/<name>.rec`.
+
+    Every record is a fixed size header followed by the payload - raw frame data, a packed array of detections after the
+    data of the detections message if it has any, or the data of a plain Buffer.
+    `<name>.idx` holds the sequence number, receive time and file offset of every record, so a reader can seek without
+    scanning the recording.
+    """
+
+    def __init__(self, directory: str, name: str):
+        os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self._records = open(os.path.join(directory, f"{name}.rec"), "wb")
+        self._index = open(os.path.join(directory, f"{name}.idx"), "wb")
+        self.written_messages = 0
+
+    def write(self, message: RecordedMessage, received: Optional[timedelta] = None) -> None:
+        import depthai as dai  # only recording and replay need the SDK, node_helpers loads without it
+        received = dai.Clock.now() if received is None else received
+        if isinstance(message, dai.ImgFrame):
+            kind = _KIND_FRAME
+            payload = (_FRAME_HEADER.pack(int(message.getType()), message.getWidth(), message.getHeight()),
+                       memoryview(np.ascontiguousarray(message.getData())))
+        elif isinstance(message, dai.ImgDetections):
+            detections = np.array([(detection.label, detection.confidence, detection.xmin, detection.ymin, detection.xmax, detection.ymax)
+                                   for detection in message.detections], dtype=_DETECTION)
+            data = np.ascontiguousarray(message.getData())
+            kind = _KIND_DETECTIONS_WITH_DATA if data.nbytes else _KIND_DETECTIONS
+            payload = (memoryview(detections),)
+            if data.nbytes:
+                payload = (_DATA_LENGTH.pack(data.nbytes), memoryview(data)) + payload
+        elif isinstance(message, dai.Buffer):
+            kind = _KIND_BUFFER
+            payload = (memoryview(np.ascontiguousarray(message.getData())),)
+        else:
+            raise TypeError(f"Can't record message of type {type(message).__name__}")
+
+        offset = self._records.tell()
+        header = _HEADER.pack(kind, message.getSequenceNum(), _ns(message.getTimestamp()), _ns(message.getTimestampDevice()),
+                              _ns(received), sum(part.nbytes if isinstance(part, memoryview) else len(part) for part in payload))
+        self._records.write(header)
+        for part in payload:
+            self._records.write(part)
+        self._index.write(np.array([(message.getSequenceNum(), _ns(received), offset)], dtype=_INDEX).tobytes())
+        self.written_messages += 1
+
+    def close(self) -> None:
+        self._records.close()
+        self._index.close()
+
+
+class StreamReader:
+    """Read a stream written by StreamWriter back as host side depthai messages."""
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self._records = open(os.path.join(directory, f"{name}.rec"), "rb")
+        self.index = np.fromfile(os.path.join(directory, f"{name}.idx"), dtype=_INDEX)
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[tuple[int, RecordedMessage]]:
+        """Yield (host receive time [ns], message) from the current position on."""
+        while self._position < len(self.index):
+            yield self.read()
+
+    def seek(self, sequence_number: int) -> None:
+        """Continue reading at the first message with at least the given sequence number."""
+        self._position = int(np.searchsorted(self.index["sequence_number"], sequence_number, side="left"))
+
+    def peek_received_ns(self) -> Optional[int]:
+        if self._position >= len(self.index):
+            return None
+        return int(self.index["received_ns"][self._position])
+
+    def read(self) -> tuple[int, RecordedMessage]:
+        import depthai as dai
+        if self._position >= len(self.index):
+            raise EOFError(f"End of recorded stream {self.name}")
+        self._records.seek(int(self.index["offset"][self._position]))
+        self._position += 1
+        kind, sequence_number, timestamp, timestamp_device, received, length = _HEADER.unpack(self._records.read(_HEADER.size))
+        payload = self._records.read(length)
+        if kind == _KIND_FRAME:
+            frame_type, width, height = _FRAME_HEADER.unpack_from(payload)
+            message = dai.ImgFrame()
+            message.setType(dai.ImgFrame.Type(frame_type))
+            message.setWidth(width)
+            message.setHeight(height)
+            message.setData(np.frombuffer(payload, dtype=np.uint8, offset=_FRAME_HEADER.size))
+        elif kind in (_KIND_DETECTIONS, _KIND_DETECTIONS_WITH_DATA):
+            message = dai.ImgDetections()
+            offset = 0
+            if kind == _KIND_DETECTIONS_WITH_DATA:
+                data_length, = _DATA_LENGTH.unpack_from(payload)
+                offset = _DATA_LENGTH.size + data_length
+                message.setData(np.frombuffer(payload, dtype=np.uint8, count=data_length, offset=_DATA_LENGTH.size))
+            detections = []
+            for label, confidence, xmin, ymin, xmax, ymax in np.frombuffer(payload, dtype=_DETECTION, offset=offset).tolist():
+                detection = dai.ImgDetection()
+                detection.label = label
+                detection.confidence = confidence
+                detection.xmin, detection.ymin, detection.xmax, detection.ymax = xmin, ymin, xmax, ymax
+                detections.append(detection)
+            message.detections = detections
+        elif kind == _KIND_BUFFER:
+            message = dai.Buffer()
+            message.setData(np.frombuffer(payload, dtype=np.uint8))
+        else:
+            raise ValueError(f"Unknown record kind {kind} in stream {self.name}")
+        message.setSequenceNum(sequence_number)
+        message.setTimestamp(timedelta(microseconds=timestamp / 1000))
+        message.setTimestampDevice(timedelta(microseconds=timestamp_device / 1000))
+        return received, message
+
+    def close(self) -> None:
+        self._records.close()
+
+
+def write_config(directory: str, configuration: dict) -> None:
+    """Snapshot of the app configuration the recording was made with."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, _CONFIG_FILE), "w") as f:
+        json.dump(configuration, f, indent=2, default=str)
+
+
+def read_config(directory: str) -> dict:
+    with open(os.path.join(directory, _CONFIG_FILE)) as f:
+        return json.load(f)
+
+
+def _ns(time: timedelta) -> int:
+    return (time.days * 86_400 + time.seconds) * 1_000_000_000 + time.microseconds * 1000
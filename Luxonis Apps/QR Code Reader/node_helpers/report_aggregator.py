@@ -0,0 +1,96 @@
+import logging as log
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+__all__ = ["CoalescedReport", "ReportAggregator", "BackgroundSender"]
+
+
+@dataclass(slots=True, kw_only=True)
+class CoalescedReport:
+    labels: list[str] = field(default_factory=list)  # every new code seen since the last report, in order of appearance
+    image: Optional[np.ndarray] = None  # copy of the frame showing the most codes
+    boxes: list[tuple[tuple[int, int, int, int], str, float]] = field(default_factory=list)  # box, label, confidence in `image`
+    sequence_number: int = -1  # of `image`
+
+
+class ReportAggregator:
+    """
+    Collect the new QR codes seen during the report cooldown into a single report.
+
+    The report keeps the full list of new codes and one context image - the frame with the most decoded codes, so only that
+    frame gets copied.
+    """
+
+    def __init__(self):
+        self._pending: Optional[CoalescedReport] = None
+        self.statistics = {"reports": 0, "codes_coalesced": 0}
+
+    @property
+    def has_pending(self) -> bool:
+        return self._pending is not None
+
+    def add(self, new_labels: list[str], boxes: list[tuple[tuple[int, int, int, int], str, float]], image: Callable[[], np.ndarray],
+            sequence_number: int) -> None:
+        """
+        :param new_labels: codes seen for the first time in this frame
+        :param boxes: all decoded codes of the frame
+        :param image: returns the frame, it is called and copied only when the frame becomes the context image
+        """
+        if self._pending is None:
+            self._pending = CoalescedReport()
+        else:
+            # would have been a report of its own
+            self.statistics["codes_coalesced"] += len(new_labels)
+        self._pending.labels.extend(label for label in new_labels if label not in self._pending.labels)
+        if self._pending.image is None or len(boxes) > len(self._pending.boxes):
+            self._pending.image = image().copy()
+            self._pending.boxes = list(boxes)
+            self._pending.sequence_number = sequence_number
+
+    def flush(self) -> Optional[CoalescedReport]:
+        report, self._pending = self._pending, None
+        if report is not None:
+            self.statistics["reports"] += 1
+        return report
+
+
+class BackgroundSender:
+    """Run `send` for the submitted items on a daemon thread, items which don't fit into the bounded queue are dropped."""
+
+    def __init__(self, send: Callable, max_queued: int = 2, name: str = "BackgroundSender"):
+        self._send = send
+        self._queue = queue.Queue(maxsize=max_queued)
+        self.statistics = {"sent": 0, "dropped": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item, timeout: float = 0) -> bool:
+        """Queue the item, waiting up to `timeout` seconds for room. False when it was dropped."""
+        try:
+            self._queue.put(item, block=timeout > 0, timeout=timeout or None)
+        except queue.Full:
+            self.statistics["dropped"] += 1
+            return False
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Send what is queued and stop the thread, waiting up to `timeout` seconds."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            log.warning(f"{self._thread.name} is still busy, not waiting for it")
+            return
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            try:
+                self._send(item)
+                self.statistics["sent"] += 1
+            except Exception as e:
+                self.statistics["failed"] += 1
+                log.error(f"{self._thread.name} failed: {e!r}")
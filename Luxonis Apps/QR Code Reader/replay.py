@@ -0,0 +1,95 @@
+"""Replay recordings of the device streams through the QR host nodes, no OAK needed.
+
+Record with the `record_streams` option of the app, then run e.g.:
+
+    python replay.py recordings/20240101_120000_<mxid> --max-speed
+
+Several recordings are replayed at the same time, like the devices of a multi-device app - one host node graph per
+recording, all sharing one decode pool:
+
+    python replay.py recordings/20240101_120000_<mxid 1> recordings/20240101_120000_<mxid 2> --max-speed
+"""
+import argparse
+import logging as log
+import os
+import threading
+
+import robothub as rh
+
+from app_pipeline import host_node
+from app_pipeline.host_graph import create_host_graph
+from app_pipeline.replay import Replayer
+from node_helpers import DecodeLadder, DecodePool, LatencyTracer, LocalDisplay, read_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="directories written by the record_streams option")
+    parser.add_argument("--max-speed", action="store_true", help="don't pace the messages like the recording, replay as fast as possible")
+    parser.add_argument("--start", type=int, default=0, help="start at this sequence number")
+    parser.add_argument("--monitor", action="store_true", help="show the results like the app does")
+    parser.add_argument("--trace", metavar="PATH", help="trace host node latencies and write a Chrome trace to PATH")
+    args = parser.parse_args()
+
+    # the host nodes read the configuration the recordings were made with, it has to be the same for all of them
+    rh.CONFIGURATION.update(read_config(args.recordings[0]))
+    for recording in args.recordings[1:]:
+        if read_config(recording)["resolution"] != rh.CONFIGURATION["resolution"]:
+            parser.error(f"{recording} was recorded at a different resolution than {args.recordings[0]}")
+    # a replay doesn't touch the ledger of the app
+    rh.CONFIGURATION["code_ledger_path"] = None
+    # recordings made before crop skipping existed
+    rh.CONFIGURATION.setdefault("qr_skip_frames", 0)
+    # recordings made before the detections carried their tile index
+    rh.CONFIGURATION.setdefault("tile_index_in_label", False)
+    decode_pool = None
+    if rh.CONFIGURATION["decode_workers"] > 0:
+        ladder = DecodeLadder.from_configuration(rh.CONFIGURATION)
+        decode_pool = DecodePool(workers=rh.CONFIGURATION["decode_workers"], ladder=ladder)
+    # the monitor windows of all recordings, drawn by the main thread
+    display = LocalDisplay() if args.monitor and rh.LOCAL_DEV else None
+    replayers = {}
+    host_graphs = []
+    for recording in args.recordings:
+        name = os.path.basename(os.path.normpath(recording))
+        replayer = replayers[name] = Replayer(directory=recording, real_time=not args.max_speed)
+        replayer.seek(args.start)
+        host_graphs.append(create_host_graph(high_res_frames=replayer.sources["high_res_frames"],
+                                             qr_detection_out=replayer.sources["qr_detection_out"],
+                                             h264_frames=replayer.sources["h264_stream"],
+                                             qr_crops_queue=replayer.queues["qr_crops"],
+                                             crop_skips_queue=replayer.queues.get("qr_crop_skips"),
+                                             with_monitor=args.monitor, decode_pool=decode_pool, device_mxid=name,
+                                             display=display))
+    host_node.BaseNode.tracer = LatencyTracer(trace_path=args.trace) if args.trace else None
+    durations = {}
+
+    def replay(name: str, replayer: Replayer) -> None:
+        durations[name] = replayer.run()
+
+    threads = [threading.Thread(target=replay, args=(name, replayer), name=f"replay_{name}") for name, replayer in replayers.items()]
+    try:
+        for thread in threads:
+            thread.start()
+        if display is not None:
+            display.run(stop=lambda: not any(thread.is_alive() for thread in threads))
+        for thread in threads:
+            thread.join()
+    finally:
+        for host_graph in host_graphs:
+            host_graph.close()
+        if decode_pool is not None:
+            decode_pool.close()
+        for replayer in replayers.values():
+            replayer.close()
+    for name, replayer in replayers.items():
+        duration = durations.get(name, 0.0)
+        mosaics = replayer.replayed_messages["high_res_frames"] // rh.CONFIGURATION["crop_count"]
+        log.info(f"{name}: replayed {sum(replayer.replayed_messages.values())} messages in {duration:.2f} s, "
+                 f"{mosaics} frames, {mosaics / max(duration, 1e-9):.2f} FPS")
+    if host_node.BaseNode.tracer is not None:
+        host_node.BaseNode.tracer.report()
+
+
+if __name__ == "__main__":
+    main()
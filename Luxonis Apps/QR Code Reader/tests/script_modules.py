@@ -0,0 +1,18 @@
+import importlib.util
+import os
+
+_APP_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script_module(path: str):
+    """
+    Load a module shared with a Script node straight from its file.
+
+    Those modules are plain Python, loading them skips app_pipeline/__init__.py, which needs depthai. The same goes for host
+    modules which only use the standard library, like the synchronizer.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(f"script_{name}", os.path.join(_APP_DIRECTORY, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
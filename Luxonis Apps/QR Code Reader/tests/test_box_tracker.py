@@ -0,0 +1,57 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from node_helpers.box_tracker import BoxTracker, iou_matrix
+
+BOX = np.array([0.1, 0.1, 0.2, 0.2])
+
+
+def test_iou_matrix():
+    ious = iou_matrix([BOX, [0.15, 0.1, 0.25, 0.2]], [BOX, [0.5, 0.5, 0.6, 0.6]])
+    assert ious == pytest.approx(np.array([[1.0, 0.0], [1 / 3, 0.0]]))
+
+
+def test_track_ids_stay_with_moving_boxes():
+    tracker = BoxTracker(skip_frames=3)
+    first = tracker.update(boxes=[BOX, BOX + 0.5], labels=["a", "b"], skipped=[False, False])
+    # listed in the other order and moved a bit
+    second = tracker.update(boxes=[BOX + 0.51, BOX + 0.01], labels=["b", "a"], skipped=[False, False])
+    assert [track.track_id for track in second] == [first[1].track_id, first[0].track_id]
+    # a box far from every track starts a new one
+    third = tracker.update(boxes=[BOX + 0.01, [0.8, 0.0, 0.9, 0.1]], labels=["a", None], skipped=[False, False])
+    assert third[0].track_id == first[0].track_id and third[1].track_id not in (first[0].track_id, first[1].track_id)
+    # tracks without a box for more than max_missed_frames frames are dropped
+    for _ in range(tracker.max_missed_frames + 1):
+        tracker.update(boxes=[BOX + 0.01], labels=["a"], skipped=[False])
+    assert [track.track_id for track in tracker.tracks] == [first[0].track_id]
+
+
+def _run(tracker: BoxTracker, labels: list) -> list[bool]:
+    """Feed one stationary box, skipped whenever it is on the skip list, like the crop Script node does.
+    `labels` gives the decode result of every frame the box is cropped in. Returns whether the box was skipped per frame."""
+    skipped_frames = []
+    labels = iter(labels)
+    for _ in range(100):
+        skipped = len(tracker.skip_list()) > 0
+        if not skipped:
+            label = next(labels, StopIteration)
+            if label is StopIteration:
+                return skipped_frames
+        tracker.update(boxes=[BOX], labels=[None if skipped else label], skipped=[skipped])
+        skipped_frames.append(skipped)
+    return skipped_frames
+
+
+def test_stationary_decoded_box_is_recropped_every_skip_frames():
+    tracker = BoxTracker(skip_frames=2)
+    # decoded twice to be stationary, then cropped again after every two skipped frames
+    assert _run(tracker, labels=["a", "a", "a", "a"]) == [False, False, True, True, False, True, True, False, True, True]
+    assert len(tracker.tracks) == 1 and tracker.tracks[0].text == "a"
+    assert tracker.statistics["skipped"] == 6
+
+
+def test_failed_decode_takes_the_track_off_the_skip_list():
+    tracker = BoxTracker(skip_frames=2)
+    assert _run(tracker, labels=["a", "a", None, None, "a"]) == [False, False, True, True, False, False, False, True, True]
+    assert tracker.tracks[0].text == "a"
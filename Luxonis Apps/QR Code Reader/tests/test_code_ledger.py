@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from node_helpers.code_ledger import CodeLedger
+
+
+def test_codes_recorded_before_close_are_seen_after_a_restart(tmp_path):
+    path = str(tmp_path / "codes.sqlite")
+    # a flush interval long enough that only close writes the batch
+    ledger = CodeLedger(path=path, flush_interval_ms=60_000)
+    ledger.record("pallet-1", box=(1, 2, 3, 4), seen=100.0)
+    ledger.record("pallet-1", box=(5, 6, 7, 8), seen=160.0)
+    assert ledger.seen_since("pallet-1", since=150.0)
+    ledger.close()
+
+    restarted = CodeLedger(path=path, flush_interval_ms=60_000)
+    entry = restarted.get("pallet-1")
+    assert (entry.first_seen, entry.last_seen, entry.count, entry.box) == (100.0, 160.0, 2, (5, 6, 7, 8))
+    assert restarted.seen_since("pallet-1", since=150.0) and not restarted.seen_since("pallet-1", since=161.0)
+    assert [entry.text for entry in restarted.with_prefix("pallet")] == ["pallet-1"]
+    restarted.close()
+
+
+def test_get_counts_a_sighting_once_while_a_flush_commits(tmp_path, monkeypatch):
+    ledger = CodeLedger(path=str(tmp_path / "codes.sqlite"), flush_interval_ms=60_000)
+    ledger.record("pallet-1", box=(1, 2, 3, 4), seen=100.0)
+    ledger.flush()
+    ledger.record("pallet-1", box=(5, 6, 7, 8), seen=160.0)
+    query = ledger._query
+
+    def query_then_flush(sql, parameters):
+        # a flush on another thread tries to commit the batch between the database read and the merge with the batch
+        rows = query(sql, parameters)
+        flusher = threading.Thread(target=ledger.flush)
+        flusher.start()
+        flusher.join(timeout=0.2)
+        return rows
+
+    monkeypatch.setattr(ledger, "_query", query_then_flush)
+    entry = ledger.get("pallet-1")
+    assert (entry.first_seen, entry.last_seen, entry.count, entry.box) == (100.0, 160.0, 2, (5, 6, 7, 8))
+    monkeypatch.undo()
+    assert ledger.get("pallet-1") == entry
+    ledger.close()
+
+
+def test_concurrent_flushes_never_hide_a_code_or_lower_its_count(tmp_path):
+    ledger = CodeLedger(path=str(tmp_path / "codes.sqlite"), flush_interval_ms=0.1)
+    recorded = threading.Event()
+    done = threading.Event()
+    counts = []
+
+    def read():
+        recorded.wait()
+        while not done.is_set():
+            entry = ledger.get("pallet-1")
+            counts.append(None if entry is None else entry.count)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    recorded_count = 0
+    # until the reader raced plenty of flushes
+    while recorded_count < 2000 or len(counts) < 500:
+        ledger.record("pallet-1", box=(0, 0, 1, 1), seen=float(recorded_count))
+        recorded_count += 1
+        recorded.set()
+    done.set()
+    reader.join()
+    ledger.close()
+    assert None not in counts
+    assert counts == sorted(counts)
+    restarted = CodeLedger(path=str(tmp_path / "codes.sqlite"))
+    assert restarted.get("pallet-1").count == recorded_count
+    restarted.close()
+
+
+def test_sightings_are_appended_and_time_ranges_are_answered_from_them(tmp_path):
+    ledger = CodeLedger(path=str(tmp_path / "codes.sqlite"), flush_interval_ms=60_000)
+    for seen in (100.0, 300.0):
+        ledger.record("pallet-1", box=(0, 0, 1, 1), seen=seen)
+        ledger.record("pallet-2", box=(0, 0, 1, 1), seen=seen + 50)
+        ledger.flush()
+    assert [(entry.first_seen, entry.count) for entry in ledger.history("pallet-1")] == [(100.0, 1), (300.0, 1)]
+    assert ledger.get("pallet-1").count == 2
+    # both codes span the range 200 - 250, only pallet-2 was seen in it
+    assert [entry.text for entry in ledger.between(140.0, 250.0)] == ["pallet-2"]
+    assert [entry.text for entry in ledger.between(0.0, 1000.0)] == ["pallet-2", "pallet-1"]
+    ledger.close()
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("", ["pallet", "pallet-1", "pallet-2", "palletz", "z\U0010ffff", "z\U0010ffff\U0010ffff", "\ud7ff", "\ue000"]),
+    ("pallet-", ["pallet-1", "pallet-2"]),
+    ("pallet", ["pallet", "pallet-1", "pallet-2", "palletz"]),
+    ("Pallet", []),
+    ("z\U0010ffff", ["z\U0010ffff", "z\U0010ffff\U0010ffff"]),
+    ("\U0010ffff", []),
+    ("\ud7ff", ["\ud7ff"]),
+])
+def test_prefix_queries_match_exactly_the_texts_starting_with_the_prefix(tmp_path, prefix, expected):
+    ledger = CodeLedger(path=str(tmp_path / "codes.sqlite"), flush_interval_ms=60_000)
+    for text in ("pallet", "pallet-1", "pallet-2", "palletz", "z\U0010ffff", "z\U0010ffff\U0010ffff", "\ud7ff", "\ue000"):
+        ledger.record(text, box=(0, 0, 1, 1), seen=100.0)
+    ledger.flush()
+    # recorded, not written yet, prefix queries don't see it
+    ledger.record("pallet-3", box=(0, 0, 1, 1), seen=100.0)
+    assert [entry.text for entry in ledger.with_prefix(prefix)] == expected
+    ledger.close()
@@ -0,0 +1,77 @@
+import pytest
+
+from script_modules import load_script_module
+
+crop_skip = load_script_module("app_pipeline/crop_skip.py")
+qr_crops_script = load_script_module("app_pipeline/script_node_qr_crops.py")
+
+# crop size, crop size - overlap and merged image size of ReconstructQrDetections, in host pixels
+HOST_GRIDS = {
+    "4k": (qr_crops_script.ImageProperties4k, (768, 432), (576, 324), (1920, 1080)),
+    "5312x6000": (qr_crops_script.ImageProperties5312x6000, (600, 600), (450, 450), (1500, 1500)),
+}
+
+
+def test_skip_boxes_round_trip():
+    boxes = [(0.1, 0.2, 0.3, 0.4), (0.0, 0.5, 1.0, 0.99995), (-0.5, 0.25, 1.5, 0.75)]
+    data = crop_skip.encode_skip_boxes(boxes)
+    assert len(data) == 8 * len(boxes) and all(0 <= value <= 255 for value in data)
+    decoded = crop_skip.decode_skip_boxes(data)
+    # values outside of the image are clamped to it
+    expected = boxes[:2] + [(0.0, 0.25, 1.0, 0.75)]
+    for box, decoded_box in zip(expected, decoded):
+        assert decoded_box == pytest.approx(box, abs=1 / crop_skip.SKIP_BOX_SCALE)
+    assert crop_skip.decode_skip_boxes([]) == []
+
+
+def test_skip_boxes_are_capped():
+    boxes = [(i / 100, 0.0, i / 100 + 0.01, 0.01) for i in range(crop_skip.MAX_SKIP_BOXES + 6)]
+    data = crop_skip.encode_skip_boxes(boxes)
+    assert len(data) == 8 * crop_skip.MAX_SKIP_BOXES
+    assert len(crop_skip.decode_skip_boxes(data)) == crop_skip.MAX_SKIP_BOXES
+
+
+@pytest.mark.parametrize("resolution", HOST_GRIDS)
+def test_merged_box_matches_the_host_boxes(resolution):
+    properties, crop_size, step, merged_size = HOST_GRIDS[resolution]
+    tile_size = (properties.WIDTH_RELATIVE_SCALE, properties.HEIGHT_RELATIVE_SCALE)
+    grid_origin = properties.crop_vals[0]
+    grid_size = (properties.crop_vals[-1][0] + tile_size[0] - grid_origin[0], properties.crop_vals[-1][1] + tile_size[1] - grid_origin[1])
+    detection_box = (0.1, 0.25, 0.6, 0.9)
+    for tile_index, tile_origin in enumerate(properties.crop_vals):
+        device_box = crop_skip.merged_box(detection_box, tile_origin, grid_origin, grid_size, tile_size)
+        # ReconstructQrDetections: crop pixels, moved by the tile offset, relative to the merged image
+        host_box = [(value * crop_size[axis] + step[axis] * (tile_index // 3 if axis == 0 else tile_index % 3)) / merged_size[axis]
+                    for axis, value in zip((0, 1, 0, 1), detection_box)]
+        assert device_box == pytest.approx(host_box, abs=1 / min(crop_size))
+
+
+def test_skip_mask_thresholds():
+    skip_box = (0.1, 0.1, 0.2, 0.2)
+    same = skip_box
+    # 0.09 of 0.1 wide - IoU 0.9
+    shifted = (0.101, 0.1, 0.201, 0.2)
+    # half the width - IoU 1/3
+    half = (0.15, 0.1, 0.25, 0.2)
+    apart = (0.5, 0.5, 0.6, 0.6)
+    assert crop_skip.skip_mask([same, shifted, half, apart], [skip_box]) == [1, 1, 0, 0]
+    assert crop_skip.skip_mask([half], [skip_box], iou_threshold=0.3) == [1]
+    assert crop_skip.skip_mask([same], []) == [0]
+    assert crop_skip.box_iou(skip_box, (0.2, 0.1, 0.3, 0.2)) == 0.0
+
+
+def test_skip_list_is_kept_until_replaced_or_expired():
+    skip_list = crop_skip.SkipList(expire_frames=2)
+    first, second = [(0.1, 0.1, 0.2, 0.2)], [(0.5, 0.5, 0.6, 0.6)]
+    assert skip_list.update(None) == []
+    assert skip_list.update(crop_skip.encode_skip_boxes(first)) == pytest.approx(first)
+    # frames without a new skip list use the last one
+    assert skip_list.update(None) == pytest.approx(first)
+    assert skip_list.update(None) == pytest.approx(first)
+    assert skip_list.update(crop_skip.encode_skip_boxes(second)) == pytest.approx(second)
+    # an empty skip list replaces the last one as well
+    assert skip_list.update(crop_skip.encode_skip_boxes([])) == []
+    skip_list.update(crop_skip.encode_skip_boxes(second))
+    for _ in range(2):
+        assert skip_list.update(None) == pytest.approx(second)
+    assert skip_list.update(None) == []
@@ -0,0 +1,92 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+zxingcpp = pytest.importorskip("zxingcpp")
+
+from node_helpers.decode_ladder import MIN_CROP_SIDE, DecodeLadder, LadderResult
+
+
+@pytest.mark.parametrize("shape", [(0, 0), (0, 40), (40, 0), (MIN_CROP_SIDE - 1, 40), (40, 1)])
+def test_degenerate_crops_fail_without_running_the_rungs(shape):
+    ladder = DecodeLadder()
+    assert ladder.decode(np.zeros(shape, dtype=np.uint8)) == LadderResult(text=None, rung=None)
+
+
+def test_blank_crop_goes_through_every_rung():
+    ladder = DecodeLadder(crop_budget_seconds=10)
+    result = ladder.decode(np.full((64, 64), 255, dtype=np.uint8))
+    assert result == LadderResult(text=None, rung=None, out_of_budget=False)
+    ladder.record(result)
+    assert ladder.statistics["failed"] == 1
+
+
+def _qr_code(text: str, scale: int = 3) -> np.ndarray:
+    code = np.asarray(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.QRCode, text, quiet_zone=4), dtype=np.uint8)
+    return np.kron(code, np.ones((scale, scale), dtype=np.uint8))
+
+
+def _recording_rungs(monkeypatch, delay_seconds: float = 0.0) -> list[str]:
+    """Replace the rungs by ones which record their name and burn `delay_seconds` of CPU time before passing the crop on."""
+    from node_helpers import decode_ladder
+    calls = []
+
+    def rung(name):
+        def preprocess(crop):
+            calls.append(name)
+            start = decode_ladder.time.thread_time()
+            while decode_ladder.time.thread_time() - start < delay_seconds:
+                pass
+            return crop
+        return preprocess
+
+    monkeypatch.setattr(decode_ladder, "RUNGS", {name: rung(name) for name in decode_ladder.RUNGS})
+    return calls
+
+
+def test_ladder_stops_at_the_first_rung_which_decodes(monkeypatch):
+    calls = _recording_rungs(monkeypatch)
+    ladder = DecodeLadder(crop_budget_seconds=10)
+    result = ladder.decode(_qr_code("pallet-42"))
+    assert result == LadderResult(text="pallet-42", rung="raw", codes=1)
+    assert calls == ["raw"]
+
+
+def test_crop_over_its_cpu_budget_is_given_up_after_the_first_rung(monkeypatch):
+    calls = _recording_rungs(monkeypatch, delay_seconds=0.02)
+    ladder = DecodeLadder(crop_budget_seconds=0.01)
+    result = ladder.decode(np.full((64, 64), 255, dtype=np.uint8))
+    assert result == LadderResult(text=None, rung=None, out_of_budget=True)
+    assert calls == ["raw"]
+    ladder.record(result)
+    assert ladder.statistics["out_of_budget"] == 1
+
+
+def test_passed_frame_deadline_stops_the_ladder(monkeypatch):
+    calls = _recording_rungs(monkeypatch)
+    ladder = DecodeLadder(crop_budget_seconds=10)
+    result = ladder.decode(np.full((64, 64), 255, dtype=np.uint8), deadline=0.0)
+    assert result == LadderResult(text=None, rung=None, out_of_budget=True)
+    assert calls == ["raw"]
+
+
+def test_result_counts_all_codes_in_the_crop():
+    first, second = _qr_code("pallet-1"), _qr_code("pallet-2")
+    crop = np.full((first.shape[0], first.shape[1] + second.shape[1]), 255, dtype=np.uint8)
+    crop[:, :first.shape[1]], crop[:, first.shape[1]:] = first, second
+    result = DecodeLadder().decode(crop)
+    assert result.codes == 2
+    assert result.text in ("pallet-1", "pallet-2")
+
+
+@pytest.mark.parametrize("rungs, expected", [("raw, sharpen,upscale", ["raw", "sharpen", "upscale"]),
+                                             (["raw", "threshold"], ["raw", "threshold"])])
+def test_ladder_from_configuration_text_or_recorded_list(rungs, expected):
+    ladder = DecodeLadder.from_configuration({"decode_ladder": rungs, "decode_crop_budget_ms": 20})
+    assert ladder.rungs == expected
+    assert ladder.crop_budget_seconds == pytest.approx(0.02)
+
+
+def test_unknown_rung_in_the_configuration_is_rejected():
+    with pytest.raises(ValueError):
+        DecodeLadder.from_configuration({"decode_ladder": "raw, blur", "decode_crop_budget_ms": 50})
@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("depthai")  # importing app_pipeline builds the host nodes
+pytest.importorskip("robothub")
+
+from app_pipeline import host_node
+from app_pipeline.messages import Message
+from node_helpers import LatencyTracer, latency_tracer
+
+
+@dataclass(slots=True, kw_only=True)
+class _Synced(Message):
+    frame: Message
+    detections: Message
+
+
+class _Sink(host_node.BaseNode):
+    def __init__(self, input_node: host_node.BaseNode):
+        super().__init__()
+        input_node.set_callback(callback=self.receive)
+        self.received = []
+
+    def receive(self, message) -> None:
+        self.received.append(message)
+
+
+def test_sink_behind_sync_records_end_to_end_latency(monkeypatch):
+    # the host clock reads 3 s at every callback, the older input was captured at 1 s
+    monkeypatch.setattr(latency_tracer, "_now", lambda: 3.0)
+    tracer = LatencyTracer(report_every_seconds=3600)
+    monkeypatch.setattr(host_node.BaseNode, "tracer", tracer)
+
+    frames, detections = host_node.BaseNode(), host_node.BaseNode()
+    sync = host_node.Sync(inputs=[frames, detections], input_names=["frame", "detections"], output_message_obj=_Synced)
+    sink = _Sink(sync)
+    frames.send_message(Message(sequence_number=7, timestamp=timedelta(seconds=1)))
+    detections.send_message(Message(sequence_number=7, timestamp=timedelta(seconds=2)))
+
+    assert len(sink.received) == 1
+    assert sink.received[0].getTimestamp() == timedelta(seconds=1)
+    latencies = tracer.percentiles()["latency"]
+    assert latencies[LatencyTracer.END_TO_END]["p50"] == pytest.approx(2000)
+    assert latencies["_Sink"]["p50"] == pytest.approx(2000)
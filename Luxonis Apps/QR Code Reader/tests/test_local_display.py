@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from node_helpers.local_display import LocalDisplay
+
+
+@pytest.fixture
+def highgui(monkeypatch):
+    """Stands in for the OpenCV windows, records the images shown and the threads calling HighGUI."""
+    calls = {"shown": [], "threads": set()}
+
+    def imshow(window, image):
+        calls["threads"].add(threading.get_ident())
+        calls["shown"].append((window, int(image[0, 0])))
+
+    def wait_key(delay):
+        calls["threads"].add(threading.get_ident())
+        return -1
+
+    monkeypatch.setattr(cv2, "imshow", imshow)
+    monkeypatch.setattr(cv2, "waitKey", wait_key)
+    monkeypatch.setattr(cv2, "destroyAllWindows", lambda: None)
+    return calls
+
+
+def test_images_shown_by_dispatcher_threads_are_drawn_by_the_running_thread(highgui):
+    display = LocalDisplay(idle_ms=1)
+    done = threading.Event()
+
+    def dispatch(window: str):
+        for value in range(50):
+            display.show(window=window, image=np.full((2, 2), value, dtype=np.uint8))
+        done.wait()
+
+    dispatchers = [threading.Thread(target=dispatch, args=(f"device {index}",)) for index in range(3)]
+    for dispatcher in dispatchers:
+        dispatcher.start()
+    # the dispatchers stop once they showed all their images, the last ones are drawn before run returns
+    done.set()
+    display.run(stop=lambda: not any(dispatcher.is_alive() for dispatcher in dispatchers))
+    display.pump()
+
+    assert highgui["threads"] == {threading.get_ident()}
+    last = {}
+    for window, value in highgui["shown"]:
+        assert value >= last.get(window, -1)
+        last[window] = value
+    assert last == {f"device {index}": 49 for index in range(3)}
+    assert display.statistics["shown"] + display.statistics["replaced"] == 150
+
+
+def test_the_caller_may_reuse_the_buffer_after_show(highgui):
+    display = LocalDisplay()
+    image = np.zeros((2, 2), dtype=np.uint8)
+    display.show(window="monitor", image=image)
+    image[:] = 7
+    display.pump()
+    assert highgui["shown"] == [("monitor", 0)]
@@ -0,0 +1,125 @@
+import enum
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from node_helpers.mosaic import MosaicAssembler, frame_plane, frame_view
+
+
+class _Type(enum.Enum):
+    BGR888p = 8
+    BGR888i = 9
+    GRAY8 = 22
+    NV12 = 1
+
+
+class StandInFrame:
+    """The part of dai.ImgFrame the mosaic reads, built from an image in the layout of `frame_type`."""
+
+    def __init__(self, image: np.ndarray, frame_type: _Type):
+        self._image = image
+        self._type = frame_type
+        self._data = np.ascontiguousarray(image.transpose(2, 0, 1) if frame_type == _Type.BGR888p else image).reshape(-1)
+
+    def getWidth(self) -> int:
+        return self._image.shape[1]
+
+    def getHeight(self) -> int:
+        return self._image.shape[0]
+
+    def getType(self) -> _Type:
+        return self._type
+
+    def getData(self) -> np.ndarray:
+        return self._data
+
+    def getCvFrame(self) -> np.ndarray:
+        return self._image.copy()
+
+
+def _tile(value: int, shape=(4, 8, 3)) -> np.ndarray:
+    return np.arange(np.prod(shape), dtype=np.uint8).reshape(shape) + value
+
+
+@pytest.mark.parametrize("frame_type", [_Type.BGR888p, _Type.BGR888i])
+def test_frame_view_reads_the_frame_data_without_converting_it(frame_type):
+    image = _tile(0)
+    frame = StandInFrame(image, frame_type)
+    view = frame_view(frame)
+    assert np.array_equal(view, image)
+    assert np.shares_memory(view, frame.getData())
+
+
+def test_unknown_frame_types_fall_back_to_get_cv_frame():
+    image = _tile(0)
+    view = frame_view(StandInFrame(image, _Type.NV12))
+    assert np.array_equal(view, image)
+
+
+@pytest.mark.parametrize("channel", [0, 1, 2])
+def test_frame_plane_of_gray8_is_the_frame_data_whatever_the_channel(channel):
+    image = _tile(0, shape=(4, 8))
+    frame = StandInFrame(image, _Type.GRAY8)
+    plane = frame_plane(frame, channel=channel)
+    assert plane.shape == (4, 8)
+    assert np.array_equal(plane, image)
+    assert np.shares_memory(plane, frame.getData())
+
+
+@pytest.mark.parametrize("frame_type", [_Type.BGR888p, _Type.BGR888i])
+@pytest.mark.parametrize("channel", [0, 1, 2])
+def test_frame_plane_of_bgr_is_one_channel_without_a_copy(frame_type, channel):
+    image = _tile(0)
+    frame = StandInFrame(image, frame_type)
+    plane = frame_plane(frame, channel=channel)
+    assert np.array_equal(plane, image[:, :, channel])
+    assert np.shares_memory(plane, frame.getData())
+    # a plane of a planar frame is contiguous, zxing reads it as it is
+    assert plane.flags.c_contiguous == (frame_type == _Type.BGR888p)
+
+
+def test_gray8_frame_with_unexpected_data_size_falls_back_to_get_cv_frame():
+    image = _tile(0, shape=(4, 8))
+    frame = StandInFrame(image, _Type.GRAY8)
+    frame._data = frame._data[:-1]
+    plane = frame_plane(frame, channel=0)
+    assert np.array_equal(plane, image)
+    assert not np.shares_memory(plane, frame.getData())
+
+
+def test_gray8_crops_decode_like_the_blue_plane_of_bgr_crops():
+    zxingcpp = pytest.importorskip("zxingcpp")
+    from node_helpers.decode_ladder import decode_crop
+
+    code = np.asarray(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.QRCode, "pallet-42", quiet_zone=4), dtype=np.uint8)
+    code = np.kron(code, np.ones((3, 3), dtype=np.uint8))
+    gray = StandInFrame(code, _Type.GRAY8)
+    bgr = StandInFrame(np.repeat(code[:, :, None], 3, axis=2), _Type.BGR888p)
+    assert decode_crop(frame_plane(gray, channel=0)) == "pallet-42"
+    assert decode_crop(frame_plane(bgr, channel=0)) == "pallet-42"
+
+
+def test_tiles_are_placed_column_by_column_with_overlap():
+    rows, columns, overlap = 2, 3, 0.25
+    assembler = MosaicAssembler(rows=rows, columns=columns, overlap=overlap, pool_size=2)
+    tiles = [_tile(10 * index) for index in range(rows * columns)]
+    merged = assembler.assemble([StandInFrame(tile, _Type.BGR888p) for tile in tiles])
+
+    height, width = tiles[0].shape[:2]
+    step_x, step_y = width - int(width * overlap), height - int(height * overlap)
+    expected = np.zeros((height + (rows - 1) * step_y, width + (columns - 1) * step_x, 3), dtype=np.uint8)
+    for index, tile in enumerate(tiles):
+        column, row = divmod(index, rows)
+        expected[row * step_y: row * step_y + height, column * step_x: column * step_x + width] = tile
+    assert np.array_equal(merged, expected)
+
+
+def test_canvases_are_recycled_from_the_pool():
+    assembler = MosaicAssembler(rows=1, columns=2, overlap=0, pool_size=2)
+    frames = [StandInFrame(_tile(0), _Type.BGR888i), StandInFrame(_tile(1), _Type.BGR888i)]
+    merged = [assembler.assemble(frames) for _ in range(3)]
+    assert assembler.total_allocated_bytes == 2 * merged[0].nbytes
+    assert assembler.allocated_bytes_last_frame == 0
+    assert merged[2] is merged[0] and merged[1] is not merged[0]
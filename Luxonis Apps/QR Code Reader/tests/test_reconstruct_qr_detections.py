@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("depthai")  # importing app_pipeline builds the host nodes
+rh = pytest.importorskip("robothub")
+
+from app_pipeline import host_node
+
+TILES = 9
+CROP_SIZE, STEP = 600, 450  # 5312x6000 tiles, crop size - overlap
+
+
+class _Detection:
+    def __init__(self, box: tuple[float, float, float, float], label: int = 0):
+        self.xmin, self.ymin, self.xmax, self.ymax = box
+        self.confidence = 0.9
+        self.label = label
+
+
+class StandInDetections:
+    """The part of dai.ImgDetections ReconstructQrDetections reads."""
+
+    def __init__(self, sequence_number: int, tile: int = None, detections=(), data: bool = True):
+        self._sequence_number = sequence_number
+        self.detections = list(detections)
+        self._data = [tile] if data and tile is not None else []
+
+    def getSequenceNum(self) -> int:
+        return self._sequence_number
+
+    def getTimestamp(self) -> timedelta:
+        return timedelta(seconds=self._sequence_number)
+
+    def getData(self) -> list[int]:
+        return self._data
+
+
+class _Sink(host_node.BaseNode):
+    def __init__(self, input_node: host_node.BaseNode):
+        super().__init__()
+        input_node.set_callback(callback=self.receive)
+        self.received = []
+
+    def receive(self, message) -> None:
+        self.received.append(message)
+
+
+@pytest.fixture
+def reconstruct(monkeypatch):
+    configuration = {"tile_index_in_label": True, "resolution": "5312x6000", "high_res_crop_width": CROP_SIZE,
+                     "high_res_crop_height": CROP_SIZE, "merged_image_width": 1500, "merged_image_height": 1500}
+    for key, value in configuration.items():
+        monkeypatch.setitem(rh.CONFIGURATION, key, value)
+    source = host_node.BaseNode()
+    node = host_node.ReconstructQrDetections(input_node=source)
+    return source, node, _Sink(node)
+
+
+def _frame(sequence_number: int, boxes: dict[int, tuple[float, float, float, float]] = None, skip: int = None) -> list:
+    boxes = boxes or {}
+    return [StandInDetections(sequence_number, tile, [_Detection(boxes[tile], label=tile)] if tile in boxes else [])
+            for tile in range(TILES) if tile != skip]
+
+
+def test_the_messages_of_a_frame_are_grouped_and_placed_by_their_tile(reconstruct):
+    source, node, sink = reconstruct
+    for message in _frame(5, boxes={4: (0.25, 0.25, 0.5, 0.5), 6: (0.5, 0.25, 0.75, 0.5)}):
+        source.send_message(message)
+    assert [message.getSequenceNum() for message in sink.received] == [5]
+    # tile 4 is the middle one, tile 6 the top of the third column
+    assert sink.received[0].bounding_boxes.absolute.tolist() == [[STEP + 150, STEP + 150, STEP + 300, STEP + 300],
+                                                                 [2 * STEP + 300, 150, 2 * STEP + 450, 300]]
+    assert node.statistics == {"groups": 1, "incomplete": 0, "misaligned": 0, "late": 0, "extra": 0}
+
+
+def test_a_frame_missing_an_empty_message_is_dropped_and_the_next_one_resyncs(reconstruct):
+    source, node, sink = reconstruct
+    # tile 3 is lost, all messages of the frame are empty, tile 4 arrives as message 3
+    for message in _frame(5, skip=3) + _frame(6, boxes={1: (0.25, 0.25, 0.5, 0.5)}):
+        source.send_message(message)
+    assert [message.getSequenceNum() for message in sink.received] == [6]
+    assert sink.received[0].bounding_boxes.absolute.tolist() == [[150, STEP + 150, 300, STEP + 300]]
+    assert node.statistics == {"groups": 1, "incomplete": 1, "misaligned": 1, "late": 0, "extra": 0}
+
+
+def test_late_and_extra_messages_are_counted_and_ignored(reconstruct):
+    source, node, sink = reconstruct
+    messages = _frame(5) + [StandInDetections(5, 0)] + [StandInDetections(4, 0)] + _frame(6)
+    for message in messages:
+        source.send_message(message)
+    assert [message.getSequenceNum() for message in sink.received] == [5, 6]
+    assert node.statistics == {"groups": 2, "incomplete": 0, "misaligned": 0, "late": 1, "extra": 1}
+
+
+def test_recordings_without_the_tile_index_in_the_data_fall_back_to_the_labels(reconstruct):
+    source, node, sink = reconstruct
+    # tile 1 is lost, the label of tile 2 gives it away, the empty messages can only be counted
+    messages = [StandInDetections(5, tile, [_Detection((0.0, 0.0, 0.1, 0.1), label=tile)] if tile == 2 else [], data=False)
+                for tile in range(TILES) if tile != 1]
+    for message in messages + _frame(6):
+        source.send_message(message)
+    assert [message.getSequenceNum() for message in sink.received] == [6]
+    assert node.statistics["misaligned"] == 1 and node.statistics["incomplete"] == 1
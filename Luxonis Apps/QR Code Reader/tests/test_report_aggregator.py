@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from node_helpers.report_aggregator import BackgroundSender, ReportAggregator
+
+
+def test_codes_of_the_cooldown_are_coalesced_with_the_busiest_frame():
+    aggregator = ReportAggregator()
+    aggregator.add(new_labels=["a"], boxes=[((0, 0, 1, 1), "a", 0.9)], image=lambda: np.zeros((2, 2)), sequence_number=1)
+    busiest = np.ones((2, 2))
+    aggregator.add(new_labels=["b", "a"], boxes=[((0, 0, 1, 1), "a", 0.9), ((1, 1, 2, 2), "b", 0.8)], image=lambda: busiest,
+                   sequence_number=2)
+    report = aggregator.flush()
+    assert report.labels == ["a", "b"]
+    assert report.sequence_number == 2
+    assert np.array_equal(report.image, busiest) and report.image is not busiest
+    assert not aggregator.has_pending and aggregator.flush() is None
+    assert aggregator.statistics == {"reports": 1, "codes_coalesced": 2}
+
+
+def test_close_sends_the_queued_items():
+    release = threading.Event()
+    sent = []
+
+    def send(item):
+        release.wait()
+        sent.append(item)
+
+    sender = BackgroundSender(send=send, max_queued=1)
+    assert sender.submit(1)
+    # the thread may or may not have taken the first item yet, the queue fills up at the latest with the third one
+    results = [sender.submit(item) for item in (2, 3)]
+    assert not all(results)
+    release.set()
+    sender.close(timeout=5)
+    assert sent == [1] + [item for item, queued in zip((2, 3), results) if queued]
+    assert sender.statistics["sent"] == len(sent)
@@ -0,0 +1,45 @@
+from script_modules import load_script_module
+
+Synchronizer = load_script_module("app_pipeline/synchronization.py").Synchronizer
+
+
+def _synchronizer(capacity: int = 8) -> tuple[Synchronizer, list[dict]]:
+    synchronizer = Synchronizer(number_of_messages_per_sequence_number=2, capacity=capacity)
+    sent = []
+    synchronizer.add_callback(sent.append)
+    return synchronizer, sent
+
+
+def test_complete_group_is_sent_and_older_groups_are_evicted():
+    synchronizer, sent = _synchronizer()
+    synchronizer.add_message("a0", sequence_number=0, identifier="a")
+    synchronizer.add_message("a1", sequence_number=1, identifier="a")
+    synchronizer.add_message("b1", sequence_number=1, identifier="b")
+    assert sent == [{"a": "a1", "b": "b1", "sequence_number": 1}]
+    assert synchronizer.statistics["evicted_incomplete"] == {"a": 1}
+
+    synchronizer.add_message("b0", sequence_number=0, identifier="b")
+    synchronizer.add_message("b1", sequence_number=1, identifier="b")
+    assert synchronizer.statistics["late"] == {"b": 2}
+    assert len(sent) == 1
+
+
+def test_duplicate_replaces_the_previous_message():
+    synchronizer, sent = _synchronizer()
+    synchronizer.add_message("a0", sequence_number=0, identifier="a")
+    synchronizer.add_message("a0'", sequence_number=0, identifier="a")
+    synchronizer.add_message("b0", sequence_number=0, identifier="b")
+    assert synchronizer.statistics["duplicate"] == {"a": 1}
+    assert sent == [{"a": "a0'", "b": "b0", "sequence_number": 0}]
+
+
+def test_full_ring_evicts_the_oldest_groups():
+    synchronizer, sent = _synchronizer(capacity=4)
+    for sequence_number in range(6):
+        synchronizer.add_message(sequence_number, sequence_number=sequence_number, identifier="a")
+    # sequence number 4 didn't fit, the ring dropped everything up to 4 - 4 + 4 = 4
+    assert synchronizer.statistics["evicted_incomplete"] == {"a": 4}
+    synchronizer.add_message("b5", sequence_number=5, identifier="b")
+    assert sent == [{"a": 5, "b": "b5", "sequence_number": 5}]
+    synchronizer.add_message("b0", sequence_number=0, identifier="b")
+    assert synchronizer.statistics["late"] == {"b": 1}
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("depthai")
+pytest.importorskip("robothub")
+
+import robothub as rh
+
+from app_pipeline import host_node
+
+
+class _Detections:
+    def __init__(self, sequence_number: int, count: int):
+        self._sequence_number = sequence_number
+        self.detections = [None] * count
+
+    def getSequenceNum(self) -> int:
+        return self._sequence_number
+
+
+class _ControlQueue:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message) -> None:
+        self.sent.append(list(message.getData()))
+
+
+def test_detection_counts_of_a_frame_are_sent_once_complete(monkeypatch):
+    monkeypatch.setitem(rh.CONFIGURATION, "crop_count", 3)
+    detections = host_node.BaseNode()
+    control_queue = _ControlQueue()
+    host_node.TileHistoryFeedback(input_node=detections, control_queue=control_queue)
+
+    detections.send_message(_Detections(sequence_number=1, count=1))
+    detections.send_message(_Detections(sequence_number=1, count=0))
+    assert control_queue.sent == []
+    detections.send_message(_Detections(sequence_number=1, count=300))
+    assert control_queue.sent == [[1, 0, 255]]
+
+    # an incomplete frame is dropped when the next one starts
+    detections.send_message(_Detections(sequence_number=2, count=2))
+    for _ in range(3):
+        detections.send_message(_Detections(sequence_number=3, count=1))
+    assert control_queue.sent == [[1, 0, 255], [1, 1, 1]]
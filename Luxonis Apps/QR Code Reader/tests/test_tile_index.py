@@ -0,0 +1,45 @@
+from script_modules import load_script_module
+
+tile_index = load_script_module("app_pipeline/tile_index.py")
+
+
+class _Detection:
+    label = 0
+
+
+class StandInDetections:
+    """The part of dai.ImgDetections the Script nodes use."""
+
+    def __init__(self, sequence_number: int, detections=()):
+        self._sequence_number = sequence_number
+        self.detections = list(detections)
+        self.data = []
+
+    def getSequenceNum(self) -> int:
+        return self._sequence_number
+
+    def setSequenceNum(self, sequence_number: int) -> None:
+        self._sequence_number = sequence_number
+
+    def setData(self, data) -> None:
+        self.data = list(data)
+
+
+def test_detections_are_matched_to_their_tile_and_get_the_frame_sequence_number_back():
+    for index in range(9):
+        detections = StandInDetections(tile_index.tile_sequence_number(1234, index))
+        assert tile_index.restore_sequence_number(detections, 1234) == index
+        assert detections.getSequenceNum() == 1234
+
+
+def test_detections_of_another_frame_are_not_matched():
+    detections = StandInDetections(tile_index.tile_sequence_number(1233, 8))
+    assert tile_index.restore_sequence_number(detections, 1234) is None
+    assert detections.getSequenceNum() == tile_index.tile_sequence_number(1233, 8)
+
+
+def test_every_message_carries_its_tile_index_also_without_detections():
+    empty = tile_index.stamp_tile_index(StandInDetections(7), 5)
+    assert empty.data == [5]
+    stamped = tile_index.stamp_tile_index(StandInDetections(7, [_Detection(), _Detection()]), 3)
+    assert stamped.data == [3] and [detection.label for detection in stamped.detections] == [3, 3]
@@ -0,0 +1,57 @@
+from script_modules import load_script_module
+
+tile_scheduler = load_script_module("app_pipeline/tile_scheduler.py")
+
+
+def _schedules(scheduler, frames: int) -> list[list[bool]]:
+    return [scheduler.schedule() for _ in range(frames)]
+
+
+def test_every_tile_is_scanned_until_the_hold_ends():
+    scheduler = tile_scheduler.TileScheduler(tile_count=9, scan_interval=3, hold_frames=2)
+    assert _schedules(scheduler, frames=2) == [[True] * 9] * 2
+
+
+def test_empty_tiles_back_off_and_are_staggered():
+    scheduler = tile_scheduler.TileScheduler(tile_count=9, scan_interval=3, hold_frames=1)
+    scheduler.schedule()
+    for frame in _schedules(scheduler, frames=6):
+        # a third of the empty tiles per frame, so the inference load stays even
+        assert sum(frame) == 3
+
+
+def test_empty_tiles_are_rescanned_every_interval():
+    scheduler = tile_scheduler.TileScheduler(tile_count=9, scan_interval=4, hold_frames=1)
+    scheduler.schedule()
+    frames = _schedules(scheduler, frames=12)
+    for tile_index in range(9):
+        scanned_in = [frame_index for frame_index, frame in enumerate(frames) if frame[tile_index]]
+        assert len(scanned_in) == 3
+        assert all(later - earlier == 4 for earlier, later in zip(scanned_in, scanned_in[1:]))
+
+
+def test_detection_feedback_keeps_a_tile_active():
+    scheduler = tile_scheduler.TileScheduler(tile_count=4, scan_interval=5, hold_frames=3)
+    _schedules(scheduler, frames=3)
+    scheduler.update([0, 2, 0, 0])
+    # held for frames 3 to 5, then back to every 5th frame, which is frame 9 for tile 1
+    frames = _schedules(scheduler, frames=7)
+    assert [frame[1] for frame in frames] == [True, True, True, False, False, False, True]
+    # the counts of more tiles than the scheduler has are ignored
+    scheduler.update([0, 0, 0, 0, 1, 1])
+    assert len(scheduler.schedule()) == 4
+
+
+def test_report_estimates_the_saved_inference_time():
+    now = [0.0]
+    scheduler = tile_scheduler.TileScheduler(tile_count=4, scan_interval=2, hold_frames=0, clock=lambda: now[0],
+                                             report_every_seconds=10)
+    assert scheduler.report() is None
+    scanned = scheduler.schedule()
+    scheduler.record_inference(seconds=0.2, scanned_tiles=sum(scanned))
+    now[0] = 10.0
+    report = scheduler.report()
+    assert "2 of 4 tiles skipped" in report
+    # 0.1 s per scanned tile, 2 skipped tiles in 10 s
+    assert "~20 ms" in report
+    assert scheduler.report() is None
@@ -0,0 +1,48 @@
+"""Try the decode ladder rungs on the QR code crops of a recording, no OAK needed.
+
+Every rung is run on every crop on its own, then the given ladder is replayed, e.g.:
+
+    python tune_decode_ladder.py recordings/20240101_120000 --ladder raw sharpen upscale
+"""
+import argparse
+import logging as log
+import time
+
+from app_pipeline.host_node import QrCodeDecoder
+from node_helpers import RUNGS, DecodeLadder, StreamReader, decode_crop, frame_plane
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="directory written by the record_streams option")
+    parser.add_argument("--ladder", nargs="+", choices=list(RUNGS), default=list(RUNGS), help="rungs in the order they are tried")
+    parser.add_argument("--crop-budget-ms", type=float, default=50, help="CPU time budget per crop")
+    args = parser.parse_args()
+
+    reader = StreamReader(directory=args.recording, name="qr_crops")
+    crops = [frame_plane(message, channel=QrCodeDecoder.DECODE_CHANNEL) for _, message in reader]
+    reader.close()
+    log.info(f"{len(crops)} QR code crops in {args.recording}")
+
+    decoded_by = {rung: set() for rung in RUNGS}
+    for rung, preprocess in RUNGS.items():
+        start = time.thread_time()
+        for i, crop in enumerate(crops):
+            if decode_crop(preprocess(crop)) is not None:
+                decoded_by[rung].add(i)
+        cpu_ms = (time.thread_time() - start) * 1000 / max(len(crops), 1)
+        log.info(f"{rung:>9}: {len(decoded_by[rung])}/{len(crops)} decoded, {cpu_ms:.2f} ms CPU per crop")
+    for rung in RUNGS:
+        only_this_rung = decoded_by[rung] - set().union(*(decoded for other, decoded in decoded_by.items() if other != rung))
+        log.info(f"{rung:>9}: {len(only_this_rung)} crops decoded by no other rung")
+
+    ladder = DecodeLadder(rungs=args.ladder, crop_budget_seconds=args.crop_budget_ms / 1000)
+    start = time.thread_time()
+    for crop in crops:
+        ladder.record(ladder.decode(crop))
+    cpu_ms = (time.thread_time() - start) * 1000 / max(len(crops), 1)
+    log.info(f"Ladder {' -> '.join(args.ladder)}: {ladder.statistics}, {cpu_ms:.2f} ms CPU per crop")
+
+
+if __name__ == "__main__":
+    main()
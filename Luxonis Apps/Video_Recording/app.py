@@ -1,4 +1,5 @@
 import logging as log
+import os
 
 import depthai as dai
 import robothub as rh
@@ -11,6 +12,7 @@ class Application(rh.BaseDepthAIApplication):
     on_demand_video_switch: host_node.Switch
     video_5_min_switch: host_node.Switch
     video_buffer_5_minutes: host_node.VideoBuffer
+    on_demand_video: host_node.VideoBuffer
     image_event: host_node.ImageEvent
     monitor: host_node.Monitor
     rgb_control: dai.DataInputQueue
@@ -35,6 +37,10 @@ class Application(rh.BaseDepthAIApplication):
         log.info(f"{device.getMxId()} creating output queues...")
         h264_node = host_node.Bridge(device=device, out_name="main_h264", blocking=True)
         mjpeg_node = host_node.Bridge(device=device, out_name="main_mjpeg", blocking=True)
+        # before the switches, every packet is stored once and the video buffers read it from there
+        segment_directory = "video_segments" if rh.LOCAL_DEV else os.path.join(rh.STORAGE_DIR, "video_segments")
+        shared_video_buffer = host_node.SharedVideoBuffer(input_node=h264_node, capacity_mb=rh.CONFIGURATION["video_buffer_max_mb"],
+                                                          disk_mb=rh.CONFIGURATION["video_buffer_disk_mb"], segment_directory=segment_directory)
 
         self.video_5_min_switch = host_node.Switch(input_node=h264_node, name="video_5_min_switch")
         self.on_demand_video_switch = host_node.Switch(input_node=h264_node, name="on_demand_video_switch")
@@ -42,9 +48,12 @@ class Application(rh.BaseDepthAIApplication):
         self.image_event_switch = host_node.Switch(input_node=mjpeg_node, name="image_event_switch")
 
         # self.video_recording = host_node.VideoRecording(input_node=h264_node)
-        on_demand_video = host_node.VideoBuffer(input_node=self.on_demand_video_switch, buffer_size_minutes=5)
-        self.video_buffer_5_minutes = host_node.VideoBuffer(input_node=self.video_5_min_switch, buffer_size_minutes=5)
-        configurable_video_buffer = host_node.VideoBuffer(input_node=configurable_buffer_switch,
+        self.on_demand_video = host_node.VideoBuffer(input_node=self.on_demand_video_switch, shared_buffer=shared_video_buffer,
+                                                     name="on_demand_video", buffer_size_minutes=5)
+        self.video_buffer_5_minutes = host_node.VideoBuffer(input_node=self.video_5_min_switch, shared_buffer=shared_video_buffer,
+                                                            name="video_buffer_5_minutes", buffer_size_minutes=5)
+        configurable_video_buffer = host_node.VideoBuffer(input_node=configurable_buffer_switch, shared_buffer=shared_video_buffer,
+                                                          name="configurable_video_buffer",
                                                           buffer_size_minutes=rh.CONFIGURATION["video_buffer_size_minutes"])
 
         regular_video_event = host_node.RegularEvent(input_node=configurable_video_buffer, name="regular_video_event",
@@ -53,7 +62,7 @@ class Application(rh.BaseDepthAIApplication):
                                                      frequency_seconds=rh.CONFIGURATION["image_event_frequency_minutes"] * 60)
 
         host_node.VideoEvent(input_node=self.video_buffer_5_minutes)
-        host_node.VideoEvent(input_node=on_demand_video)
+        host_node.VideoEvent(input_node=self.on_demand_video)
 
         host_node.VideoEvent(input_node=regular_video_event)
         host_node.ImageEvent(input_node=regular_image_event)
@@ -68,7 +77,7 @@ class Application(rh.BaseDepthAIApplication):
         self.rgb_control = device.getInputQueue(name="rgb_control")
 
         log.info(f"{device.getMxId()} Application started")
-        host_node.Bridge.run(device_stop_event=self._device_stop_event)
+        host_node.Bridge.run(device_stop_event=self._device_stop_event, event_driven=True)
 
     def on_fe_notification(self, session_id, unique_key, payload):
         log.info(f"{payload = } {unique_key=}")
@@ -77,6 +86,7 @@ class Application(rh.BaseDepthAIApplication):
             self.monitor.toggle_recording_on()
         elif unique_key == 'recording_stop':
             self.on_demand_video_switch.switch_off()
+            self.on_demand_video.clear_buffers()
             self.monitor.toggle_recording_off()
         elif unique_key == 'send_video_buffer':
             self.video_5_min_switch.flick_switch()
@@ -89,8 +99,9 @@ class Application(rh.BaseDepthAIApplication):
 
     def on_configuration_changed(self, configuration_changes: dict) -> None:
         log.info(f"CONFIGURATION CHANGES: {configuration_changes}")
-        require_restart = ["fps", "resolution", "video_buffer_size_minutes", "video_event_frequency_minutes", "image_event_frequency_minutes",
-                           "auto_exposure_limit", "flip_camera"]
+        require_restart = ["fps", "resolution", "video_buffer_size_minutes", "video_buffer_max_mb", "video_buffer_disk_mb",
+                           "video_event_frequency_minutes",
+                           "image_event_frequency_minutes", "auto_exposure_limit", "flip_camera"]
         for key in require_restart:
             if key in configuration_changes:
                 log.info(f"{key} change needs a new pipeline. Restarting OAK device...")
@@ -1,4 +1,5 @@
 import logging as log
+import queue
 import threading
 import time
 
@@ -8,16 +9,47 @@ from app_pipeline import host_node
 
 
 class Bridge(host_node.BaseNode):
+    """
+    Pass messages from a device output queue to the host nodes.
+
+    `run` either polls all bridges in a loop, or with `event_driven=True` it starts one reader thread per output queue.
+    The reader threads block on their queue and hand the messages over to the calling thread, which runs all host node
+    callbacks one at a time in arrival order - callbacks never run concurrently, just like in the polling loop.
+    A reader keeps at most `queue_size` messages waiting for the dispatcher, when the host falls behind the messages pile
+    up in the device queue, which blocks or drops them as before.
+    """
     __bridges: list = []
+    REPORT_EVERY_SECONDS = 60
 
     def __init__(self, device: dai.Device, out_name: str, blocking: bool = True, queue_size: int = 2):
         super().__init__()
+        self.name = out_name
         self._out_queue = device.getOutputQueue(name=out_name, maxSize=queue_size, blocking=blocking)
         self._get_depthai_message = self._out_queue.get if blocking else self._out_queue.tryGet
+        self._in_flight = threading.Semaphore(queue_size)
         self.__bridges.append(self)
 
+        # every counter has a single writer, the reader thread or the dispatcher, so no lock is needed
+        self.wakeups = 0  # messages read by the reader thread, written by the reader only
+        self._handed_over = 0  # written by the reader only
+        self._dispatched = 0  # written by the dispatcher only
+        self._wakeups_reported = 0  # written by the dispatcher only
+        self.max_queue_depth = 0  # written by the dispatcher only
+
+    @property
+    def queue_depth(self) -> int:
+        """Messages waiting in the dispatch queue."""
+        return self._handed_over - self._dispatched
+
     @classmethod
-    def run(cls, device_stop_event: threading.Event):
+    def run(cls, device_stop_event: threading.Event, event_driven: bool = False):
+        if event_driven:
+            cls._run_event_driven(device_stop_event=device_stop_event)
+        else:
+            cls._run_polling(device_stop_event=device_stop_event)
+
+    @classmethod
+    def _run_polling(cls, device_stop_event: threading.Event):
         while rh.app_is_running() and not device_stop_event.is_set():
             for bridge in cls.__bridges:
                 try:
@@ -29,7 +61,68 @@ class Bridge(host_node.BaseNode):
                     break
             time.sleep(0.001)
 
+    @classmethod
+    def _run_event_driven(cls, device_stop_event: threading.Event):
+        bridges = list(cls.__bridges)
+        dispatch_queue = queue.Queue()  # bounded by the in flight limit of every bridge
+        for bridge in bridges:
+            threading.Thread(target=bridge._read, args=(dispatch_queue, device_stop_event), name=f"bridge_{bridge.name}", daemon=True).start()
+
+        idle_seconds = 0.
+        last_report = time.monotonic()
+        while rh.app_is_running() and not device_stop_event.is_set():
+            wait_start = time.monotonic()
+            try:
+                bridge, message = dispatch_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            finally:
+                idle_seconds += time.monotonic() - wait_start
+            bridge.max_queue_depth = max(bridge.max_queue_depth, bridge.queue_depth)
+            bridge._dispatched += 1
+            bridge._in_flight.release()
+            if isinstance(message, RuntimeError):
+                log.error(f'Bridge {bridge.name} read failed with error: {message}')
+                device_stop_event.set()
+                cls.__bridges.clear()
+                break
+            bridge.send_message(message)
+
+            if time.monotonic() - last_report > cls.REPORT_EVERY_SECONDS:
+                cls._report(bridges=bridges, idle_seconds=idle_seconds, elapsed_seconds=time.monotonic() - last_report)
+                idle_seconds = 0.
+                last_report = time.monotonic()
+
+    @staticmethod
+    def _report(bridges: list["Bridge"], idle_seconds: float, elapsed_seconds: float):
+        queues = ", ".join(f"{bridge.name}: {(bridge.wakeups - bridge._wakeups_reported) / elapsed_seconds:.1f} wakeups/s, "
+                           f"max depth {bridge.max_queue_depth}"
+                           for bridge in bridges)
+        log.info(f"Bridge dispatcher idle {idle_seconds / elapsed_seconds:.0%} of the time, {queues}")
+        for bridge in bridges:
+            bridge._wakeups_reported = bridge.wakeups
+            bridge.max_queue_depth = bridge.queue_depth
+
     def _poll(self):
         message = self._get_depthai_message()
         if message is not None:
             self.send_message(message)
+
+    def _read(self, dispatch_queue: queue.Queue, device_stop_event: threading.Event):
+        while not device_stop_event.is_set():
+            if not self._in_flight.acquire(timeout=0.1):
+                continue
+            try:
+                message = self._out_queue.get()
+            except RuntimeError as e:
+                # the queue is closed together with the device
+                if not device_stop_event.is_set():
+                    self._hand_over(dispatch_queue=dispatch_queue, message=e)
+                return
+            self.wakeups += 1
+            self._hand_over(dispatch_queue=dispatch_queue, message=message)
+
+    def _hand_over(self, dispatch_queue: queue.Queue, message):
+        # count the message before it's visible to the dispatcher, so the depth never goes negative
+        self._handed_over += 1
+        dispatch_queue.put((self, message))
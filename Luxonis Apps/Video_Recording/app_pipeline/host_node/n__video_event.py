@@ -1,54 +1,112 @@
 import av
+import concurrent.futures
 import io
 import logging as log
+import os
+import tempfile
+import threading
 import time
+from dataclasses import dataclass
 from typing import Optional
 
-import depthai as dai
 import robothub as rh
 from app_pipeline import host_node
 from app_pipeline.messages import VideoBufferMessage
+from node_helpers.video_reader import ClipOverrun, ViewReader, rss_bytes
+from node_helpers.video_ring import VideoRingView
+
+
+@dataclass(slots=True, kw_only=True)
+class MuxResult:
+    path: str  # temporary MP4 file, deleted once the event is sent
+    size_bytes: int
+    packets: int
+    mux_seconds: float
+    peak_rss_growth_bytes: int  # of the whole process while the clip was muxed
 
 
 class VideoEvent(host_node.BaseNode):
+    """
+    Send the clips of a video buffer as MP4 video events.
+
+    Muxing runs on a pool of MUX_WORKERS threads shared by all VideoEvents, the Bridge thread only submits the clip. At most
+    MAX_PENDING_CLIPS clips wait or run at once, further clips are dropped. Every clip goes to a temporary file, its mux
+    duration and the growth of the process RSS while it was muxed are logged.
+    """
+    MUX_WORKERS = 2
+    MAX_PENDING_CLIPS = 4
+    _mux_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    _pending_clips = threading.BoundedSemaphore(MAX_PENDING_CLIPS)
 
     def __init__(self, input_node: host_node.BaseNode):
         super().__init__()
         input_node.set_callback(callback=self.__callback)
+        if VideoEvent._mux_pool is None:
+            VideoEvent._mux_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.MUX_WORKERS, thread_name_prefix="mp4_mux")
 
     def __callback(self, message: VideoBufferMessage) -> None:
-        video_bytes = self.save_video(data=message.buffer.data)
-        if video_bytes is None:
-            return
-        rh.send_video_event(video=video_bytes.getvalue(), title="video")
+        future = self.save_video(view=message.buffer)
+        if future is not None:
+            future.add_done_callback(self._send_video)
 
-    def save_video(self, data: list[dai.ImgFrame]) -> Optional[io.BytesIO]:
-        print(f"Saving video...")
-        length = len(data)
+    def save_video(self, view: VideoRingView) -> Optional[concurrent.futures.Future]:
+        """Submit the clip for muxing, the future gives a MuxResult. None when the clip is too short or too many clips are pending."""
+        length = len(view)
         minimum_length = rh.CONFIGURATION["fps"] * 2
         if length < minimum_length:
             log.error(f"Video buffer is too short: {length / rh.CONFIGURATION['fps']} seconds. Minimum length: 2 seconds")
             return None
+        if not self._pending_clips.acquire(blocking=False):
+            log.error(f"{self.MAX_PENDING_CLIPS} video clips are being muxed already, dropping a clip of {length} packets")
+            return None
+        try:
+            future = self._mux_pool.submit(self._mux, view)
+        except RuntimeError:
+            self._pending_clips.release()
+            raise
+        future.add_done_callback(lambda _: self._pending_clips.release())
+        return future
 
+    @staticmethod
+    def _mux(view: VideoRingView) -> MuxResult:
+        print(f"Saving video...")
         save_start = time.monotonic()
-        input_file = io.BytesIO(b"".join([frame.getCvFrame() for frame in data]))
-        mp4_file = io.BytesIO()
-
-        with av.open(mp4_file, "w", format="mp4") as output_container, av.open(input_file, "r", format="h264") as input_container:
-            input_stream = input_container.streams[0]
-            output_stream = output_container.add_stream(template=input_stream, rate=rh.CONFIGURATION["fps"])
-
-            frame_time = (1 / rh.CONFIGURATION["fps"]) * input_stream.time_base.denominator
-            for i, packet in enumerate(input_container.demux(input_stream)):
-                packet.dts = i * frame_time
-                packet.pts = i * frame_time
-                packet.stream = output_stream
-                output_container.mux_one(packet)
-        log.info(f"Video saved, size: {len(mp4_file.getvalue()) / 1024 / 1024:.1f} MB took {time.monotonic() - save_start:.2f} seconds")
-
-        mp4_file.flush()
-        mp4_file.seek(0)
-        return mp4_file
-
+        rss_start = rss_bytes()
+        reader = ViewReader(view)
+        file_descriptor, path = tempfile.mkstemp(prefix="video_event_", suffix=".mp4")
+        os.close(file_descriptor)
+        try:
+            with av.open(path, "w", format="mp4") as output_container, \
+                    av.open(io.BufferedReader(reader, buffer_size=2 ** 20), "r", format="h264") as input_container:
+                input_stream = input_container.streams[0]
+                output_stream = output_container.add_stream(template=input_stream, rate=rh.CONFIGURATION["fps"])
 
+                frame_time = (1 / rh.CONFIGURATION["fps"]) * input_stream.time_base.denominator
+                for i, packet in enumerate(input_container.demux(input_stream)):
+                    packet.dts = i * frame_time
+                    packet.pts = i * frame_time
+                    packet.stream = output_stream
+                    output_container.mux_one(packet)
+        except BaseException:
+            os.remove(path)
+            raise
+        result = MuxResult(path=path, size_bytes=os.path.getsize(path), packets=len(view), mux_seconds=time.monotonic() - save_start,
+                           peak_rss_growth_bytes=max(reader.peak_rss_bytes, rss_bytes()) - rss_start)
+        log.info(f"Video saved, size: {result.size_bytes / 1024 / 1024:.1f} MB, {result.packets} packets, took {result.mux_seconds:.2f} seconds, "
+                 f"peak RSS growth {result.peak_rss_growth_bytes / 1024 / 1024:.1f} MB")
+        return result
 
+    @staticmethod
+    def _send_video(future: concurrent.futures.Future) -> None:
+        try:
+            result: MuxResult = future.result()
+        except ClipOverrun as e:
+            log.error(f"Video clip dropped: {e}")
+            return
+        except Exception as e:
+            log.error(f"Muxing a video clip failed: {e!r}")
+            return
+        try:
+            rh.send_video_event(video=result.path, title="video")
+        finally:
+            os.remove(result.path)
@@ -1,45 +1,76 @@
 import logging as log
-from collections import deque
+import time
 
 import depthai as dai
-import robothub as rh
 from app_pipeline import host_node
 from app_pipeline.controlls import Control
 from app_pipeline.messages import ControlMessage, VideoBufferMessage
-from node_helpers import common
+from node_helpers.h264 import is_idr
+from node_helpers.video_ring import VideoRing
+from node_helpers.video_segments import SegmentStore
+
+
+class SharedVideoBuffer(host_node.BaseNode):
+    """
+    Store the payload of every H.264 packet of the stream once, for all VideoBuffers reading it.
+
+    The ring is bounded by `capacity_mb` and by the longest buffer of the VideoBuffers. With `disk_mb` > 0 the packets
+    which don't fit into memory go to segment files in `segment_directory`, up to `disk_mb`. Has to be connected to the
+    stream before the Switches of the VideoBuffers, so the packet is in the ring when they get it. IDR frames are marked
+    as keyframes, clips start at the one preceding them.
+    """
+    REPORT_EVERY_SECONDS = 60
+
+    def __init__(self, input_node: host_node.BaseNode, capacity_mb: int, disk_mb: int = 0, segment_directory: str = "video_segments"):
+        super().__init__()
+        input_node.set_callback(callback=self.__callback)
+        spill = SegmentStore(directory=segment_directory, max_bytes=disk_mb * 2 ** 20) if disk_mb > 0 else None
+        self.ring = VideoRing(capacity_bytes=capacity_mb * 2 ** 20, spill=spill)
+        self._last_report = time.monotonic()
+
+    def __callback(self, h264_frame: dai.ImgFrame) -> None:
+        timestamp = h264_frame.getTimestamp()
+        timestamp_ns = (timestamp.days * 86_400 + timestamp.seconds) * 1_000_000_000 + timestamp.microseconds * 1000
+        payload = h264_frame.getData()
+        self.ring.append(payload, sequence_number=h264_frame.getSequenceNum(), timestamp_ns=timestamp_ns, is_keyframe=is_idr(payload))
+        now = time.monotonic()
+        if now - self._last_report > self.REPORT_EVERY_SECONDS:
+            self.ring.report()
+            self._last_report = now
 
 
 class VideoBuffer(host_node.BaseNode):
+    """
+    The last `buffer_size_minutes` of the packets a Switch let through, read from a SharedVideoBuffer.
 
-    def __init__(self, input_node: host_node.BaseNode, buffer_size_minutes: int = 5):
+    The window starts with the keyframe preceding the start or `clear_buffers`, a TURN_OFF message sends a view of it -
+    the packets themselves are not copied.
+    """
+
+    def __init__(self, input_node: host_node.BaseNode, shared_buffer: SharedVideoBuffer, name: str, buffer_size_minutes: int = 5):
         super().__init__()
         input_node.set_callback(callback=self.__callback)
-        self.maxlen = rh.CONFIGURATION["fps"] * 60 * buffer_size_minutes
-        log.info(f"Video Buffer length: {self.maxlen}")
-        self._buffer = deque(maxlen=self.maxlen)
-        self._timestamp_buffer = deque(maxlen=self.maxlen)
+        self.max_seconds = 60 * buffer_size_minutes
+        log.info(f"Video Buffer {name} length: {self.max_seconds} seconds")
+        self._ring = shared_buffer.ring
+        self._consumer = self._ring.register(name=name, max_seconds=self.max_seconds)
         self._clear_buffers = False
 
     def __callback(self, message: ControlMessage) -> None:
         h264_frame: dai.ImgFrame = message.message
         if message.control == Control.TURN_ON:
-            self.add_to_buffer(h264_frame)
+            self._ring.start(self._consumer)
         elif message.control == Control.TURN_OFF:
-            self.add_to_buffer(h264_frame)
-            buffer = common.TimestampedData(timestamps=list(self._timestamp_buffer), data=list(self._buffer))
-            message = VideoBufferMessage(sequence_number=buffer.data[-1].getSequenceNum(), buffer=buffer)
+            self._ring.start(self._consumer)
+            buffer = self._ring.window(self._consumer)
+            message = VideoBufferMessage(sequence_number=h264_frame.getSequenceNum(), buffer=buffer)
             self.send_message(message=message)
         if self._clear_buffers:
             self.__clear_buffers()
 
-    def add_to_buffer(self, h264_frame: dai.ImgFrame) -> None:
-        self._buffer.append(h264_frame)
-        self._timestamp_buffer.append(common.Timestamp())
-
     def clear_buffers(self) -> None:
         self._clear_buffers = True
 
     def __clear_buffers(self):
-        self._buffer.clear()
-        self._timestamp_buffer.clear()
+        self._ring.reset(self._consumer)
         self._clear_buffers = False
@@ -4,7 +4,7 @@ from typing import Optional, Union
 
 import depthai as dai
 import robothub as rh
-from node_helpers.common import TimestampedData
+from node_helpers.video_ring import VideoRingView
 from app_pipeline.controlls import Control
 
 
@@ -34,4 +34,4 @@ class ControlMessage:
 
 @dataclass(slots=True, kw_only=True)
 class VideoBufferMessage(Message):
-    buffer: TimestampedData
+    buffer: VideoRingView
@@ -0,0 +1,107 @@
+"""Compare clip extraction from the in-memory video ring with the ring spilling to disk, on a synthetic packet stream.
+
+Run from the app directory, e.g.:
+
+    python benchmark_video_ring.py --bitrate-mbps 20 --fps 30 --minutes 5 --memory-mb 128 --clip-seconds 60
+
+Clips are read through the ViewReader the muxer reads them with, in chunks of the muxer's read buffer. The first read of
+every clip is cold: the segment files are synced and evicted from the page cache before it, so it reads the disk. The
+repeats are warm.
+"""
+import argparse
+import logging as log
+import os
+import tempfile
+import time
+
+from node_helpers.video_reader import ViewReader
+from node_helpers.video_ring import VideoRing, VideoRingView
+from node_helpers.video_segments import SegmentStore
+
+_NS_PER_SECOND = 1_000_000_000
+READ_BUFFER_BYTES = 2 ** 20  # the BufferedReader the muxer reads the clip through
+
+
+def fill(ring: VideoRing, seconds: float, fps: int, bitrate_mbps: float) -> float:
+    """Append `seconds` of packets, a keyframe 5x the size of the other frames every second. Returns the append time."""
+    frame_bytes = int(bitrate_mbps * 1e6 / 8 / (fps + 4))
+    payload = memoryview(os.urandom(5 * frame_bytes))
+    start = time.perf_counter()
+    for i in range(int(seconds * fps)):
+        is_keyframe = i % fps == 0
+        ring.append(payload[: 5 * frame_bytes if is_keyframe else frame_bytes], sequence_number=i,
+                    timestamp_ns=i * _NS_PER_SECOND // fps, is_keyframe=is_keyframe)
+    return time.perf_counter() - start
+
+
+def extract(ring: VideoRing, start_ns: int, end_ns: int, buffer: bytearray) -> tuple[float, float, int]:
+    """Read the clip through a ViewReader into `buffer`, chunk by chunk the way the muxer reads it.
+    Returns the seconds until the first payload, the seconds for the whole clip and the clip size."""
+    view = VideoRingView(ring=ring, start=ring.index_at(start_ns), end=ring.index_at(end_ns))
+    reader = ViewReader(view)
+    start = time.perf_counter()
+    size = reader.readinto(buffer)
+    first_payload = time.perf_counter() - start
+    while length := reader.readinto(buffer):
+        size += length
+    return first_payload, time.perf_counter() - start, size
+
+
+def evict_page_cache(directory: str) -> bool:
+    """Write the segment files through to the disk and drop their pages from the page cache. False where that isn't possible."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for name in os.listdir(directory):
+        file_descriptor = os.open(os.path.join(directory, name), os.O_RDONLY)
+        try:
+            os.fsync(file_descriptor)
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(file_descriptor)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bitrate-mbps", type=float, default=20)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--minutes", type=float, default=5, help="length of the stream, all of it is kept")
+    parser.add_argument("--memory-mb", type=int, default=128, help="memory tier of the spilling ring")
+    parser.add_argument("--clip-seconds", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    log.basicConfig(level=log.INFO, format="%(message)s")
+
+    seconds = args.minutes * 60
+    stream_bytes = int(seconds * args.bitrate_mbps * 1e6 / 8 * 1.2)
+    buffer = bytearray(READ_BUFFER_BYTES)
+    with tempfile.TemporaryDirectory() as directory:
+        segment_directory = os.path.join(directory, "segments")
+        rings = {
+            "memory": VideoRing(capacity_bytes=stream_bytes),
+            "disk": VideoRing(capacity_bytes=args.memory_mb * 2 ** 20,
+                              spill=SegmentStore(directory=segment_directory, max_bytes=stream_bytes)),
+        }
+        for name, ring in rings.items():
+            ring.register(name="benchmark", max_seconds=seconds)
+            append_seconds = fill(ring=ring, seconds=seconds, fps=args.fps, bitrate_mbps=args.bitrate_mbps)
+            log.info(f"{name}: appended {len(ring)} packets, {ring.nbytes / 2 ** 20:.0f} MB in {append_seconds:.2f} s "
+                     f"({ring.nbytes / 2 ** 20 / append_seconds:.0f} MB/s), {ring.memory_bytes / 2 ** 20:.0f} MB in memory")
+            clip_ns = int(args.clip_seconds * _NS_PER_SECOND)
+            # the oldest clip comes from disk when the ring spills, the newest one from memory
+            for clip_name, start_ns in (("oldest", 0), ("newest", int(seconds * _NS_PER_SECOND) - clip_ns)):
+                if name == "disk" and not evict_page_cache(segment_directory):
+                    log.warning("Can't evict the segment files from the page cache, the cold read is warm")
+                cold = extract(ring=ring, start_ns=start_ns, end_ns=start_ns + clip_ns, buffer=buffer)
+                warm = [extract(ring=ring, start_ns=start_ns, end_ns=start_ns + clip_ns, buffer=buffer) for _ in range(args.repeat)]
+                for run, results in (("cold", [cold]), ("warm", warm)):
+                    first = min(result[0] for result in results)
+                    total = min(result[1] for result in results)
+                    size = results[0][2]
+                    log.info(f"{name} {clip_name} {args.clip_seconds:.0f} s clip, {run}: {size / 2 ** 20:.0f} MB, "
+                             f"first packet after {first * 1000:.2f} ms, whole clip {total * 1000:.0f} ms "
+                             f"({size / 2 ** 20 / max(total, 1e-9):.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
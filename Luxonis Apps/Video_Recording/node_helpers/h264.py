@@ -0,0 +1,28 @@
+NAL_SLICE = 1
+NAL_IDR_SLICE = 5
+# SPS, PPS and SEI come before the first slice and are short, a longer search is only a fallback
+_SCAN_BYTES = 4096
+
+
+def is_idr(payload) -> bool:
+    """
+    Whether an Annex B access unit is an IDR frame, decided by the type of its first slice NAL unit.
+
+    Only the start codes are searched for, nothing is decoded, so it is cheap enough for every packet.
+    """
+    payload = memoryview(payload).cast("B")
+    nal_type = _first_slice_type(bytes(payload[:_SCAN_BYTES]))
+    if nal_type is None and payload.nbytes > _SCAN_BYTES:
+        nal_type = _first_slice_type(bytes(payload))
+    return nal_type == NAL_IDR_SLICE
+
+
+def _first_slice_type(data: bytes):
+    # a 4 byte start code ends with the 3 byte one, searching for the latter finds both
+    position = data.find(b"\x00\x00\x01")
+    while position != -1 and position + 3 < len(data):
+        nal_type = data[position + 3] & 0x1F
+        if nal_type in (NAL_SLICE, NAL_IDR_SLICE):
+            return nal_type
+        position = data.find(b"\x00\x00\x01", position + 3)
+    return None
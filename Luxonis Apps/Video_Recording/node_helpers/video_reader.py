@@ -0,0 +1,53 @@
+import io
+import os
+import resource
+
+from node_helpers.video_ring import VideoRingView
+
+
+class ClipOverrun(Exception):
+    """The ring dropped packets of the clip before they were muxed."""
+
+
+class ViewReader(io.RawIOBase):
+    """
+    The payloads of a view as one readable H.264 stream, nothing is joined.
+
+    Reads run on a muxing thread while the Bridge thread keeps appending to the ring, a packet the ring dropped before it
+    was copied out raises ClipOverrun. The peak RSS of the process while the view is read is sampled every 64 packets.
+    """
+
+    def __init__(self, view: VideoRingView):
+        super().__init__()
+        self._view = view
+        self._index = view.start
+        self._position = 0
+        self.peak_rss_bytes = rss_bytes()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._index < self._view.end:
+            try:
+                length = self._view.read_into(index=self._index, position=self._position, buffer=buffer)
+            except IndexError as e:
+                raise ClipOverrun(f"{e}, the video ring dropped it before it was muxed")
+            if length:
+                self._position += length
+                return length
+            # the payload was read whole, on to the next packet
+            self._index += 1
+            self._position = 0
+            if self._index % 64 == 0:
+                self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes())
+        return 0
+
+
+def rss_bytes() -> int:
+    """Current resident set size, or the peak one where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
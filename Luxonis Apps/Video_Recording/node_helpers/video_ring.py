@@ -0,0 +1,350 @@
+import bisect
+import logging as log
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from node_helpers.video_segments import SegmentStore
+
+# one row per packet, `offset` and `length` locate the payload in the byte ring
+PACKET_INDEX = np.dtype([("offset", "<i8"), ("length", "<i4"), ("seq", "<i8"), ("ts_ns", "<i8"), ("is_keyframe", "?")])
+_NS_PER_SECOND = 1_000_000_000
+
+
+@dataclass(slots=True, kw_only=True)
+class RingConsumer:
+    name: str
+    max_seconds: float  # how far back the consumer ever reads
+    start: Optional[int] = None  # index of the first packet of the consumer's window, None until the consumer starts reading
+
+
+class VideoRingView:
+    """
+    Read-only window [start, end) of a VideoRing, payloads are not copied.
+
+    `data` gives a memoryview of every payload, `timestamps` the timestamps in nanoseconds. The view reads the ring
+    directly, it is valid as long as the ring didn't drop its first packet, which `is_valid` tells.
+    """
+
+    def __init__(self, ring: "VideoRing", start: int, end: int):
+        self._ring = ring
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def is_valid(self) -> bool:
+        return self.start >= self._ring.first_index
+
+    @property
+    def index(self) -> np.ndarray:
+        """Copy of the PACKET_INDEX rows of the view."""
+        return self._ring.index_rows(start=self.start, end=self.end)
+
+    @property
+    def data(self) -> "_ViewColumn":
+        return _ViewColumn(view=self, read=self._ring.payload)
+
+    @property
+    def timestamps(self) -> "_ViewColumn":
+        return _ViewColumn(view=self, read=lambda index: int(self._ring.row(index)["ts_ns"]))
+
+    @property
+    def nbytes(self) -> int:
+        return self._ring.bytes_between(start=self.start, end=self.end)
+
+    @property
+    def duration_seconds(self) -> float:
+        if len(self) < 2:
+            return 0.0
+        return (self._ring.row(self.end - 1)["ts_ns"] - self._ring.row(self.start)["ts_ns"]) / _NS_PER_SECOND
+
+    def read_into(self, index: int, position: int, buffer) -> int:
+        """
+        Copy the payload of packet `index` from byte `position` on into `buffer`, returns the number of bytes copied.
+
+        Meant for reading the view on another thread than the one appending to the ring, the copy holds the ring's lock.
+        Raises IndexError when the ring dropped the packet.
+        """
+        if not self.start <= index < self.end:
+            raise IndexError(f"Packet {index} is not in the view [{self.start}, {self.end})")
+        with self._ring._lock:
+            payload = memoryview(self._ring.payload(index)).cast("B")
+            length = max(min(len(buffer), payload.nbytes - position), 0)
+            buffer[:length] = payload[position: position + length]
+        return length
+
+
+class _ViewColumn:
+    """The payloads or the timestamps of a view as a sequence."""
+
+    def __init__(self, view: VideoRingView, read):
+        self._view = view
+        self._read = read
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self._view)
+        if not 0 <= index < len(self._view):
+            raise IndexError(f"Index {index} out of range of a view of {len(self._view)} packets")
+        return self._read(self._view.start + index)
+
+    def __iter__(self) -> Iterator:
+        for index in range(self._view.start, self._view.end):
+            yield self._read(index)
+
+
+class VideoRing:
+    """
+    One buffer of the encoded packets of a video stream, shared by all its consumers.
+
+    Only the payloads are kept, back to back in a preallocated bytearray of `capacity_bytes`. A parallel PACKET_INDEX
+    array holds the offset, length, sequence number, timestamp and keyframe flag of every packet. Packets get increasing
+    indices, the oldest ones are dropped when a new payload doesn't fit or when they are older than the longest
+    `max_seconds` of the registered consumers. Memory use is therefore fixed, whatever the bitrate.
+    With a `spill` SegmentStore the packets which don't fit into memory any more go to segment files on disk instead,
+    the hot recent packets stay in memory. Indices, views and `index_at` cover both tiers.
+    The indices of the keyframes are kept in a sorted list as well, `seek_keyframe` bisects it and windows start at the
+    keyframe preceding them, so every clip decodes from its first frame.
+    The oldest packets are the next ones dropped, a clip starting among them would be lost before it is muxed. Windows
+    therefore never start in the oldest `margin_seconds` of the ring (plus a segment with a spill, segments are deleted
+    whole), the ring keeps `margin_seconds` more than the longest consumer for it.
+
+    Every consumer keeps only a cursor to the start of its window and reads it through a VideoRingView, so the packets are
+    stored once however many consumers there are. Appending and reading the index or the payloads, also of the spill,
+    hold a lock, so views can be read on other threads. `bytes_saved` is the payload the consumers would hold in buffers of their own.
+    """
+
+    def __init__(self, capacity_bytes: int, index_capacity: int = 1024, spill: Optional["SegmentStore"] = None,
+                 margin_seconds: float = 10):
+        self.capacity_bytes = capacity_bytes
+        self.margin_seconds = margin_seconds
+        self._data = bytearray(capacity_bytes)
+        self._data_view = memoryview(self._data)
+        self._index = np.zeros(index_capacity, dtype=PACKET_INDEX)
+        self._consumers: dict[str, RingConsumer] = {}
+        self._spill = spill
+        self._first_index = 0  # of the packets in memory, the ones before it are on disk
+        self._next_index = 0
+        self._write_offset = 0
+        self._keyframes: list[int] = []  # indices of the keyframes, the ones before first_index are dropped lazily
+        # appends run on the Bridge thread, views are read on the muxing threads
+        self._lock = threading.RLock()
+        self.max_seconds = 0.0
+        self.dropped_too_large = 0  # packets larger than the whole ring
+
+    def register(self, name: str, max_seconds: float) -> RingConsumer:
+        if name in self._consumers:
+            raise ValueError(f"Consumer {name} is already registered")
+        consumer = RingConsumer(name=name, max_seconds=max_seconds)
+        self._consumers[name] = consumer
+        self.max_seconds = max(self.max_seconds, max_seconds)
+        return consumer
+
+    @property
+    def first_index(self) -> int:
+        if self._spill is not None and len(self._spill):
+            return self._spill.first_index
+        return self._first_index
+
+    @property
+    def next_index(self) -> int:
+        """Index the next appended packet gets."""
+        return self._next_index
+
+    def __len__(self) -> int:
+        return self._next_index - self.first_index
+
+    @property
+    def memory_first_index(self) -> int:
+        """Index of the oldest packet in memory, the ones before it are on disk or dropped."""
+        return self._first_index
+
+    @property
+    def memory_packets(self) -> int:
+        return self._next_index - self._first_index
+
+    def append(self, payload, sequence_number: int, timestamp_ns: int, is_keyframe: bool = False) -> Optional[int]:
+        """Copy the payload into the ring, dropping the oldest packets to make room. Returns the index of the packet,
+        None when the payload is larger than the ring."""
+        with self._lock:
+            payload = memoryview(payload).cast("B")
+            length = payload.nbytes
+            if length > self.capacity_bytes:
+                self.dropped_too_large += 1
+                log.warning(f"Dropping a packet of {length} bytes, the video ring holds only {self.capacity_bytes} bytes")
+                return None
+            offset = self._write_offset
+            if offset + length > self.capacity_bytes:
+                # the rest of the bytearray stays unused, the packets in it are the oldest ones and go first
+                self._drop_overlapping(start=offset, end=self.capacity_bytes)
+                offset = 0
+            self._drop_overlapping(start=offset, end=offset + length)
+            self._data_view[offset: offset + length] = payload
+            self._write_offset = offset + length
+            if self.memory_packets == len(self._index):
+                self._grow_index()
+            index = self._next_index
+            self._index[index % len(self._index)] = (offset, length, sequence_number, timestamp_ns, is_keyframe)
+            self._next_index += 1
+            if is_keyframe:
+                self._keyframes.append(index)
+            self._drop_older_than(timestamp_ns - int((self.max_seconds + self.margin_seconds) * _NS_PER_SECOND))
+            return index
+
+    def row(self, index: int) -> np.void:
+        with self._lock:
+            if index < self._first_index and self._spill is not None and len(self._spill):
+                return self._spill.row(index)
+            if not self._first_index <= index < self._next_index:
+                raise IndexError(f"Packet {index} is not in the ring [{self.first_index}, {self._next_index})")
+            # a copy, the slot is reused once the packet is dropped
+            return self._index[index % len(self._index)].copy()
+
+    def payload(self, index: int):
+        """Memoryview of the payload, bytes read from the segment file being written."""
+        with self._lock:
+            if index < self._first_index and self._spill is not None and len(self._spill):
+                return self._spill.payload(index)
+            row = self.row(index)
+            offset = int(row["offset"])
+            return self._data_view[offset: offset + int(row["length"])]
+
+    def index_rows(self, start: int, end: int) -> np.ndarray:
+        with self._lock:
+            memory_rows = self._memory_rows(start=start, end=end)
+            if start >= self._first_index or self._spill is None or not len(self._spill):
+                return memory_rows
+            return np.concatenate([self._spill.index_rows(start=start, end=min(end, self._first_index)), memory_rows])
+
+    def bytes_between(self, start: int, end: int) -> int:
+        """Payload bytes of the packets [start, end), clipped to the packets in the ring."""
+        return int(self.index_rows(start=start, end=end)["length"].sum())
+
+    def index_at(self, timestamp_ns: int) -> int:
+        """Index of the first packet with a timestamp at or after `timestamp_ns`, `next_index` when there is none."""
+        with self._lock:
+            first_index = self.first_index
+            return bisect.bisect_left(range(first_index, self._next_index), timestamp_ns, key=lambda index: int(self.row(index)["ts_ns"])) + first_index
+
+    def seek_keyframe(self, timestamp_ns: int) -> Optional[int]:
+        """Index of the newest keyframe with a timestamp at or before `timestamp_ns`, None when there is none in the ring."""
+        with self._lock:
+            first = self._first_keyframe_position()
+            position = bisect.bisect_right(self._keyframes, timestamp_ns, lo=first, key=lambda index: int(self.row(index)["ts_ns"])) - 1
+            return self._keyframes[position] if position >= first else None
+
+    def keyframe_after(self, index: int) -> Optional[int]:
+        """Index of the oldest keyframe at or after packet `index`, None when there is none in the ring."""
+        with self._lock:
+            position = bisect.bisect_left(self._keyframes, max(index, self.first_index), lo=self._first_keyframe_position())
+            return self._keyframes[position] if position < len(self._keyframes) else None
+
+    def keyframe_before(self, index: int) -> Optional[int]:
+        """Index of the newest keyframe at or before packet `index`, else of the oldest one after it, None without keyframes."""
+        with self._lock:
+            first = self._first_keyframe_position()
+            if first == len(self._keyframes):
+                return None
+            position = bisect.bisect_right(self._keyframes, index, lo=first) - 1
+            return self._keyframes[max(position, first)]
+
+    def start(self, consumer: RingConsumer) -> None:
+        """Start the consumer's window at the newest packet, unless it started already."""
+        if consumer.start is None:
+            consumer.start = self._next_index - 1
+
+    def reset(self, consumer: RingConsumer) -> None:
+        """Forget the consumer's window, it starts again with the next `start`."""
+        consumer.start = None
+
+    def window(self, consumer: RingConsumer) -> VideoRingView:
+        """View of the consumer's window up to and including the newest packet. It starts at the keyframe before the
+        window, or at the first keyframe after the margin when that one was dropped already or is about to be."""
+        with self._lock:
+            start = self.first_index if consumer.start is None else max(consumer.start, self.first_index)
+            if len(self):
+                newest_ns = int(self.row(self._next_index - 1)["ts_ns"])
+                start = max(start, self.index_at(newest_ns - int(consumer.max_seconds * _NS_PER_SECOND)))
+                safe = self.safe_index
+                keyframe = self.keyframe_before(start)
+                if keyframe is None or keyframe < safe:
+                    keyframe = self.keyframe_after(max(start, safe))
+                start = max(start, safe) if keyframe is None else keyframe
+            return VideoRingView(ring=self, start=start, end=self._next_index)
+
+    @property
+    def safe_index(self) -> int:
+        """Index of the first packet after the margin, the ones before it may be dropped before a clip is muxed."""
+        with self._lock:
+            if not len(self):
+                return self._next_index
+            margin_seconds = self.margin_seconds + (self._spill.segment_seconds if self._spill is not None else 0)
+            return self.index_at(int(self.row(self.first_index)["ts_ns"]) + int(margin_seconds * _NS_PER_SECOND))
+
+    @property
+    def nbytes(self) -> int:
+        """Payload bytes in memory and on disk."""
+        return self.bytes_between(start=self.first_index, end=self._next_index)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.bytes_between(start=self._first_index, end=self._next_index)
+
+    @property
+    def bytes_saved(self) -> int:
+        """Payload the consumers would hold in separate buffers on top of the shared one."""
+        held = sum(self.window(consumer).nbytes for consumer in self._consumers.values() if consumer.start is not None)
+        return max(held - self.nbytes, 0)
+
+    def report(self) -> None:
+        with self._lock:
+            oldest = VideoRingView(ring=self, start=self.first_index, end=self._next_index)
+            disk = "" if self._spill is None else \
+                f", {len(self._spill)} packets {self._spill.nbytes / 2 ** 20:.1f}/{self._spill.max_bytes / 2 ** 20:.0f} MB on disk"
+            keyframes = len(self._keyframes) - self._first_keyframe_position()
+            log.info(f"Video ring: {len(self)} packets, {keyframes} keyframes, {oldest.duration_seconds:.0f}/{self.max_seconds:.0f} s, "
+                     f"{self.memory_bytes / 2 ** 20:.1f}/{self.capacity_bytes / 2 ** 20:.0f} MB in memory{disk}, shared by {len(self._consumers)} "
+                     f"consumers, {self.bytes_saved / 2 ** 20:.1f} MB saved against a buffer per consumer")
+
+    def _drop_overlapping(self, start: int, end: int) -> None:
+        # packets lie in the ring in index order, the oldest one is always the next one to be overwritten
+        while self.memory_packets:
+            row = self._index[self._first_index % len(self._index)]
+            offset, length = int(row["offset"]), int(row["length"])
+            if offset >= end or offset + length <= start:
+                break
+            if self._spill is not None:
+                self._spill.append(index=self._first_index, payload=self._data_view[offset: offset + length], row=row)
+            self._first_index += 1
+
+    def _drop_older_than(self, timestamp_ns: int) -> None:
+        if self._spill is not None:
+            self._spill.drop_older_than(timestamp_ns)
+        self._first_index = max(self._first_index, min(self.index_at(timestamp_ns), self._next_index - 1))
+
+    def _first_keyframe_position(self) -> int:
+        """Position in `_keyframes` of the oldest keyframe still in the ring."""
+        first = bisect.bisect_left(self._keyframes, self.first_index)
+        if first > 1024 and first > len(self._keyframes) // 2:
+            del self._keyframes[:first]
+            first = 0
+        return first
+
+    def _memory_rows(self, start: int, end: int) -> np.ndarray:
+        start = max(start, self._first_index)
+        end = min(end, self._next_index)
+        return self._index[np.arange(start, max(start, end)) % len(self._index)]
+
+    def _grow_index(self) -> None:
+        rows = self._memory_rows(start=self._first_index, end=self._next_index)
+        self._index = np.zeros(2 * len(self._index), dtype=PACKET_INDEX)
+        self._index[np.arange(self._first_index, self._next_index) % len(self._index)] = rows
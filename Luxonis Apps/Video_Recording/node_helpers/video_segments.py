@@ -0,0 +1,170 @@
+import bisect
+import logging as log
+import mmap
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+
+from node_helpers.video_ring import PACKET_INDEX
+
+_NS_PER_SECOND = 1_000_000_000
+
+
+class _Segment:
+    """One segment file, packets appended back to back, their PACKET_INDEX rows in memory with offsets into the file."""
+
+    def __init__(self, path: str, first_index: int):
+        self.path = path
+        self.first_index = first_index
+        self._file = open(path, "ab")
+        self._reader = open(path, "rb")
+        self._rows = np.zeros(256, dtype=PACKET_INDEX)
+        self._count = 0
+        self.nbytes = 0
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows[:self._count]
+
+    def append(self, payload: memoryview, row: np.void) -> None:
+        if self._count == len(self._rows):
+            self._rows = np.concatenate([self._rows, np.zeros(len(self._rows), dtype=PACKET_INDEX)])
+        self._rows[self._count] = row
+        self._rows["offset"][self._count] = self.nbytes
+        self._file.write(payload)
+        self._count += 1
+        self.nbytes += payload.nbytes
+
+    def close(self) -> None:
+        """No more packets, from now on the segment is read through mmap."""
+        self._file.close()
+        self._file = None
+        self._reader.close()
+
+    def payload(self, position: int):
+        row = self._rows[position]
+        offset, length = int(row["offset"]), int(row["length"])
+        if self._file is not None:
+            # still being written, the buffered tail has to reach the file first
+            self._file.flush()
+            return os.pread(self._reader.fileno(), length, offset)
+        if self._mmap is None:
+            if self.nbytes == 0:
+                return memoryview(b"")
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)[offset: offset + length]
+
+    def delete(self) -> None:
+        if self._file is not None:
+            self.close()
+        # not closed, views of the clips being saved may still point into it, the pages go away with the last of them
+        self._mmap = None
+        os.remove(self.path)
+
+
+class SegmentStore:
+    """
+    Disk tier of a VideoRing - packets dropped from memory are appended to segment files of `segment_seconds` each.
+
+    Only the PACKET_INDEX rows of the packets stay in memory. Packet indices continue those of the ring, the store holds
+    [first_index, next_index) without gaps. The oldest segment is deleted when the files grow over `max_bytes`, or when all
+    of its packets are older than what the ring keeps. Closed segments are read through mmap, so a clip read from disk
+    doesn't copy the payloads either, the segment being written is read with pread.
+    The store isn't locked itself, it is appended to and read only through its VideoRing, under the ring's lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, segment_seconds: float = 10):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_seconds = segment_seconds
+        # segments of a previous run don't match the index, start empty
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        self._segments: list[_Segment] = []
+        self._segment_starts: list[int] = []  # first index of every segment, for bisecting
+        self._next_segment = 0
+        self.nbytes = 0
+        self.deleted_segments = 0
+
+    @property
+    def first_index(self) -> Optional[int]:
+        return self._segments[0].first_index if self._segments else None
+
+    @property
+    def next_index(self) -> Optional[int]:
+        if not self._segments:
+            return None
+        return self._segments[-1].first_index + len(self._segments[-1])
+
+    def __len__(self) -> int:
+        return 0 if not self._segments else self.next_index - self.first_index
+
+    def append(self, index: int, payload: memoryview, row: np.void) -> None:
+        if self._segments and index != self.next_index:
+            # the ring dropped packets without spilling them, the store can't have a gap
+            self.clear()
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or (len(segment) and (int(row["ts_ns"]) - int(segment.rows[0]["ts_ns"])) >= self.segment_seconds * _NS_PER_SECOND):
+            if segment is not None:
+                segment.close()
+            segment = _Segment(path=os.path.join(self.directory, f"{self._next_segment:08d}.h264"), first_index=index)
+            self._next_segment += 1
+            self._segments.append(segment)
+            self._segment_starts.append(index)
+        segment.append(payload=payload, row=row)
+        self.nbytes += payload.nbytes
+        while self.nbytes > self.max_bytes and len(self._segments) > 1:
+            self._delete_oldest()
+
+    def drop_older_than(self, timestamp_ns: int) -> None:
+        """Delete the segments whose newest packet is older than `timestamp_ns`."""
+        while self._segments and int(self._segments[0].rows[-1]["ts_ns"]) < timestamp_ns:
+            self._delete_oldest()
+
+    def row(self, index: int) -> np.void:
+        segment = self._segment(index)
+        return segment.rows[index - segment.first_index].copy()
+
+    def payload(self, index: int):
+        """Raises IndexError also when the segment file can't be read any more, like a packet the store dropped."""
+        segment = self._segment(index)
+        try:
+            return segment.payload(index - segment.first_index)
+        except (OSError, ValueError) as e:
+            raise IndexError(f"Packet {index} can't be read from {segment.path}: {e!r}") from e
+
+    def index_rows(self, start: int, end: int) -> np.ndarray:
+        parts = []
+        for segment in self._segments:
+            segment_end = segment.first_index + len(segment)
+            if segment_end <= start or segment.first_index >= end:
+                continue
+            parts.append(segment.rows[max(start, segment.first_index) - segment.first_index: min(end, segment_end) - segment.first_index])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=PACKET_INDEX)
+
+    def clear(self) -> None:
+        while self._segments:
+            self._delete_oldest()
+
+    def _segment(self, index: int) -> _Segment:
+        position = bisect.bisect_right(self._segment_starts, index) - 1
+        if position < 0 or index >= self.next_index:
+            raise IndexError(f"Packet {index} is not on disk [{self.first_index}, {self.next_index})")
+        return self._segments[position]
+
+    def _delete_oldest(self) -> None:
+        segment = self._segments.pop(0)
+        self._segment_starts.pop(0)
+        self.nbytes -= segment.nbytes
+        self.deleted_segments += 1
+        try:
+            segment.delete()
+        except OSError as e:
+            log.error(f"Deleting video segment {segment.path} failed: {e!r}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app imports its modules from the app directory, the way app.py is run
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,121 @@
+from fractions import Fraction
+
+import pytest
+
+av = pytest.importorskip("av")
+np = pytest.importorskip("numpy")
+
+from node_helpers.h264 import is_idr
+from node_helpers.video_ring import VideoRing
+from node_helpers.video_segments import SegmentStore
+
+_NS_PER_SECOND = 1_000_000_000
+FPS = 10
+GOP = 5
+PACKETS = 23
+
+
+@pytest.fixture(scope="module")
+def packets() -> list[bytes]:
+    """Annex B access units of a short libx264 stream, an IDR every GOP frames with the SPS and PPS repeated before it."""
+    encoder = av.CodecContext.create("libx264", "w")
+    encoder.width, encoder.height = 64, 48
+    encoder.pix_fmt = "yuv420p"
+    encoder.framerate = FPS
+    encoder.time_base = Fraction(1, FPS)
+    encoder.options = {"preset": "ultrafast",
+                       "x264-params": f"keyint={GOP}:min-keyint={GOP}:scenecut=0:bframes=0:repeat-headers=1"}
+    encoded = []
+    for i in range(PACKETS):
+        image = np.zeros((encoder.height, encoder.width, 3), dtype=np.uint8)
+        image[:, (3 * i) % encoder.width] = 255
+        frame = av.VideoFrame.from_ndarray(image, format="rgb24").reformat(format="yuv420p")
+        frame.pts = i
+        encoded += encoder.encode(frame)
+    encoded += encoder.encode(None)
+    assert len(encoded) == PACKETS
+    assert [packet.is_keyframe for packet in encoded] == [i % GOP == 0 for i in range(PACKETS)]
+    return [bytes(packet) for packet in encoded]
+
+
+def _timestamp(index: int) -> int:
+    # the first packet isn't at 0, so there is a timestamp before it
+    return (index + 1) * _NS_PER_SECOND // FPS
+
+
+def _append(ring: VideoRing, packets: list[bytes], index: int) -> None:
+    ring.append(packets[index], sequence_number=index, timestamp_ns=_timestamp(index), is_keyframe=is_idr(packets[index]))
+
+
+def _decode(payloads) -> list:
+    """Frames of the access units, decoding fails on a clip which doesn't start with an IDR."""
+    decoder = av.CodecContext.create("h264", "r")
+    frames = []
+    for payload in payloads:
+        frames += decoder.decode(av.Packet(bytes(payload)))
+    return frames + decoder.decode(None)
+
+
+def test_is_idr_flags_exactly_the_idr_access_units(packets):
+    assert [is_idr(payload) for payload in packets] == [i % GOP == 0 for i in range(PACKETS)]
+    # the SPS and PPS alone, without a slice
+    assert not is_idr(packets[0][:packets[0].find(b"\x00\x00\x01\x65")])
+
+
+def test_seek_keyframe_returns_the_preceding_idr(packets):
+    ring = VideoRing(capacity_bytes=1 << 20, margin_seconds=0)
+    ring.register(name="a", max_seconds=60)
+    for index in range(PACKETS):
+        _append(ring, packets, index)
+    assert ring.seek_keyframe(_timestamp(0) - 1) is None
+    for index in range(PACKETS):
+        assert ring.seek_keyframe(_timestamp(index)) == index - index % GOP
+        assert ring.seek_keyframe(_timestamp(index) + 1) == index - index % GOP
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_window_snaps_back_to_the_preceding_idr_and_decodes(tmp_path, packets, spill):
+    store = SegmentStore(directory=str(tmp_path / "segments"), max_bytes=1 << 20, segment_seconds=0.5) if spill else None
+    ring = VideoRing(capacity_bytes=1200 if spill else 1 << 20, spill=store, margin_seconds=0)
+    consumer = ring.register(name="a", max_seconds=1.35)
+    # the ring keeps the longest window, this one holds the IDR before the shorter one
+    ring.register(name="b", max_seconds=60)
+    for index in range(PACKETS):
+        _append(ring, packets, index)
+    view = ring.window(consumer)
+    # 1.35 s before the newest packet is packet 9, its IDR is packet 5
+    assert (view.start, view.end) == (5, PACKETS)
+    if spill:
+        # the clip starts on disk and ends in memory
+        assert view.start < ring.memory_first_index
+    frames = _decode(view.data)
+    assert len(frames) == len(view)
+    assert frames[0].key_frame
+    with pytest.raises(av.error.InvalidDataError):
+        _decode(packets[view.start + 1: view.end])
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_window_starts_at_the_next_idr_once_the_preceding_one_was_dropped(tmp_path, packets, spill):
+    store = SegmentStore(directory=str(tmp_path / "segments"), max_bytes=1500, segment_seconds=0.3) if spill else None
+    ring = VideoRing(capacity_bytes=1200, spill=store, margin_seconds=0)
+    consumer = ring.register(name="a", max_seconds=60)
+    count = 0
+    # append until the oldest packet left is in the middle of a GOP and the IDR after it is in the ring
+    while ring.first_index % GOP == 0 or ring.next_index <= ring.first_index - ring.first_index % GOP + GOP:
+        assert count < PACKETS
+        _append(ring, packets, count)
+        count += 1
+    if spill:
+        assert ring.first_index < ring.memory_first_index
+    next_keyframe = ring.first_index - ring.first_index % GOP + GOP
+    assert ring.seek_keyframe(_timestamp(next_keyframe) - 1) is None
+    view = ring.window(consumer)
+    if spill:
+        # the oldest segment is deleted whole, the clip starts at the first IDR after it
+        safe = ring.index_at(_timestamp(ring.first_index) + int(store.segment_seconds * _NS_PER_SECOND))
+        next_keyframe = safe + (-safe) % GOP
+    assert (view.start, view.end) == (next_keyframe, count)
+    frames = _decode(view.data)
+    assert len(frames) == len(view)
+    assert frames[0].key_frame
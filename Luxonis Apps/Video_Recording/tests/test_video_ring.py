@@ -0,0 +1,177 @@
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from node_helpers.video_reader import ClipOverrun, ViewReader
+from node_helpers.video_ring import VideoRing, VideoRingView
+from node_helpers.video_segments import SegmentStore
+
+_NS_PER_SECOND = 1_000_000_000
+FPS = 10
+
+
+def _payload(index: int, size: int = 100) -> bytes:
+    return bytes([index % 256]) * size
+
+
+def _append(ring: VideoRing, first: int, count: int, size: int = 100) -> None:
+    for index in range(first, first + count):
+        ring.append(_payload(index, size), sequence_number=index, timestamp_ns=index * _NS_PER_SECOND // FPS)
+
+
+def test_retention_is_the_longest_consumer_window():
+    ring = VideoRing(capacity_bytes=1 << 20, margin_seconds=0)
+    ring.register(name="short", max_seconds=2)
+    ring.register(name="long", max_seconds=5)
+    _append(ring, first=0, count=10 * FPS)
+    assert ring.max_seconds == 5
+    # the oldest packet is exactly 5 s older than the newest one
+    assert ring.first_index == 10 * FPS - 1 - 5 * FPS
+    assert len(ring) == 5 * FPS + 1
+    assert ring.nbytes == 100 * len(ring)
+
+
+def test_consumer_windows_and_reset():
+    ring = VideoRing(capacity_bytes=1 << 20, margin_seconds=0)
+    short = ring.register(name="short", max_seconds=2)
+    long = ring.register(name="long", max_seconds=5)
+    with pytest.raises(ValueError):
+        ring.register(name="short", max_seconds=1)
+    _append(ring, first=0, count=FPS)
+    ring.start(long)
+    _append(ring, first=FPS, count=FPS)
+    ring.start(short)
+    # starting again keeps the window
+    ring.start(long)
+    _append(ring, first=2 * FPS, count=FPS)
+
+    window = ring.window(long)
+    assert (window.start, window.end) == (FPS - 1, 3 * FPS)
+    assert window.is_valid
+    assert list(window.data[0]) == list(_payload(FPS - 1))
+    assert window.timestamps[-1] == (3 * FPS - 1) * _NS_PER_SECOND // FPS
+    assert ring.window(short).start == 2 * FPS - 1
+
+    # the window never reaches further back than max_seconds
+    _append(ring, first=3 * FPS, count=2 * FPS)
+    window = ring.window(short)
+    assert window.duration_seconds == pytest.approx(2)
+
+    ring.reset(long)
+    assert ring.window(long).start == ring.first_index
+    ring.start(long)
+    assert ring.window(long).start == ring.next_index - 1
+
+
+def test_bytes_saved_counts_the_shared_packets_once():
+    ring = VideoRing(capacity_bytes=1 << 20, margin_seconds=0)
+    consumers = [ring.register(name=name, max_seconds=60) for name in ("a", "b", "c")]
+    _append(ring, first=0, count=1)
+    for consumer in consumers[:2]:
+        ring.start(consumer)
+    _append(ring, first=1, count=9)
+    # two windows of all 10 packets, not started consumers hold nothing
+    assert ring.nbytes == 1000
+    assert ring.bytes_saved == 1000
+
+
+def test_wrap_around_drops_the_oldest_packets():
+    ring = VideoRing(capacity_bytes=1000, margin_seconds=0)
+    ring.register(name="a", max_seconds=60)
+    _append(ring, first=0, count=3, size=300)
+    # 100 bytes left at the end, the fourth packet starts over at offset 0 and overwrites packet 0
+    _append(ring, first=3, count=1, size=300)
+    assert ring.first_index == 1
+    assert int(ring.row(3)["offset"]) == 0
+    _append(ring, first=4, count=2, size=300)
+    assert ring.first_index == 3
+    for index in range(ring.first_index, ring.next_index):
+        assert bytes(ring.payload(index)) == _payload(index, 300)
+    with pytest.raises(IndexError):
+        ring.payload(2)
+    assert ring.append(bytes(1001), sequence_number=6, timestamp_ns=0) is None
+    assert ring.dropped_too_large == 1
+
+
+def test_index_grows_and_keeps_the_rows():
+    ring = VideoRing(capacity_bytes=1 << 20, index_capacity=4, margin_seconds=0)
+    ring.register(name="a", max_seconds=60)
+    _append(ring, first=0, count=11)
+    assert len(ring) == 11
+    rows = ring.index_rows(start=0, end=11)
+    assert rows["seq"].tolist() == list(range(11))
+    assert rows["offset"].tolist() == [100 * index for index in range(11)]
+    assert ring.index_at(5 * _NS_PER_SECOND // FPS) == 5
+    assert ring.index_at(20 * _NS_PER_SECOND // FPS) == ring.next_index
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_views_read_on_another_thread_copy_whole_packets_or_raise(tmp_path, spill):
+    store = SegmentStore(directory=str(tmp_path / "segments"), max_bytes=3000, segment_seconds=0.5) if spill else None
+    # a tiny index grows while the reader reads, the segments are written, closed and deleted
+    ring = VideoRing(capacity_bytes=2000, index_capacity=2, spill=store, margin_seconds=0)
+    consumer = ring.register(name="a", max_seconds=60)
+    _append(ring, first=0, count=1, size=300)
+    done = threading.Event()
+    reads = {"whole": 0, "dropped": 0}
+
+    def read():
+        buffer = bytearray(300)
+        while not done.is_set():
+            view = ring.window(consumer)
+            for index in range(view.start, view.end):
+                try:
+                    length = view.read_into(index=index, position=0, buffer=buffer)
+                except IndexError:
+                    reads["dropped"] += 1
+                    continue
+                assert bytes(buffer[:length]) == _payload(index, 300)
+                reads["whole"] += 1
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        _append(ring, first=1, count=2000, size=300)
+    finally:
+        done.set()
+        reader.join()
+    # how many packets were dropped while they were read depends on the thread switches
+    assert reads["whole"]
+
+
+@pytest.mark.parametrize("capacity_bytes", [1 << 20, 100 * 20 * FPS])
+def test_windows_start_after_the_margin_and_survive_it(capacity_bytes):
+    # time bound, and byte bound to 20 s of the stream, a keyframe every second
+    ring = VideoRing(capacity_bytes=capacity_bytes, margin_seconds=3)
+    consumer = ring.register(name="a", max_seconds=300 if capacity_bytes < 1 << 20 else 10)
+    for index in range(60 * FPS):
+        ring.append(_payload(index), sequence_number=index, timestamp_ns=index * _NS_PER_SECOND // FPS, is_keyframe=index % FPS == 0)
+    view = ring.window(consumer)
+    assert view.start >= ring.first_index + 3 * FPS
+    assert view.start % FPS == 0
+    if capacity_bytes == 1 << 20:
+        # the ring keeps the margin on top of the window
+        assert view.duration_seconds == pytest.approx(10 - 0.1)
+    for index in range(60 * FPS, 62 * FPS):
+        ring.append(_payload(index), sequence_number=index, timestamp_ns=index * _NS_PER_SECOND // FPS, is_keyframe=index % FPS == 0)
+    assert view.is_valid
+    assert bytes(view.data[0]) == _payload(view.start)
+
+
+def test_view_reader_streams_the_payloads_and_raises_on_overrun():
+    ring = VideoRing(capacity_bytes=1000, margin_seconds=0)
+    ring.register(name="a", max_seconds=60)
+    _append(ring, first=0, count=5, size=150)
+    reader = ViewReader(VideoRingView(ring=ring, start=1, end=5))
+    buffer = bytearray(100)
+    chunks = []
+    while length := reader.readinto(buffer):
+        chunks.append(bytes(buffer[:length]))
+    assert b"".join(chunks) == b"".join(_payload(index, 150) for index in range(1, 5))
+
+    reader = ViewReader(VideoRingView(ring=ring, start=1, end=5))
+    _append(ring, first=5, count=3, size=150)
+    with pytest.raises(ClipOverrun):
+        reader.readinto(buffer)
@@ -0,0 +1,24 @@
+from app_modules import load_app_module
+
+Synchronizer = load_app_module("app_pipeline/synchronization.py").Synchronizer
+
+
+def test_drops_and_evictions_are_counted_per_input():
+    synchronizer = Synchronizer(number_of_messages_per_sequence_number=2, capacity=4)
+    sent = []
+    synchronizer.add_callback(sent.append)
+    synchronizer.add_message("a0", sequence_number=0, identifier="a")
+    synchronizer.add_message("a1", sequence_number=1, identifier="a")
+    synchronizer.add_message("b1", sequence_number=1, identifier="b")
+    assert sent == [{"a": "a1", "b": "b1"}]
+    assert synchronizer.statistics["evicted_incomplete"] == {"a": 1}
+
+    synchronizer.add_message("b0", sequence_number=0, identifier="b")
+    assert synchronizer.statistics["late"] == {"b": 1}
+
+    # sequence number 6 doesn't fit next to 2..5, the ring drops all of them
+    for sequence_number in range(2, 7):
+        synchronizer.add_message(sequence_number, sequence_number=sequence_number, identifier="a")
+    assert synchronizer.statistics["evicted_incomplete"] == {"a": 5}
+    synchronizer.add_message("b6", sequence_number=6, identifier="b")
+    assert sent[-1] == {"a": 6, "b": "b6"}